@@ -0,0 +1,41 @@
+"""Apuração diária de atrasos, sem interface gráfica.
+
+Atualiza a tabela de atrasos lida pelas telas e relatórios. Pensado para
+rodar uma vez por dia (cron, Agendador de Tarefas), por exemplo:
+
+    5 0 * * * cd /caminho/biblioteca && python atrasos.py
+"""
+import argparse
+import sys
+from datetime import date
+
+from database import Database
+from registro import configurar_do_ambiente
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apura os empréstimos em atraso.")
+    parser.add_argument('--banco', default='biblioteca.db', help="arquivo do banco SQLite")
+    parser.add_argument('--data', type=date.fromisoformat,
+                        help="data de referência AAAA-MM-DD (padrão: hoje)")
+    parser.add_argument('--verificar-contadores', action='store_true',
+                        help="confere e, se preciso, reconstrói os contadores de empréstimos")
+    args = parser.parse_args(argv)
+
+    configurar_do_ambiente('biblioteca.log')
+    db = Database(args.banco)
+    try:
+        if args.verificar_contadores:
+            divergencias = db.verificar_contadores(reconstruir=True)
+            for tabela, ids in divergencias.items():
+                if ids:
+                    print(f"{tabela}: {len(ids)} registro(s) divergente(s) reconstruído(s)")
+        resultado = db.apurar_atrasos(args.data)
+    finally:
+        db.fechar()
+
+    tipo = "completa" if resultado['completa'] else "incremental"
+    print(f"Atrasos apurados até {resultado['dia']:%d/%m/%Y} ({tipo}): {resultado['novos']} novo(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
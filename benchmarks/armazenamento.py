@@ -0,0 +1,84 @@
+"""Mede a vazão de cada perfil de armazenamento (PERFIS_ARMAZENAMENTO).
+
+Uso: python benchmarks/armazenamento.py [--commits N] [--lote N] [--segundos S]
+
+Para cada perfil, num banco temporário novo:
+  - commits/s: criar_livro, um commit por registro;
+  - linhas/s em lote: inserir_livros_lote numa única transação;
+  - leituras/s: obter_livro em 4 threads enquanto outra thread grava.
+Como referência, inclui os padrões do SQLite (journal DELETE, synchronous FULL).
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database, PERFIS_ARMAZENAMENTO
+from models import Livro
+
+PERFIS_ARMAZENAMENTO.setdefault('padrao-sqlite', {
+    'journal_mode': 'DELETE',
+    'synchronous': 'FULL',
+    'checkpoint_segundos': None,
+})
+
+def medir(perfil: str, commits: int, lote: int, segundos: float) -> dict:
+    with tempfile.TemporaryDirectory() as pasta:
+        db = Database(os.path.join(pasta, 'bench.db'), max_conexoes=6, perfil=perfil)
+        try:
+            inicio = time.perf_counter()
+            for i in range(commits):
+                db.criar_livro(Livro(titulo=f"Livro {i}", autor="Autor", ano=2000, copias_disponiveis=1))
+            commits_s = commits / (time.perf_counter() - inicio)
+
+            linhas = [(f"Lote {i}", f"Autor {i % 100}", 2000, 1) for i in range(lote)]
+            inicio = time.perf_counter()
+            db.inserir_livros_lote(linhas)
+            lote_s = lote / (time.perf_counter() - inicio)
+
+            parar = threading.Event()
+            leituras = [0] * 4
+
+            def escritor():
+                n = 0
+                while not parar.is_set():
+                    n += 1
+                    db.criar_livro(Livro(titulo=f"Concorrente {n}", autor="Autor", copias_disponiveis=1))
+
+            def leitor(n):
+                while not parar.is_set():
+                    db.obter_livro(random.randint(1, commits))
+                    leituras[n] += 1
+
+            threads = [threading.Thread(target=escritor)]
+            threads += [threading.Thread(target=leitor, args=(n,)) for n in range(4)]
+            for t in threads:
+                t.start()
+            time.sleep(segundos)
+            parar.set()
+            for t in threads:
+                t.join()
+            leituras_s = sum(leituras) / segundos
+        finally:
+            db.fechar()
+    return {'commits/s': commits_s, 'linhas/s em lote': lote_s, 'leituras/s com escrita': leituras_s}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--commits', type=int, default=2000)
+    parser.add_argument('--lote', type=int, default=200000)
+    parser.add_argument('--segundos', type=float, default=3.0)
+    args = parser.parse_args()
+
+    print(f"{'perfil':<14}{'commits/s':>12}{'linhas/s em lote':>20}{'leituras/s com escrita':>26}")
+    for perfil in ['padrao-sqlite', 'desktop', 'server', 'bulk-load']:
+        r = medir(perfil, args.commits, args.lote, args.segundos)
+        print(f"{perfil:<14}{r['commits/s']:>12.0f}{r['linhas/s em lote']:>20.0f}{r['leituras/s com escrita']:>26.0f}")
+
+if __name__ == "__main__":
+    main()
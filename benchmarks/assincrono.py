@@ -0,0 +1,116 @@
+"""Compara a vazão de leituras concorrentes de Database e de AsyncDatabase.
+
+Uso: python benchmarks/assincrono.py [--livros N] [--segundos S] [--leitores N] [--tarefas N]
+
+Num banco temporário com N livros, mede leituras/s (obter_livro e
+pagina_livros alternados, ao acaso) por S segundos em cada configuração:
+  - Database, uma thread;
+  - Database, --leitores threads;
+  - AsyncDatabase com --leitores leitoras e --tarefas corrotinas simultâneas.
+Cada uma é medida sem escrita e com uma escrita contínua (criar_livro) em paralelo.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import Database
+from database_async import AsyncDatabase
+from models import Livro
+
+def ler(db, livros: int):
+    if random.random() < 0.5:
+        return db.obter_livro(random.randint(1, livros))
+    return db.pagina_livros(20, offset=random.randint(0, 1000))
+
+def medir_sincrono(arquivo: str, livros: int, threads: int, segundos: float, escrita: bool) -> float:
+    db = Database(arquivo, max_conexoes=threads + 1, perfil='server')
+    parar = threading.Event()
+    leituras = [0] * threads
+
+    def leitor(n):
+        while not parar.is_set():
+            ler(db, livros)
+            leituras[n] += 1
+
+    def escritor():
+        n = 0
+        while not parar.is_set():
+            n += 1
+            db.criar_livro(Livro(titulo=f"Sincrono {threads} {n}", autor="Autor", copias_disponiveis=1))
+
+    trabalhos = [threading.Thread(target=leitor, args=(n,)) for n in range(threads)]
+    if escrita:
+        trabalhos.append(threading.Thread(target=escritor))
+    try:
+        for t in trabalhos:
+            t.start()
+        time.sleep(segundos)
+        parar.set()
+        for t in trabalhos:
+            t.join()
+    finally:
+        db.fechar()
+    return sum(leituras) / segundos
+
+async def medir_assincrono(arquivo: str, livros: int, leitores: int, tarefas: int,
+                           segundos: float, escrita: bool) -> float:
+    leituras = 0
+    async with AsyncDatabase(arquivo, leitores=leitores, perfil='server') as db:
+        fim = time.monotonic() + segundos
+
+        async def leitor():
+            nonlocal leituras
+            while time.monotonic() < fim:
+                if random.random() < 0.5:
+                    await db.obter_livro(random.randint(1, livros))
+                else:
+                    await db.pagina_livros(20, offset=random.randint(0, 1000))
+                leituras += 1
+
+        async def escritor():
+            n = 0
+            while time.monotonic() < fim:
+                n += 1
+                await db.criar_livro(Livro(titulo=f"Assincrono {n}", autor="Autor", copias_disponiveis=1))
+
+        corrotinas = [leitor() for _ in range(tarefas)]
+        if escrita:
+            corrotinas.append(escritor())
+        await asyncio.gather(*corrotinas)
+    return leituras / segundos
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--livros', type=int, default=100000)
+    parser.add_argument('--segundos', type=float, default=5.0)
+    parser.add_argument('--leitores', type=int, default=4)
+    parser.add_argument('--tarefas', type=int, default=64)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, 'bench.db')
+        db = Database(arquivo)
+        db.inserir_livros_lote([(f"Livro {i}", f"Autor {i % 100}", 2000, 1) for i in range(args.livros)])
+        db.fechar()
+
+        configuracoes = [
+            ("Database, 1 thread", lambda escrita: medir_sincrono(arquivo, args.livros, 1, args.segundos, escrita)),
+            (f"Database, {args.leitores} threads",
+             lambda escrita: medir_sincrono(arquivo, args.livros, args.leitores, args.segundos, escrita)),
+            (f"AsyncDatabase, {args.tarefas} tarefas",
+             lambda escrita: asyncio.run(medir_assincrono(
+                 arquivo, args.livros, args.leitores, args.tarefas, args.segundos, escrita))),
+        ]
+        print(f"{'configuração':<30}{'leituras/s':>14}{'com escrita':>14}")
+        for nome, medir in configuracoes:
+            print(f"{nome:<30}{medir(False):>14.0f}{medir(True):>14.0f}")
+
+if __name__ == "__main__":
+    main()
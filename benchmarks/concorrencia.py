@@ -0,0 +1,173 @@
+"""Teste de estresse: vários processos emprestando, devolvendo e editando o mesmo banco.
+
+Uso: python benchmarks/concorrencia.py [--processos N] [--segundos S] [--livros N] [--copias N]
+
+Num banco temporário novo, cada processo abre o seu Database e repete, por
+S segundos, uma das operações abaixo, sorteada a cada volta:
+  - empréstimo: criar_emprestimo de usuário e livro ao acaso (recusas são esperadas);
+  - devolução: finalizar_emprestimo de um empréstimo ativo e, às vezes, uma
+    segunda devolução do mesmo empréstimo, que deve ser recusada;
+  - edição: lê o livro pelo cache (DatabaseComCache), soma ou tira uma cópia
+    e grava com atualizar_livro, relendo e tentando de novo a cada conflito.
+Ao final confere, por livro, que cópias disponíveis + empréstimos ativos é
+igual às cópias iniciais mais o saldo das edições, que nenhum livro ficou
+com cópias negativas e que os contadores batem. Sai com código 1 se algo divergir.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cache import DatabaseComCache
+from database import ConflitoAtualizacao, Database, EmprestimoNegado
+from models import Emprestimo
+
+OPERACOES = ('emprestimo', 'devolucao', 'edicao')
+
+def cpf_valido(n: int) -> str:
+    """CPF com dígitos verificadores corretos a partir de um número de 9 dígitos."""
+    cpf = f"{n:09d}"
+    for i in range(9, 11):
+        soma = sum(int(cpf[num]) * ((i + 1) - num) for num in range(i))
+        cpf += str((soma * 10) % 11 % 10)
+    return cpf
+
+def preparar(arquivo: str, usuarios: int, livros: int, copias: int):
+    db = Database(arquivo, perfil='server')
+    try:
+        db.inserir_usuarios_lote([(f"Usuário {i}", None, cpf_valido(100000000 + i)) for i in range(usuarios)])
+        db.inserir_livros_lote([(f"Livro {i}", "Autor", 2000, copias) for i in range(livros)])
+    finally:
+        db.fechar()
+
+def emprestar(db, usuarios: int, livros: int, conta: Counter, saldo: Counter):
+    emprestimo = Emprestimo(usuario_id=random.randint(1, usuarios), livro_id=random.randint(1, livros))
+    try:
+        db.criar_emprestimo(emprestimo)
+        conta['emprestimos'] += 1
+    except EmprestimoNegado as e:
+        conta[f"recusa:{e.motivo}"] += 1
+
+def devolver(db, usuarios: int, livros: int, conta: Counter, saldo: Counter):
+    total = db.contar_emprestimos_ativos()
+    ativos = db.pagina_emprestimos_ativos(1, offset=random.randint(0, max(total - 1, 0)))
+    if not ativos:
+        return
+    emprestimo = ativos[0]
+    if db.finalizar_emprestimo(emprestimo.id):
+        conta['devolucoes'] += 1
+    else:
+        conta['devolucao_concorrente'] += 1
+    if random.random() < 0.2 and db.finalizar_emprestimo(emprestimo.id):
+        conta['devolucao_dupla_aceita'] += 1
+
+def editar(db, usuarios: int, livros: int, conta: Counter, saldo: Counter):
+    livro_id = random.randint(1, livros)
+    delta = random.choice((-1, 1))
+    while True:
+        livro = db.obter_livro(livro_id)
+        if livro.copias_disponiveis + delta < 0:
+            return
+        livro.copias_disponiveis += delta
+        try:
+            db.atualizar_livro(livro)
+        except ConflitoAtualizacao:
+            conta['conflitos'] += 1
+            continue
+        saldo[livro_id] += delta
+        conta['edicoes'] += 1
+        return
+
+ACOES = {'emprestimo': emprestar, 'devolucao': devolver, 'edicao': editar}
+
+def trabalhar(args) -> tuple:
+    arquivo, semente, segundos, usuarios, livros = args
+    random.seed(semente)
+    db = DatabaseComCache(arquivo, max_conexoes=2, perfil='server')
+    conta, saldo = Counter(), Counter()
+    fim = time.monotonic() + segundos
+    try:
+        while time.monotonic() < fim:
+            acao = ACOES[random.choice(OPERACOES)]
+            try:
+                acao(db, usuarios, livros, conta, saldo)
+            except sqlite3.OperationalError as e:
+                # "database is locked": a transação não foi gravada
+                conta[f"erro:{e}"] += 1
+    finally:
+        db.fechar()
+    return conta, saldo
+
+def conferir(arquivo: str, livros: int, copias: int, saldo: Counter) -> list:
+    db = Database(arquivo, perfil='server')
+    try:
+        ativos = Counter(e.livro_id for e in db.iterar_emprestimos_ativos())
+        problemas = []
+        for livro_id in range(1, livros + 1):
+            livro = db.obter_livro(livro_id)
+            esperado = copias + saldo[livro_id]
+            if livro.copias_disponiveis < 0:
+                problemas.append(f"livro {livro_id}: {livro.copias_disponiveis} cópias disponíveis")
+            if livro.copias_disponiveis + ativos[livro_id] != esperado:
+                problemas.append(
+                    f"livro {livro_id}: {livro.copias_disponiveis} disponíveis + "
+                    f"{ativos[livro_id]} emprestadas, esperado {esperado}"
+                )
+        for tabela, ids in db.verificar_contadores().items():
+            if ids:
+                problemas.append(f"contadores divergentes em {tabela}: {ids}")
+        return problemas
+    finally:
+        db.fechar()
+
+def estressar(processos: int, segundos: float, usuarios: int, livros: int, copias: int,
+              semente: int = 1) -> tuple:
+    """Roda o teste num banco temporário novo; devolve (contadores das operações, divergências)."""
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, 'estresse.db')
+        preparar(arquivo, usuarios, livros, copias)
+
+        tarefas = [(arquivo, semente + n, segundos, usuarios, livros) for n in range(processos)]
+        with multiprocessing.Pool(processos) as pool:
+            resultados = pool.map(trabalhar, tarefas)
+
+        conta, saldo = Counter(), Counter()
+        for c, s in resultados:
+            conta.update(c)
+            saldo.update(s)
+        problemas = conferir(arquivo, livros, copias, saldo)
+
+    if conta['devolucao_dupla_aceita']:
+        problemas.append(f"{conta['devolucao_dupla_aceita']} devoluções duplicadas aceitas")
+    return conta, problemas
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=10.0)
+    parser.add_argument('--usuarios', type=int, default=5000)
+    parser.add_argument('--livros', type=int, default=20)
+    parser.add_argument('--copias', type=int, default=3)
+    parser.add_argument('--semente', type=int, default=1)
+    args = parser.parse_args()
+
+    conta, problemas = estressar(args.processos, args.segundos, args.usuarios, args.livros,
+                                 args.copias, args.semente)
+    for chave, valor in sorted(conta.items()):
+        print(f"{chave:<40}{valor:>10}")
+    if problemas:
+        print("\nDIVERGÊNCIAS:")
+        for problema in problemas:
+            print(f"  {problema}")
+        sys.exit(1)
+    print("\nOK: cópias e contadores consistentes")
+
+if __name__ == "__main__":
+    main()
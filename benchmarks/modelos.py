@@ -0,0 +1,81 @@
+"""Compara a materialização de linhas em objetos: classe com __dict__ via
+`Modelo(**sqlite3.Row)` (forma anterior) contra classe com __slots__ via
+row_factory e `Modelo.de_linha`.
+
+Uso: python benchmarks/modelos.py [--linhas N]
+
+Mede o tempo de leitura de N livros (SELECT + construção dos objetos) e a
+memória retida pela lista resultante (tracemalloc).
+"""
+import argparse
+import gc
+import os
+import sqlite3
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import COLUNAS_LIVRO, _linha_livro
+from models import Livro
+
+class LivroComDict:
+    """Livro como era antes de __slots__."""
+    def __init__(self, id=None, titulo=None, autor=None, ano=None, copias_disponiveis=None):
+        self.id = id
+        self.titulo = titulo
+        self.autor = autor
+        self.ano = ano
+        self.copias_disponiveis = copias_disponiveis or 0
+
+def criar_banco(linhas: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(':memory:')
+    conn.execute('''CREATE TABLE livros (
+        id INTEGER PRIMARY KEY, titulo TEXT, autor TEXT, ano INTEGER, copias_disponiveis INTEGER)''')
+    conn.executemany(
+        'INSERT INTO livros VALUES (?, ?, ?, ?, ?)',
+        ((i, f'Livro {i}', f'Autor {i % 1000}', 1900 + i % 120, i % 5) for i in range(1, linhas + 1))
+    )
+    return conn
+
+def ler_com_dict(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = sqlite3.Row
+    cursor.execute('SELECT * FROM livros')
+    return [LivroComDict(**row) for row in cursor.fetchall()]
+
+def ler_com_slots(conn):
+    cursor = conn.cursor()
+    cursor.row_factory = _linha_livro
+    cursor.execute(f'SELECT {COLUNAS_LIVRO} FROM livros')
+    return cursor.fetchall()
+
+def medir(ler, conn):
+    gc.collect()
+    inicio = time.perf_counter()
+    objetos = ler(conn)
+    tempo = time.perf_counter() - inicio
+    del objetos
+
+    gc.collect()
+    tracemalloc.start()
+    objetos = ler(conn)
+    memoria, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert len(objetos) and isinstance(objetos[0], (Livro, LivroComDict))
+    return tempo, memoria, len(objetos)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    conn = criar_banco(args.linhas)
+    print(f"{'modelo':<26}{'tempo (s)':>10}{'linhas/s':>12}{'memória (MiB)':>15}{'bytes/objeto':>14}")
+    for nome, ler in [('__dict__ + Modelo(**row)', ler_com_dict), ('__slots__ + de_linha', ler_com_slots)]:
+        tempo, memoria, linhas = medir(ler, conn)
+        print(f"{nome:<26}{tempo:>10.2f}{linhas / tempo:>12.0f}{memoria / 2**20:>15.1f}{memoria / linhas:>14.0f}")
+
+if __name__ == "__main__":
+    main()
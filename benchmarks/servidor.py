@@ -0,0 +1,117 @@
+"""Mede a vazão de empréstimos pela API HTTP/JSON de servidor.py.
+
+Uso: python benchmarks/servidor.py [--clientes N] [--segundos S] [--leitores N]
+
+Sobe o servidor num processo à parte, com um banco temporário novo, e roda N
+processos clientes (cliente.DatabaseRemoto), cada um repetindo por S
+segundos: criar_emprestimo de usuário e livro ao acaso e, se aceito,
+finalizar_emprestimo do mesmo empréstimo. Mostra requisições/s, empréstimos/s
+e a latência (mediana e p99) de criar_emprestimo.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.concorrencia import cpf_valido
+from cliente import DatabaseRemoto
+from database import Database, EmprestimoNegado
+from models import Emprestimo
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def preparar(arquivo: str, usuarios: int, livros: int):
+    db = Database(arquivo, perfil='server')
+    try:
+        db.inserir_usuarios_lote([(f"Usuário {i}", None, cpf_valido(100000000 + i)) for i in range(usuarios)])
+        db.inserir_livros_lote([(f"Livro {i}", "Autor", 2000, 1000) for i in range(livros)])
+    finally:
+        db.fechar()
+
+def porta_livre() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def aguardar(porta: int, limite: float = 10.0):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        try:
+            socket.create_connection(('127.0.0.1', porta), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("O servidor não respondeu")
+
+def cliente(args) -> tuple:
+    url, semente, segundos, usuarios, livros = args
+    random.seed(semente)
+    db = DatabaseRemoto(url)
+    requisicoes, emprestimos, recusas, latencias = 0, 0, 0, []
+    fim = time.monotonic() + segundos
+    try:
+        while time.monotonic() < fim:
+            emprestimo = Emprestimo(usuario_id=random.randint(1, usuarios), livro_id=random.randint(1, livros))
+            inicio = time.perf_counter()
+            try:
+                emprestimo_id = db.criar_emprestimo(emprestimo)
+            except EmprestimoNegado:
+                emprestimo_id = None
+                recusas += 1
+            latencias.append(time.perf_counter() - inicio)
+            requisicoes += 1
+            if emprestimo_id is not None:
+                emprestimos += 1
+                db.finalizar_emprestimo(emprestimo_id)
+                requisicoes += 1
+    finally:
+        db.fechar()
+    return requisicoes, emprestimos, recusas, latencias
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--clientes', type=int, default=8)
+    parser.add_argument('--segundos', type=float, default=10.0)
+    parser.add_argument('--leitores', type=int, default=8)
+    parser.add_argument('--usuarios', type=int, default=20000)
+    parser.add_argument('--livros', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        arquivo = os.path.join(pasta, 'servidor.db')
+        preparar(arquivo, args.usuarios, args.livros)
+        porta = porta_livre()
+        servidor = subprocess.Popen(
+            [sys.executable, os.path.join(RAIZ, 'servidor.py'), '--banco', arquivo, '--porta', str(porta),
+             '--leitores', str(args.leitores)],
+            cwd=pasta, stderr=subprocess.DEVNULL
+        )
+        try:
+            aguardar(porta)
+            url = f'http://127.0.0.1:{porta}'
+            tarefas = [(url, n, args.segundos, args.usuarios, args.livros) for n in range(args.clientes)]
+            with multiprocessing.Pool(args.clientes) as pool:
+                resultados = pool.map(cliente, tarefas)
+        finally:
+            servidor.terminate()
+            servidor.wait()
+
+    requisicoes = sum(r[0] for r in resultados)
+    emprestimos = sum(r[1] for r in resultados)
+    recusas = sum(r[2] for r in resultados)
+    latencias = sorted(l for r in resultados for l in r[3])
+    print(f"clientes: {args.clientes}, leitores do servidor: {args.leitores}")
+    print(f"requisições/s:   {requisicoes / args.segundos:10.0f}")
+    print(f"empréstimos/s:   {emprestimos / args.segundos:10.0f} ({recusas} recusados)")
+    print(f"criar_emprestimo: mediana {latencias[len(latencias) // 2] * 1000:.2f} ms, "
+          f"p99 {latencias[int(len(latencias) * 0.99)] * 1000:.2f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,302 @@
+"""Cache em memória para as leituras de usuários e livros.
+
+`DatabaseComCache` é um Database que guarda buscas por id, páginas,
+contagens e pesquisas de usuários e livros num `CacheLRU` (com validade,
+limite de entradas e de memória estimada).
+"""
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from database import CONSULTAS, Database, ResultadoItem, TABELAS_VERSIONADAS
+from models import Emprestimo, Livro, Usuario
+
+# Entradas mantidas no cache
+MAX_ENTRADAS = 5000
+# Memória estimada máxima ocupada pelos valores (bytes)
+MAX_BYTES = 32 * 1024 * 1024
+# Validade de cada entrada (segundos)
+TTL_SEGUNDOS = 300.0
+
+def tamanho_estimado(valor) -> int:
+    """Bytes aproximados de um modelo, de uma lista de modelos ou de um valor simples."""
+    if isinstance(valor, list):
+        if not valor:
+            return sys.getsizeof(valor)
+        # Estima pela primeira linha, para não percorrer listas grandes
+        return sys.getsizeof(valor) + len(valor) * tamanho_estimado(valor[0])
+    campos = getattr(valor, 'CAMPOS', None)
+    if campos:
+        return sys.getsizeof(valor) + sum(sys.getsizeof(getattr(valor, campo)) for campo in campos)
+    return sys.getsizeof(valor)
+
+class CacheLRU:
+    """Cache LRU com validade (TTL), limite de entradas e de memória estimada.
+
+    As chaves são tuplas cujo primeiro item é a tabela de origem. Não é
+    thread-safe: quem o usa de várias threads deve protegê-lo com um lock.
+    """
+
+    def __init__(self, max_entradas: int = MAX_ENTRADAS, max_bytes: int = MAX_BYTES,
+                 ttl: float = TTL_SEGUNDOS):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self._entradas: 'OrderedDict[tuple, Tuple[Any, float, int]]' = OrderedDict()  # valor, expira_em, bytes
+        self._stats = {
+            'acertos': 0,
+            'falhas': 0,
+            'despejos': 0,
+            'expiradas': 0,
+            'invalidadas': 0,
+        }
+
+    def obter(self, chave: tuple) -> Tuple[bool, Any]:
+        """(True, valor) se a chave estiver no cache e válida; (False, None) caso contrário."""
+        entrada = self._entradas.get(chave)
+        if entrada is not None and entrada[1] <= time.monotonic():
+            self._remover(chave)
+            self._stats['expiradas'] += 1
+            entrada = None
+        if entrada is None:
+            self._stats['falhas'] += 1
+            return False, None
+        self._entradas.move_to_end(chave)
+        self._stats['acertos'] += 1
+        return True, entrada[0]
+
+    def guardar(self, chave: tuple, valor):
+        tamanho = tamanho_estimado(valor)
+        if tamanho > self.max_bytes // 4:
+            return  # ex.: uma listagem completa, que tomaria o lugar de todo o resto
+        if chave in self._entradas:
+            self._remover(chave)
+        self._entradas[chave] = (valor, time.monotonic() + self.ttl, tamanho)
+        self.bytes += tamanho
+        while len(self._entradas) > self.max_entradas or self.bytes > self.max_bytes:
+            self._remover(next(iter(self._entradas)))
+            self._stats['despejos'] += 1
+
+    def invalidar(self, filtro: Callable[[tuple], bool]) -> int:
+        """Remove as entradas cujas chaves satisfazem `filtro`; devolve quantas foram removidas."""
+        chaves = [chave for chave in self._entradas if filtro(chave)]
+        for chave in chaves:
+            self._remover(chave)
+        self._stats['invalidadas'] += len(chaves)
+        return len(chaves)
+
+    def limpar(self):
+        self._entradas.clear()
+        self.bytes = 0
+
+    def _remover(self, chave: tuple):
+        self.bytes -= self._entradas.pop(chave)[2]
+
+    def stats(self) -> dict:
+        stats = dict(self._stats)
+        stats['entradas'] = len(self._entradas)
+        stats['bytes'] = self.bytes
+        consultas = stats['acertos'] + stats['falhas']
+        stats['taxa_acerto'] = stats['acertos'] / consultas if consultas else 0.0
+        return stats
+
+class DatabaseComCache(Database):
+    """Database que guarda em cache as leituras de usuários e livros.
+
+    Escritas feitas por esta instância descartam só o que mudou: o registro
+    alterado e as páginas, contagens e pesquisas da tabela. Escritas de
+    outro processo no mesmo arquivo são percebidas antes de cada leitura por
+    PRAGMA data_version (numa conexão reservada para isso) e pelas versões de
+    versoes_tabelas, mantidas por triggers; nesse caso tudo o que veio da
+    tabela alterada é descartado.
+
+    Os objetos devolvidos pelo cache são compartilhados e não devem ser alterados.
+    """
+
+    def __init__(self, db_name='biblioteca.db', *args, max_entradas: int = MAX_ENTRADAS,
+                 max_bytes: int = MAX_BYTES, ttl: float = TTL_SEGUNDOS, **kwargs):
+        super().__init__(db_name, *args, **kwargs)
+        self.cache = CacheLRU(max_entradas, max_bytes, ttl)
+        self._lock_cache = threading.Lock()
+        # Incrementada a cada descarte, para não guardar leituras feitas antes dele
+        self._geracoes = dict.fromkeys(TABELAS_VERSIONADAS, 0)
+        self._monitor = sqlite3.connect(db_name, check_same_thread=False)
+        self._data_version = self._monitor.execute('PRAGMA data_version').fetchone()[0]
+        self._versoes = self._ler_versoes(self._monitor)
+
+    def fechar(self):
+        with self._lock_cache:
+            self._monitor.close()
+        super().fechar()
+
+    def estatisticas_cache(self) -> dict:
+        with self._lock_cache:
+            return self.cache.stats()
+
+    # Coerência com outros processos
+    @staticmethod
+    def _ler_versoes(conn: sqlite3.Connection) -> Dict[str, int]:
+        return dict(conn.execute(CONSULTAS['versoes.ler']).fetchall())
+
+    def _verificar_externas(self):
+        """Descarta as tabelas alteradas por outra conexão desde a última verificação."""
+        data_version = self._monitor.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+        self._atualizar_versoes(self._ler_versoes(self._monitor))
+
+    def _atualizar_versoes(self, versoes: Dict[str, int]):
+        for tabela, versao in versoes.items():
+            if versao != self._versoes.get(tabela):
+                self._versoes[tabela] = versao
+                self._descartar(tabela, tudo=True)
+
+    def _inicio_escrita(self, conn: sqlite3.Connection):
+        # Com o lock de escrita, as versões só incluem commits de outras conexões
+        with self._lock_cache:
+            self._atualizar_versoes(self._ler_versoes(conn))
+
+    def _fim_escrita(self, conn: sqlite3.Connection):
+        # Versões com as alterações desta transação, que esta instância descarta por conta própria
+        with self._lock_cache:
+            self._versoes.update(self._ler_versoes(conn))
+
+    # Leitura e descarte
+    def _buscar(self, chave: tuple, carregar: Callable, *args, **kwargs):
+        tabela = chave[0]
+        with self._lock_cache:
+            self._verificar_externas()
+            encontrado, valor = self.cache.obter(chave)
+            geracao = self._geracoes[tabela]
+        if not encontrado:
+            valor = carregar(*args, **kwargs)
+            with self._lock_cache:
+                if self._geracoes[tabela] == geracao:
+                    self.cache.guardar(chave, valor)
+        return list(valor) if isinstance(valor, list) else valor
+
+    def _descartar(self, tabela: str, *ids: int, tudo: bool = False):
+        """Descarta páginas, contagens e pesquisas da tabela e os registros `ids` (ou todos)."""
+        self._geracoes[tabela] += 1
+        self.cache.invalidar(
+            lambda chave: chave[0] == tabela and (tudo or chave[1] != 'obter' or chave[2] in ids)
+        )
+
+    def _alterou(self, tabela: str, *ids: int):
+        with self._lock_cache:
+            self._descartar(tabela, *ids)
+
+    # Usuários
+    def obter_usuario(self, usuario_id: int) -> Optional[Usuario]:
+        return self._buscar(('usuarios', 'obter', usuario_id), super().obter_usuario, usuario_id)
+
+    def pagina_usuarios(self, limite: Optional[int], apos: Optional[Tuple[str, int]] = None,
+                        antes: Optional[Tuple[str, int]] = None, offset: int = 0) -> List[Usuario]:
+        return self._buscar(
+            ('usuarios', 'pagina', limite, apos, antes, offset),
+            super().pagina_usuarios, limite, apos=apos, antes=antes, offset=offset
+        )
+
+    def contar_usuarios(self) -> int:
+        return self._buscar(('usuarios', 'contar'), super().contar_usuarios)
+
+    def buscar_usuarios(self, termo: str, limite: int = 10) -> List[Usuario]:
+        return self._buscar(('usuarios', 'buscar', termo, limite), super().buscar_usuarios, termo, limite)
+
+    def criar_usuario(self, usuario: Usuario) -> int:
+        usuario_id = super().criar_usuario(usuario)
+        self._alterou('usuarios')
+        return usuario_id
+
+    def atualizar_usuario(self, usuario: Usuario) -> bool:
+        try:
+            return super().atualizar_usuario(usuario)
+        finally:
+            self._alterou('usuarios', usuario.id)
+
+    def remover_usuario(self, usuario_id: int) -> bool:
+        try:
+            return super().remover_usuario(usuario_id)
+        finally:
+            self._alterou('usuarios', usuario_id)
+
+    def inserir_usuarios_lote(self, usuarios) -> List[Tuple[int, str]]:
+        try:
+            return super().inserir_usuarios_lote(usuarios)
+        finally:
+            self._alterou('usuarios')
+
+    # Livros
+    def obter_livro(self, livro_id: int) -> Optional[Livro]:
+        return self._buscar(('livros', 'obter', livro_id), super().obter_livro, livro_id)
+
+    def pagina_livros(self, limite: Optional[int], apos: Optional[Tuple[str, int]] = None,
+                      antes: Optional[Tuple[str, int]] = None, offset: int = 0,
+                      disponiveis: bool = False) -> List[Livro]:
+        return self._buscar(
+            ('livros', 'pagina', limite, apos, antes, offset, disponiveis),
+            super().pagina_livros, limite, apos=apos, antes=antes, offset=offset, disponiveis=disponiveis
+        )
+
+    def contar_livros(self, disponiveis: bool = False) -> int:
+        return self._buscar(('livros', 'contar', disponiveis), super().contar_livros, disponiveis)
+
+    def buscar_livros(self, consulta: str, limite: int = 50, disponiveis: bool = False) -> List[Livro]:
+        return self._buscar(
+            ('livros', 'buscar', consulta, limite, disponiveis),
+            super().buscar_livros, consulta, limite, disponiveis
+        )
+
+    def criar_livro(self, livro: Livro) -> int:
+        livro_id = super().criar_livro(livro)
+        self._alterou('livros')
+        return livro_id
+
+    def atualizar_livro(self, livro: Livro) -> bool:
+        try:
+            return super().atualizar_livro(livro)
+        finally:
+            self._alterou('livros', livro.id)
+
+    def remover_livro(self, livro_id: int) -> bool:
+        try:
+            return super().remover_livro(livro_id)
+        finally:
+            self._alterou('livros', livro_id)
+
+    def inserir_livros_lote(self, livros) -> List[Tuple[int, str]]:
+        try:
+            return super().inserir_livros_lote(livros)
+        finally:
+            self._alterou('livros')
+
+    # Empréstimos alteram as cópias disponíveis do livro
+    def criar_emprestimo(self, emprestimo: Emprestimo) -> int:
+        emprestimo_id = super().criar_emprestimo(emprestimo)
+        self._alterou('livros', emprestimo.livro_id)
+        return emprestimo_id
+
+    def emprestar_lote(self, usuario_id: int, livro_ids: List[int],
+                       tudo_ou_nada: bool = False) -> List[ResultadoItem]:
+        try:
+            return super().emprestar_lote(usuario_id, livro_ids, tudo_ou_nada)
+        finally:
+            self._alterou('livros', *livro_ids)
+
+    def devolver_lote(self, emprestimo_ids: List[int]) -> List[ResultadoItem]:
+        resultados = super().devolver_lote(emprestimo_ids)
+        self._alterou('livros', *(item.livro_id for item in resultados if item.livro_id is not None))
+        return resultados
+
+    def finalizar_emprestimo(self, emprestimo_id: int) -> bool:
+        emprestimo = super().obter_emprestimo(emprestimo_id)
+        try:
+            return super().finalizar_emprestimo(emprestimo_id)
+        finally:
+            if emprestimo:
+                self._alterou('livros', emprestimo.livro_id)
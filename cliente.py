@@ -0,0 +1,166 @@
+"""Cliente de servidor.py com a mesma interface de Database.
+
+    db = DatabaseRemoto('http://127.0.0.1:8765')
+    db.criar_emprestimo(Emprestimo(usuario_id=1, livro_id=2))
+
+Os métodos de protocolo.OPERACOES viram chamadas HTTP; exceções conhecidas
+(EmprestimoNegado, ConflitoAtualizacao, ValueError...) são levantadas de
+novo no cliente. Cada thread usa a sua conexão keep-alive.
+"""
+import functools
+import http.client
+import select
+import threading
+import time
+from typing import Iterator, List, Optional
+from urllib.parse import urlsplit
+
+from cache import DatabaseComCache
+from database import Database
+from models import Livro, Usuario
+from protocolo import (
+    OPERACOES, OPERACOES_EM_PARTES, OPERACOES_LEITURA, ErroRemoto, codificar, decodificar, decodificar_erro,
+)
+
+URL_PADRAO = 'http://127.0.0.1:8765'
+TEMPO_LIMITE = 30.0  # segundos por requisição
+TENTATIVAS_OCUPADO = 5  # novas tentativas quando o servidor responde 503
+
+class DatabaseRemoto:
+    """Database acessado por HTTP; pode substituir Database/DatabaseComCache na interface."""
+
+    def __init__(self, url: str = URL_PADRAO, timeout: float = TEMPO_LIMITE,
+                 tentativas_ocupado: int = TENTATIVAS_OCUPADO):
+        partes = urlsplit(url)
+        if partes.scheme != 'http' or not partes.hostname:
+            raise ValueError(f"URL do servidor inválida: {url}")
+        self.url = url
+        self.host = partes.hostname
+        self.porta = partes.port or 80
+        self.timeout = timeout
+        self.tentativas_ocupado = tentativas_ocupado
+        self._local = threading.local()
+        self._conexoes: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+
+    def _nova_conexao(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.porta, timeout=self.timeout)
+
+    def _conexao(self) -> http.client.HTTPConnection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._nova_conexao()
+            with self._lock:
+                self._conexoes.append(conn)
+        elif conn.sock is not None and select.select([conn.sock], [], [], 0)[0]:
+            # Conexão keep-alive parada que o servidor já encerrou (fim de
+            # arquivo pendente): reabre antes de enviar, em vez de depois de falhar
+            conn.close()
+        return conn
+
+    def fechar(self):
+        with self._lock:
+            conexoes, self._conexoes = self._conexoes, []
+        for conn in conexoes:
+            conn.close()
+
+    @staticmethod
+    def _requisitar(conn: http.client.HTTPConnection, nome: str, corpo: bytes) -> http.client.HTTPResponse:
+        conn.request('POST', f'/api/{nome}', corpo, {'Content-Type': 'application/json'})
+        return conn.getresponse()
+
+    def _enviar(self, nome: str, corpo: bytes) -> tuple:
+        """(status, mensagem decodificada), repetindo enquanto o servidor estiver ocupado."""
+        for tentativa in range(self.tentativas_ocupado + 1):
+            conn = self._conexao()
+            reutilizada = conn.sock is not None
+            try:
+                resposta = self._requisitar(conn, nome, corpo)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # O servidor pode ter fechado a conexão keep-alive ociosa agora
+                # mesmo, mas também pode ter caído depois de executar a operação:
+                # só leituras são reenviadas (uma vez, numa conexão nova)
+                conn.close()
+                if not reutilizada or nome not in OPERACOES_LEITURA:
+                    raise
+                resposta = self._requisitar(conn, nome, corpo)
+            except OSError:
+                conn.close()
+                raise
+            dados = resposta.read()
+            if resposta.will_close:
+                conn.close()
+            if resposta.status == 503 and tentativa < self.tentativas_ocupado:
+                time.sleep(float(resposta.getheader('Retry-After', '1')))
+                continue
+            try:
+                return resposta.status, decodificar(dados)
+            except ValueError:
+                raise ErroRemoto('RespostaInvalida', dados[:200].decode('utf-8', 'replace'), resposta.status)
+
+    def _chamar(self, nome: str, args: tuple = (), kwargs: Optional[dict] = None):
+        status, mensagem = self._enviar(nome, codificar({'args': args, 'kwargs': kwargs or {}}))
+        if 'erro' in mensagem:
+            raise decodificar_erro(mensagem['erro'], status)
+        return mensagem['resultado']
+
+    def _chamar_em_partes(self, nome: str, args: tuple = (), kwargs: Optional[dict] = None) -> Iterator:
+        """Gerador dos itens de uma resposta em partes, lidos conforme são consumidos.
+
+        Usa uma conexão própria, fechada ao final, para que a thread possa
+        fazer outras chamadas enquanto percorre o gerador.
+        """
+        conn = self._nova_conexao()
+        try:
+            resposta = self._requisitar(conn, nome, codificar({'args': args, 'kwargs': kwargs or {}}))
+            if resposta.status != 200:
+                mensagem = decodificar(resposta.read())
+                raise decodificar_erro(mensagem['erro'], resposta.status)
+            for linha in resposta:
+                mensagem = decodificar(linha)
+                if 'erro' in mensagem:
+                    raise decodificar_erro(mensagem['erro'])
+                yield mensagem['resultado']
+        finally:
+            conn.close()
+
+    # Atributos do Database local que aqui são lidos do servidor
+    @property
+    def limite_consulta_lenta(self) -> float:
+        return self._chamar('limite_consulta_lenta')
+
+    @limite_consulta_lenta.setter
+    def limite_consulta_lenta(self, segundos: float):
+        self._chamar('limite_consulta_lenta', (segundos,))
+
+    # Atualizações: como em Database, a versão do objeto acompanha a gravada
+    def atualizar_usuario(self, usuario: Usuario) -> bool:
+        atualizado = self._chamar('atualizar_usuario', (usuario,))
+        if atualizado and usuario.versao is not None:
+            usuario.versao += 1
+        return atualizado
+
+    def atualizar_livro(self, livro: Livro) -> bool:
+        atualizado = self._chamar('atualizar_livro', (livro,))
+        if atualizado and livro.versao is not None:
+            livro.versao += 1
+        return atualizado
+
+    # Percursos completos: os de Database, que só dependem de pagina_*
+    iterar_usuarios = Database.iterar_usuarios
+    iterar_livros = Database.iterar_livros
+    iterar_emprestimos_ativos = Database.iterar_emprestimos_ativos
+
+def _operacao_remota(nome: str):
+    original = getattr(DatabaseComCache, nome)
+    if nome in OPERACOES_EM_PARTES:
+        def metodo(self, *args, **kwargs):
+            return self._chamar_em_partes(nome, args, kwargs)
+    else:
+        def metodo(self, *args, **kwargs):
+            return self._chamar(nome, args, kwargs)
+    return functools.wraps(original)(metodo)
+
+for _nome in OPERACOES:
+    if _nome not in vars(DatabaseRemoto):
+        setattr(DatabaseRemoto, _nome, _operacao_remota(_nome))
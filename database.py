@@ -1,61 +1,1212 @@
 import sqlite3
+import logging
 import os
-from datetime import datetime, timedelta
-from typing import List, Optional, Tuple
+import queue
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
 from contextlib import contextmanager
-from models import Usuario, Livro, Emprestimo
+from functools import lru_cache
+from models import Usuario, Livro, Emprestimo, EmprestimoAtivo
+
+logger = logging.getLogger(__name__)
+
+# Colunas na ordem de CAMPOS de cada modelo, lidas pelas fábricas de linha abaixo
+COLUNAS_USUARIO = ', '.join(Usuario.CAMPOS)
+COLUNAS_LIVRO = ', '.join(Livro.CAMPOS)
+COLUNAS_EMPRESTIMO = ', '.join(Emprestimo.CAMPOS)
+
+def _fabrica(modelo):
+    """row_factory que monta o modelo direto da tupla da linha."""
+    de_linha = modelo.de_linha
+    return lambda cursor, linha: de_linha(linha)
+
+_linha_usuario = _fabrica(Usuario)
+_linha_livro = _fabrica(Livro)
+
+# Datas de empréstimo são gravadas como dias desde 1970-01-01 (INTEGER)
+_ORDINAL_EPOCA = date(1970, 1, 1).toordinal()
+
+def dia_de_data(data: date) -> int:
+    """Converte date (ou datetime) para o número de dias gravado no banco."""
+    return data.toordinal() - _ORDINAL_EPOCA
+
+def data_de_dia(dia: int) -> date:
+    """Converte o número de dias gravado no banco para date."""
+    return date.fromordinal(dia + _ORDINAL_EPOCA)
+
+def dia_hoje() -> int:
+    """Hoje (data local) em dias; cada operação lê uma vez e reutiliza o valor."""
+    return dia_de_data(date.today())
+
+def _chave_em_dias(chave: Optional[tuple]) -> Optional[tuple]:
+    """Chave de keyset (data, id) convertida para (dias, id)."""
+    return (dia_de_data(chave[0]), chave[1]) if chave is not None else None
+
+def _linha_emprestimo(cursor, linha) -> Emprestimo:
+    id_, usuario_id, livro_id, emprestimo, prevista, real = linha
+    return Emprestimo.de_linha((
+        id_, usuario_id, livro_id,
+        data_de_dia(emprestimo),
+        data_de_dia(prevista),
+        data_de_dia(real) if real is not None else None
+    ))
+
+def _linha_emprestimo_ativo(cursor, linha) -> EmprestimoAtivo:
+    id_, usuario_id, nome, livro_id, titulo, emprestimo, prevista, dias_atraso = linha
+    return EmprestimoAtivo(
+        id_, usuario_id, nome, livro_id, titulo,
+        data_de_dia(emprestimo), data_de_dia(prevista),
+        dias_atraso is not None, dias_atraso or 0
+    )
+
+# Consultas críticas (usadas também por verificar_indices)
+# Todas as regras de validar_emprestimo numa só leitura do índice de empréstimos ativos
+SQL_VALIDACAO_EMPRESTIMO = '''
+SELECT
+    (SELECT copias_disponiveis FROM livros WHERE id = :livro_id) AS copias,
+    EXISTS(SELECT 1 FROM usuarios WHERE id = :usuario_id) AS usuario_existe,
+    COALESCE(r.emprestimos_ativos, 0) AS ativos,
+    COALESCE(r.proxima_devolucao < :hoje, 0) AS atrasados,
+    EXISTS(
+        SELECT 1 FROM emprestimos
+        WHERE usuario_id = :usuario_id AND livro_id = :livro_id AND data_devolucao_real IS NULL
+    ) AS mesmo_livro
+FROM (SELECT 1) LEFT JOIN resumo_usuarios r ON r.usuario_id = :usuario_id
+'''
+
+# Situação de atraso lida da tabela atrasos (ver apurar_atrasos)
+SQL_DIAS_ATRASO = '(SELECT ultimo_dia FROM controle_atrasos WHERE id = 1) - a.data_devolucao_prevista'
+
+SQL_SELECT_EMPRESTIMOS_DETALHADOS = f'''
+SELECT e.id, e.usuario_id, u.nome, e.livro_id, l.titulo,
+       e.data_emprestimo, e.data_devolucao_prevista,
+       {SQL_DIAS_ATRASO} AS dias_atraso
+FROM emprestimos e
+LEFT JOIN usuarios u ON u.id = e.usuario_id
+LEFT JOIN livros l ON l.id = e.livro_id
+LEFT JOIN atrasos a ON a.emprestimo_id = e.id
+'''
+
+SQL_EMPRESTIMOS_DETALHADOS = SQL_SELECT_EMPRESTIMOS_DETALHADOS + '''
+WHERE e.data_devolucao_real IS NULL
+ORDER BY e.data_devolucao_prevista, e.id
+'''
+
+SQL_USUARIOS_EM_ATRASO = '''
+SELECT u.id, u.nome, u.email, u.cpf, a.qtd_atrasos,
+       (SELECT ultimo_dia FROM controle_atrasos WHERE id = 1) - a.primeira_prevista AS maior_atraso
+FROM atrasos_usuarios a
+JOIN usuarios u ON u.id = a.usuario_id
+ORDER BY a.qtd_atrasos DESC
+'''
+
+# Relatório exportado: datas em ISO 8601
+SQL_RELATORIO_EMPRESTIMOS = f'''
+SELECT e.id, e.usuario_id, u.nome, e.livro_id, l.titulo,
+       date(e.data_emprestimo * 86400, 'unixepoch'),
+       date(e.data_devolucao_prevista * 86400, 'unixepoch'),
+       COALESCE({SQL_DIAS_ATRASO}, 0)
+FROM emprestimos e
+LEFT JOIN usuarios u ON u.id = e.usuario_id
+LEFT JOIN livros l ON l.id = e.livro_id
+LEFT JOIN atrasos a ON a.emprestimo_id = e.id
+WHERE e.data_devolucao_real IS NULL
+ORDER BY e.data_devolucao_prevista, e.id
+'''
+
+SQL_LIVROS_DISPONIVEIS = '''
+SELECT id, titulo, autor, ano, copias_disponiveis
+FROM livros
+WHERE copias_disponiveis > 0
+ORDER BY titulo, id
+'''
+
+# Relatórios exportáveis: nome -> (colunas, consulta)
+RELATORIOS = {
+    'livros_disponiveis': (
+        ('id', 'titulo', 'autor', 'ano', 'copias_disponiveis'),
+        SQL_LIVROS_DISPONIVEIS
+    ),
+    'emprestimos_ativos': (
+        ('id', 'usuario_id', 'usuario', 'livro_id', 'livro', 'data_emprestimo',
+         'data_devolucao_prevista', 'dias_atraso'),
+        SQL_RELATORIO_EMPRESTIMOS
+    ),
+    'usuarios_em_atraso': (
+        ('id', 'nome', 'email', 'cpf', 'qtd_atrasos', 'maior_atraso'),
+        SQL_USUARIOS_EM_ATRASO
+    ),
+}
+
+CONSULTAS_CRITICAS = {
+    'validacao_emprestimo': (SQL_VALIDACAO_EMPRESTIMO, {'usuario_id': 1, 'livro_id': 1, 'hoje': 0}),
+    'emprestimos_detalhados': (SQL_EMPRESTIMOS_DETALHADOS, ()),
+    'usuarios_em_atraso': (SQL_USUARIOS_EM_ATRASO, ()),
+}
+
+# "SCAN tabela" sem "USING ... INDEX" indica leitura da tabela inteira;
+# subconsultas materializadas ("MATERIALIZE x"/"CO-ROUTINE x") não contam
+_VARREDURA_COMPLETA = re.compile(r'^SCAN (\w+)$')
+_SUBCONSULTA = re.compile(r'^(?:MATERIALIZE|CO-ROUTINE) (\w+)$')
+
+# CPF só com dígitos; a mesma expressão é usada no índice e nas consultas
+SQL_CPF_NORMALIZADO = "REPLACE(REPLACE(REPLACE(cpf, '.', ''), '-', ''), ' ', '')"
+
+def _criar_busca_textual(cursor):
+    """Cria o índice FTS5 de título/autor, mantido em sincronia com `livros` por triggers."""
+    try:
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS livros_fts USING fts5(
+            titulo, autor,
+            content='livros', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )''')
+    except sqlite3.OperationalError as e:
+        logger.warning("FTS5 indisponível (%s); a busca de livros usará LIKE", e)
+        return
+    
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS livros_fts_insert AFTER INSERT ON livros BEGIN
+        INSERT INTO livros_fts(rowid, titulo, autor) VALUES (new.id, new.titulo, new.autor);
+    END''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS livros_fts_delete AFTER DELETE ON livros BEGIN
+        INSERT INTO livros_fts(livros_fts, rowid, titulo, autor)
+        VALUES ('delete', old.id, old.titulo, old.autor);
+    END''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS livros_fts_update AFTER UPDATE OF titulo, autor ON livros BEGIN
+        INSERT INTO livros_fts(livros_fts, rowid, titulo, autor)
+        VALUES ('delete', old.id, old.titulo, old.autor);
+        INSERT INTO livros_fts(rowid, titulo, autor) VALUES (new.id, new.titulo, new.autor);
+    END''')
+    cursor.execute("INSERT INTO livros_fts(livros_fts) VALUES ('rebuild')")
+
+# Contadores mantidos por triggers a partir de emprestimos:
+#   resumo_usuarios: empréstimos ativos e devolução prevista mais próxima
+#     (vencida => usuário em atraso), o que torna as regras de empréstimo O(1);
+#   resumo_livros: empréstimos ativos e total de empréstimos de cada livro.
+# A devolução mais próxima é relida do índice de empréstimos ativos do usuário
+# (no máximo Emprestimo.LIMITE_ATIVOS linhas).
+_SQL_PROXIMA_DEVOLUCAO = '''(
+    SELECT MIN(data_devolucao_prevista) FROM emprestimos
+    WHERE usuario_id = {0}.usuario_id AND data_devolucao_real IS NULL
+)'''
+
+def _sql_contar_emprestimo(linha: str, sinal: str) -> List[str]:
+    """Comandos de trigger que somam (sinal '+') ou subtraem ('-') o empréstimo `linha` (new/old)."""
+    return [
+        f'''INSERT OR IGNORE INTO resumo_usuarios (usuario_id, emprestimos_ativos)
+        SELECT {linha}.usuario_id, 0 WHERE {linha}.data_devolucao_real IS NULL;''',
+        f'''UPDATE resumo_usuarios
+        SET emprestimos_ativos = emprestimos_ativos {sinal} 1,
+            proxima_devolucao = {_SQL_PROXIMA_DEVOLUCAO.format(linha)}
+        WHERE usuario_id = {linha}.usuario_id AND {linha}.data_devolucao_real IS NULL;''',
+        f'''INSERT OR IGNORE INTO resumo_livros (livro_id, emprestimos_ativos, total_emprestimos)
+        VALUES ({linha}.livro_id, 0, 0);''',
+        f'''UPDATE resumo_livros
+        SET emprestimos_ativos = emprestimos_ativos {sinal} ({linha}.data_devolucao_real IS NULL),
+            total_emprestimos = total_emprestimos {sinal} 1
+        WHERE livro_id = {linha}.livro_id;''',
+    ]
+
+SQL_RECONSTRUIR_CONTADORES = [
+    'DELETE FROM resumo_usuarios',
+    '''
+    INSERT INTO resumo_usuarios (usuario_id, emprestimos_ativos, proxima_devolucao)
+    SELECT usuario_id, COUNT(*), MIN(data_devolucao_prevista)
+    FROM emprestimos WHERE data_devolucao_real IS NULL
+    GROUP BY usuario_id''',
+    'DELETE FROM resumo_livros',
+    '''
+    INSERT INTO resumo_livros (livro_id, emprestimos_ativos, total_emprestimos)
+    SELECT livro_id, SUM(data_devolucao_real IS NULL), COUNT(*)
+    FROM emprestimos
+    GROUP BY livro_id''',
+]
+
+# Diferenças entre os contadores e uma recontagem completa de emprestimos
+SQL_DIVERGENCIAS_CONTADORES = {
+    'resumo_usuarios': '''
+    WITH real AS (
+        SELECT usuario_id, COUNT(*) AS ativos, MIN(data_devolucao_prevista) AS proxima
+        FROM emprestimos WHERE data_devolucao_real IS NULL
+        GROUP BY usuario_id
+    )
+    SELECT real.usuario_id FROM real
+    LEFT JOIN resumo_usuarios r ON r.usuario_id = real.usuario_id
+    WHERE r.emprestimos_ativos IS NOT real.ativos OR r.proxima_devolucao IS NOT real.proxima
+    UNION
+    SELECT usuario_id FROM resumo_usuarios
+    WHERE emprestimos_ativos <> 0 AND usuario_id NOT IN (SELECT usuario_id FROM real)''',
+    'resumo_livros': '''
+    WITH real AS (
+        SELECT livro_id, SUM(data_devolucao_real IS NULL) AS ativos, COUNT(*) AS total
+        FROM emprestimos
+        GROUP BY livro_id
+    )
+    SELECT real.livro_id FROM real
+    LEFT JOIN resumo_livros r ON r.livro_id = real.livro_id
+    WHERE r.emprestimos_ativos IS NOT real.ativos OR r.total_emprestimos IS NOT real.total
+    UNION
+    SELECT livro_id FROM resumo_livros
+    WHERE total_emprestimos <> 0 AND livro_id NOT IN (SELECT livro_id FROM real)''',
+}
+
+# Atrasos apurados uma vez por dia (apurar_atrasos / atrasos.py). A tabela atrasos
+# guarda os empréstimos ativos vencidos até controle_atrasos.ultimo_dia; os
+# triggers a mantêm exata entre apurações (devoluções, prorrogações, exclusões),
+# e atrasos_usuarios é a contagem por usuário mantida a partir dela.
+_SQL_INCLUIR_ATRASO = '''
+INSERT INTO atrasos (emprestimo_id, usuario_id, data_devolucao_prevista)
+SELECT new.id, new.usuario_id, new.data_devolucao_prevista
+WHERE new.data_devolucao_real IS NULL
+AND new.data_devolucao_prevista < (SELECT ultimo_dia FROM controle_atrasos WHERE id = 1);'''
+
+SQL_APURAR_ATRASOS = '''
+INSERT OR IGNORE INTO atrasos (emprestimo_id, usuario_id, data_devolucao_prevista)
+SELECT id, usuario_id, data_devolucao_prevista FROM emprestimos
+WHERE data_devolucao_real IS NULL
+AND data_devolucao_prevista >= :desde AND data_devolucao_prevista < :hoje
+'''
+
+# Migrações do esquema, identificadas pelo número gravado em PRAGMA user_version.
+# Cada passo é um comando SQL ou uma função que recebe o cursor.
+# Tabelas cujas alterações são contadas em versoes_tabelas, para que caches em
+# outros processos (cache.py) percebam mudanças feitas por outra instância
+TABELAS_VERSIONADAS = ('usuarios', 'livros')
+
+def _sql_versionar(tabela: str, evento: str) -> str:
+    return f'''
+    CREATE TRIGGER {tabela}_versao_{evento.lower()} AFTER {evento} ON {tabela} BEGIN
+        UPDATE versoes_tabelas SET versao = versao + 1 WHERE tabela = '{tabela}';
+    END'''
+
+MIGRACOES = [
+    (1, [
+        '''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            email TEXT,
+            cpf TEXT UNIQUE NOT NULL
+        )''',
+        '''
+        CREATE TABLE IF NOT EXISTS livros (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titulo TEXT NOT NULL,
+            autor TEXT NOT NULL,
+            ano INTEGER,
+            copias_disponiveis INTEGER DEFAULT 1,
+            UNIQUE(titulo, autor)
+        )''',
+        '''
+        CREATE TABLE IF NOT EXISTS emprestimos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            livro_id INTEGER NOT NULL,
+            data_emprestimo TEXT NOT NULL,
+            data_devolucao_prevista TEXT NOT NULL,
+            data_devolucao_real TEXT,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+            FOREIGN KEY (livro_id) REFERENCES livros(id),
+            UNIQUE(usuario_id, livro_id, data_devolucao_real)
+        )''',
+    ]),
+    (2, [
+        # Empréstimos ativos por usuário: regras de validar_emprestimo
+        '''
+        CREATE INDEX IF NOT EXISTS idx_emprestimos_ativos_usuario
+        ON emprestimos(usuario_id, data_devolucao_prevista, livro_id)
+        WHERE data_devolucao_real IS NULL''',
+        # Empréstimos ativos por data prevista: listagens e relatório de atrasos
+        '''
+        CREATE INDEX IF NOT EXISTS idx_emprestimos_ativos_prevista
+        ON emprestimos(data_devolucao_prevista, usuario_id)
+        WHERE data_devolucao_real IS NULL''',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_emprestimos_livro
+        ON emprestimos(livro_id)''',
+    ]),
+    (3, [
+        # Índices na ordem das listagens paginadas por keyset: (coluna, id),
+        # já que o rowid é a última coluna implícita de todo índice
+        'DROP INDEX IF EXISTS idx_emprestimos_ativos_prevista',
+        '''
+        CREATE INDEX idx_emprestimos_ativos_prevista
+        ON emprestimos(data_devolucao_prevista)
+        WHERE data_devolucao_real IS NULL''',
+        'CREATE INDEX IF NOT EXISTS idx_livros_titulo ON livros(titulo)',
+        '''
+        CREATE INDEX IF NOT EXISTS idx_livros_disponiveis_titulo
+        ON livros(titulo) WHERE copias_disponiveis > 0''',
+        'CREATE INDEX IF NOT EXISTS idx_usuarios_nome ON usuarios(nome)',
+    ]),
+    (4, [_criar_busca_textual]),
+    (5, [
+        # Busca incremental de usuários por prefixo do nome ou do CPF
+        'CREATE INDEX IF NOT EXISTS idx_usuarios_nome_nocase ON usuarios(nome COLLATE NOCASE)',
+        f'CREATE INDEX IF NOT EXISTS idx_usuarios_cpf_normalizado ON usuarios({SQL_CPF_NORMALIZADO})',
+    ]),
+    (6, [
+        # Datas de empréstimo: TEXT 'AAAA-MM-DD' -> INTEGER (dias desde 1970-01-01).
+        # O SQLite não altera o tipo de colunas, então a tabela é reconstruída.
+        # Sem o UNIQUE(usuario_id, livro_id, data_devolucao_real) original: com
+        # datas em dias, ele impediria duas devoluções do mesmo livro pelo mesmo
+        # usuário num só dia.
+        '''
+        CREATE TABLE emprestimos_novo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            usuario_id INTEGER NOT NULL,
+            livro_id INTEGER NOT NULL,
+            data_emprestimo INTEGER NOT NULL,
+            data_devolucao_prevista INTEGER NOT NULL,
+            data_devolucao_real INTEGER,
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+            FOREIGN KEY (livro_id) REFERENCES livros(id)
+        )''',
+        '''
+        INSERT INTO emprestimos_novo
+        SELECT id, usuario_id, livro_id,
+               CAST(julianday(data_emprestimo) - 2440587.5 AS INTEGER),
+               CAST(julianday(data_devolucao_prevista) - 2440587.5 AS INTEGER),
+               CAST(julianday(data_devolucao_real) - 2440587.5 AS INTEGER)
+        FROM emprestimos''',
+        'DROP TABLE emprestimos',
+        'ALTER TABLE emprestimos_novo RENAME TO emprestimos',
+        '''
+        CREATE INDEX idx_emprestimos_ativos_usuario
+        ON emprestimos(usuario_id, data_devolucao_prevista, livro_id)
+        WHERE data_devolucao_real IS NULL''',
+        '''
+        CREATE INDEX idx_emprestimos_ativos_prevista
+        ON emprestimos(data_devolucao_prevista)
+        WHERE data_devolucao_real IS NULL''',
+        'CREATE INDEX idx_emprestimos_livro ON emprestimos(livro_id)',
+    ]),
+    (7, [
+        '''
+        CREATE TABLE resumo_usuarios (
+            usuario_id INTEGER PRIMARY KEY,
+            emprestimos_ativos INTEGER NOT NULL DEFAULT 0,
+            proxima_devolucao INTEGER
+        )''',
+        '''
+        CREATE INDEX idx_resumo_usuarios_proxima
+        ON resumo_usuarios(proxima_devolucao) WHERE proxima_devolucao IS NOT NULL''',
+        '''
+        CREATE TABLE resumo_livros (
+            livro_id INTEGER PRIMARY KEY,
+            emprestimos_ativos INTEGER NOT NULL DEFAULT 0,
+            total_emprestimos INTEGER NOT NULL DEFAULT 0
+        )''',
+        'CREATE TRIGGER emprestimos_contar_insert AFTER INSERT ON emprestimos BEGIN\n'
+        + '\n'.join(_sql_contar_emprestimo('new', '+')) + '\nEND',
+        'CREATE TRIGGER emprestimos_contar_delete AFTER DELETE ON emprestimos BEGIN\n'
+        + '\n'.join(_sql_contar_emprestimo('old', '-')) + '\nEND',
+        'CREATE TRIGGER emprestimos_contar_update AFTER UPDATE OF usuario_id, livro_id, '
+        'data_devolucao_prevista, data_devolucao_real ON emprestimos BEGIN\n'
+        + '\n'.join(_sql_contar_emprestimo('old', '-') + _sql_contar_emprestimo('new', '+')) + '\nEND',
+        *SQL_RECONSTRUIR_CONTADORES,
+    ]),
+    (8, [
+        '''
+        CREATE TABLE controle_atrasos (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            ultimo_dia INTEGER NOT NULL
+        )''',
+        '''
+        CREATE TABLE atrasos (
+            emprestimo_id INTEGER PRIMARY KEY,
+            usuario_id INTEGER NOT NULL,
+            data_devolucao_prevista INTEGER NOT NULL
+        )''',
+        'CREATE INDEX idx_atrasos_usuario ON atrasos(usuario_id, data_devolucao_prevista)',
+        '''
+        CREATE TABLE atrasos_usuarios (
+            usuario_id INTEGER PRIMARY KEY,
+            qtd_atrasos INTEGER NOT NULL,
+            primeira_prevista INTEGER
+        )''',
+        'CREATE INDEX idx_atrasos_usuarios_qtd ON atrasos_usuarios(qtd_atrasos)',
+        '''
+        CREATE TRIGGER atrasos_insert AFTER INSERT ON atrasos BEGIN
+            INSERT OR IGNORE INTO atrasos_usuarios (usuario_id, qtd_atrasos) VALUES (new.usuario_id, 0);
+            UPDATE atrasos_usuarios
+            SET qtd_atrasos = qtd_atrasos + 1,
+                primeira_prevista = MIN(COALESCE(primeira_prevista, new.data_devolucao_prevista),
+                                        new.data_devolucao_prevista)
+            WHERE usuario_id = new.usuario_id;
+        END''',
+        '''
+        CREATE TRIGGER atrasos_delete AFTER DELETE ON atrasos BEGIN
+            UPDATE atrasos_usuarios
+            SET qtd_atrasos = qtd_atrasos - 1,
+                primeira_prevista = (
+                    SELECT MIN(data_devolucao_prevista) FROM atrasos WHERE usuario_id = old.usuario_id
+                )
+            WHERE usuario_id = old.usuario_id;
+            DELETE FROM atrasos_usuarios WHERE usuario_id = old.usuario_id AND qtd_atrasos <= 0;
+        END''',
+        f'CREATE TRIGGER emprestimos_atraso_insert AFTER INSERT ON emprestimos BEGIN{_SQL_INCLUIR_ATRASO}\nEND',
+        '''
+        CREATE TRIGGER emprestimos_atraso_delete AFTER DELETE ON emprestimos BEGIN
+            DELETE FROM atrasos WHERE emprestimo_id = old.id;
+        END''',
+        'CREATE TRIGGER emprestimos_atraso_update AFTER UPDATE OF usuario_id, '
+        'data_devolucao_prevista, data_devolucao_real ON emprestimos BEGIN\n'
+        f'DELETE FROM atrasos WHERE emprestimo_id = old.id;{_SQL_INCLUIR_ATRASO}\nEND',
+        # A lista de atrasos passou a vir de atrasos_usuarios
+        'DROP INDEX idx_resumo_usuarios_proxima',
+    ]),
+    (9, [
+        '''
+        CREATE TABLE versoes_tabelas (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID''',
+        *(f"INSERT INTO versoes_tabelas (tabela) VALUES ('{tabela}')" for tabela in TABELAS_VERSIONADAS),
+        *(_sql_versionar(tabela, evento)
+          for tabela in TABELAS_VERSIONADAS for evento in ('INSERT', 'UPDATE', 'DELETE')),
+    ]),
+    # Versão de cada registro, para atualizações por compare-and-swap
+    (10, [
+        'ALTER TABLE usuarios ADD COLUMN versao INTEGER NOT NULL DEFAULT 1',
+        'ALTER TABLE livros ADD COLUMN versao INTEGER NOT NULL DEFAULT 1',
+    ]),
+]
+
+VERSAO_ESQUEMA = MIGRACOES[-1][0]
+
+# Linhas lidas por consulta nos métodos iterar_*
+TAMANHO_PAGINA = 1000
+
+def _chave_apos(valor, id_: Optional[int]) -> Optional[tuple]:
+    """Chave de keyset (valor, id); sem id, continua após todas as linhas com `valor`."""
+    if valor is None:
+        return None
+    return (valor, id_ if id_ is not None else 2 ** 63 - 1)
+
+def _iterar_paginas(buscar: Callable[[Optional[tuple]], list], chave: Callable) -> Iterator:
+    """Gera as linhas de `buscar(apos)` página a página, até uma página vazia."""
+    apos = None
+    while True:
+        pagina = buscar(apos)
+        if not pagina:
+            return
+        yield from pagina
+        apos = chave(pagina[-1])
+
+# Candidatos lidos do índice de texto antes da ordenação por relevância
+JANELA_BUSCA = 1000
+
+def _normalizar(texto: str) -> str:
+    """Minúsculas e sem acentos, como o tokenizador do índice FTS5."""
+    decomposto = unicodedata.normalize('NFKD', texto.casefold())
+    return ''.join(c for c in decomposto if not unicodedata.combining(c))
+
+def _relevancia(livro: Livro, termos: List[str]) -> tuple:
+    """Chave de ordenação da busca: mais termos no título primeiro, depois títulos curtos."""
+    titulo = re.findall(r'\w+', _normalizar(livro.titulo or ''))
+    autor = re.findall(r'\w+', _normalizar(livro.autor or ''))
+    pontos = 0
+    for termo in termos:
+        if any(palavra.startswith(termo) for palavra in titulo):
+            pontos += 2
+        elif any(palavra.startswith(termo) for palavra in autor):
+            pontos += 1
+    return (-pontos, len(livro.titulo or ''), livro.titulo or '')
+
+# Registro de consultas nomeadas. Cada comando tem um texto fixo, montado uma
+# única vez, de modo que o cache de comandos compilados do sqlite3 (por conexão;
+# as do pool são persistentes) o reaproveite a cada execução. Database valida
+# todos ao abrir o banco e mede o tempo de cada execução pelo nome.
+CONSULTAS: Dict[str, str] = {
+    'usuarios.inserir': 'INSERT INTO usuarios (nome, email, cpf) VALUES (?, ?, ?)',
+    'usuarios.obter': f'SELECT {COLUNAS_USUARIO} FROM usuarios WHERE id = ?',
+    # Compare-and-swap: só grava se a versão lida ainda for a atual (versão NULL grava sempre)
+    'usuarios.atualizar': '''
+        UPDATE usuarios SET nome = :nome, email = :email, cpf = :cpf, versao = versao + 1
+        WHERE id = :id AND versao = COALESCE(:versao, versao)''',
+    'usuarios.versao': 'SELECT versao FROM usuarios WHERE id = ?',
+    'usuarios.remover': 'DELETE FROM usuarios WHERE id = ?',
+    'usuarios.contar': 'SELECT COUNT(*) FROM usuarios',
+    # Intervalo [prefixo, prefixo + ':'), pois ':' sucede '9' na tabela ASCII
+    'usuarios.buscar_cpf': f'''
+        SELECT {COLUNAS_USUARIO} FROM usuarios
+        WHERE {SQL_CPF_NORMALIZADO} >= ? AND {SQL_CPF_NORMALIZADO} < ?
+        ORDER BY {SQL_CPF_NORMALIZADO}
+        LIMIT ?''',
+    'usuarios.buscar_nome': f'''
+        SELECT {COLUNAS_USUARIO} FROM usuarios
+        WHERE nome LIKE ? ESCAPE '\\'
+        ORDER BY nome COLLATE NOCASE
+        LIMIT ?''',
+    'usuarios.em_atraso': SQL_USUARIOS_EM_ATRASO,
+
+    'livros.inserir': 'INSERT INTO livros (titulo, autor, ano, copias_disponiveis) VALUES (?, ?, ?, ?)',
+    'livros.obter': f'SELECT {COLUNAS_LIVRO} FROM livros WHERE id = ?',
+    'livros.atualizar': '''
+        UPDATE livros
+        SET titulo = :titulo, autor = :autor, ano = :ano, copias_disponiveis = :copias_disponiveis,
+            versao = versao + 1
+        WHERE id = :id AND versao = COALESCE(:versao, versao)''',
+    'livros.versao': 'SELECT versao FROM livros WHERE id = ?',
+    'livros.remover': 'DELETE FROM livros WHERE id = ?',
+    'livros.contar': 'SELECT COUNT(*) FROM livros',
+    'livros.contar_disponiveis': 'SELECT COUNT(*) FROM livros WHERE copias_disponiveis > 0',
+    'livros.retirar_copia': '''
+        UPDATE livros SET copias_disponiveis = copias_disponiveis - 1, versao = versao + 1
+        WHERE id = ? AND copias_disponiveis > 0''',
+    'livros.devolver_copia': '''
+        UPDATE livros SET copias_disponiveis = copias_disponiveis + 1, versao = versao + 1
+        WHERE id = ?''',
+    'livros.buscar_fts': f'''
+        SELECT {', '.join('l.' + campo for campo in Livro.CAMPOS)} FROM livros_fts f
+        JOIN livros l ON l.id = f.rowid
+        WHERE livros_fts MATCH ?
+        LIMIT ?''',
+    'livros.buscar_fts_disponiveis': f'''
+        SELECT {', '.join('l.' + campo for campo in Livro.CAMPOS)} FROM livros_fts f
+        JOIN livros l ON l.id = f.rowid
+        WHERE livros_fts MATCH ? AND l.copias_disponiveis > 0
+        LIMIT ?''',
+
+    'emprestimos.inserir': '''
+        INSERT INTO emprestimos (usuario_id, livro_id, data_emprestimo, data_devolucao_prevista)
+        VALUES (?, ?, ?, ?)''',
+    'emprestimos.obter': f'SELECT {COLUNAS_EMPRESTIMO} FROM emprestimos WHERE id = ?',
+    'emprestimos.situacao': 'SELECT livro_id, data_devolucao_real FROM emprestimos WHERE id = ?',
+    'emprestimos.devolver': 'UPDATE emprestimos SET data_devolucao_real = ? WHERE id = ? AND data_devolucao_real IS NULL',
+    'emprestimos.validar': SQL_VALIDACAO_EMPRESTIMO,
+    'emprestimos.contar_ativos': 'SELECT COUNT(*) FROM emprestimos WHERE data_devolucao_real IS NULL',
+
+    'atrasos.ultimo_dia': 'SELECT ultimo_dia FROM controle_atrasos WHERE id = 1',
+    'atrasos.limpar': 'DELETE FROM atrasos',
+    'atrasos.limpar_usuarios': 'DELETE FROM atrasos_usuarios',
+    'atrasos.apurar': SQL_APURAR_ATRASOS,
+    'atrasos.gravar_dia': 'INSERT OR REPLACE INTO controle_atrasos (id, ultimo_dia) VALUES (1, ?)',
+
+    'versoes.ler': 'SELECT tabela, versao FROM versoes_tabelas',
+
+    **{f'contadores.divergencias_{tabela}': sql for tabela, sql in SQL_DIVERGENCIAS_CONTADORES.items()},
+    **{f'contadores.reconstruir_{n}': sql for n, sql in enumerate(SQL_RECONSTRUIR_CONTADORES, 1)},
+    **{f'relatorios.{nome}': sql for nome, (_, sql) in RELATORIOS.items()},
+    **{f'relatorios.{nome}.contar': f'SELECT COUNT(*) FROM ({sql})' for nome, (_, sql) in RELATORIOS.items()},
+}
+
+# Consultas que dependem do índice de texto (ausente sem FTS5)
+_CONSULTAS_FTS = {'livros.buscar_fts', 'livros.buscar_fts_disponiveis'}
+
+@lru_cache(maxsize=None)
+def _sql_pagina(select: str, filtros: Tuple[str, ...], chave: Tuple[str, ...], apos: bool,
+                antes: bool, limite: bool) -> str:
+    """Texto da consulta paginada por keyset; montado uma vez por combinação de opções."""
+    filtros = list(filtros)
+    colunas = ', '.join(chave)
+    marcadores = ', '.join('?' * len(chave))
+    if apos:
+        filtros.append(f'({colunas}) > ({marcadores})')
+    if antes:
+        filtros.append(f'({colunas}) < ({marcadores})')
+    
+    # Página anterior: lê em ordem decrescente a partir da chave (o chamador inverte)
+    direcao = ' DESC' if antes and not apos else ''
+    sql = select
+    if filtros:
+        sql += ' WHERE ' + ' AND '.join(filtros)
+    sql += ' ORDER BY ' + ', '.join(coluna + direcao for coluna in chave)
+    if limite:
+        sql += ' LIMIT ? OFFSET ?'
+    return sql
+
+@lru_cache(maxsize=64)
+def _sql_busca_like(termos: int, disponiveis: bool) -> str:
+    filtros = ['(titulo LIKE ? OR autor LIKE ?)'] * termos
+    if disponiveis:
+        filtros.append('copias_disponiveis > 0')
+    return f'SELECT {COLUNAS_LIVRO} FROM livros WHERE ' + ' AND '.join(filtros) + ' LIMIT ?'
+
+# Consultas a partir desta duração (em segundos) são registradas no log com o plano
+LIMITE_CONSULTA_LENTA = 0.2
+# Consultas lentas mantidas em memória para a janela de diagnóstico
+HISTORICO_LENTAS = 50
+
+class EstatisticasConsultas:
+    """Execuções, tempo e linhas acumulados por consulta nomeada.
+    
+    Guarda também o tempo de espera por conexões do pool e as últimas
+    consultas lentas. Ganchos adicionados com adicionar_gancho recebem
+    (nome, segundos, linhas) a cada execução, na thread que executou a
+    consulta.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._dados: Dict[str, list] = {}
+        self._esperas = [0, 0.0, 0.0]  # conexões obtidas, espera total, espera máxima
+        self._lentas = deque(maxlen=HISTORICO_LENTAS)
+        self._ganchos: List[Callable[[str, float, int], None]] = []
+    
+    def adicionar_gancho(self, gancho: Callable[[str, float, int], None]):
+        self._ganchos.append(gancho)
+    
+    def remover_gancho(self, gancho: Callable[[str, float, int], None]):
+        self._ganchos.remove(gancho)
+    
+    def registrar(self, nome: str, segundos: float, linhas: int = 0):
+        with self._lock:
+            dados = self._dados.get(nome)
+            if dados is None:
+                dados = self._dados[nome] = [0, 0.0, 0.0, 0]
+            dados[0] += 1
+            dados[1] += segundos
+            dados[2] = max(dados[2], segundos)
+            dados[3] += linhas
+        for gancho in self._ganchos:
+            gancho(nome, segundos, linhas)
+    
+    def registrar_espera(self, segundos: float):
+        with self._lock:
+            self._esperas[0] += 1
+            self._esperas[1] += segundos
+            self._esperas[2] = max(self._esperas[2], segundos)
+    
+    def registrar_lenta(self, lenta: dict):
+        with self._lock:
+            self._lentas.append(lenta)
+    
+    def resumo(self) -> List[dict]:
+        """Consultas da que mais consumiu tempo para a que menos consumiu."""
+        with self._lock:
+            itens = [(nome, list(dados)) for nome, dados in self._dados.items()]
+        return sorted((
+            {
+                'consulta': nome,
+                'execucoes': execucoes,
+                'tempo_total': total,
+                'tempo_medio': total / execucoes,
+                'tempo_max': maximo,
+                'linhas': linhas,
+            }
+            for nome, (execucoes, total, maximo, linhas) in itens
+        ), key=lambda item: item['tempo_total'], reverse=True)
+    
+    def esperas(self) -> dict:
+        """Tempo gasto aguardando conexões do pool."""
+        with self._lock:
+            conexoes, total, maximo = self._esperas
+        return {
+            'conexoes': conexoes,
+            'tempo_total': total,
+            'tempo_medio': total / conexoes if conexoes else 0.0,
+            'tempo_max': maximo,
+        }
+    
+    def lentas(self) -> List[dict]:
+        """Últimas consultas lentas, da mais recente para a mais antiga."""
+        with self._lock:
+            return list(reversed(self._lentas))
+    
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+            self._esperas = [0, 0.0, 0.0]
+            self._lentas.clear()
+
+class _Cursor(sqlite3.Cursor):
+    """Cursor que guarda quanto tempo se esperou pela sua conexão."""
+    espera = 0.0
+
+MOTIVOS_RECUSA = {
+    'usuario_inexistente': "Usuário não encontrado",
+    'livro_inexistente': "Livro não encontrado",
+    'atraso': "Usuário possui empréstimos em atraso",
+    'limite': "Usuário já atingiu o limite de empréstimos ativos",
+    'livro_repetido': "Usuário já possui um exemplar deste livro",
+    'sem_copias': "Não há cópias disponíveis deste livro",
+}
+
+MOTIVOS_DEVOLUCAO = {
+    'emprestimo_inexistente': "Empréstimo não encontrado",
+    'ja_devolvido': "Empréstimo já devolvido",
+}
+
+# Código de um item de emprestar_lote/devolver_lote registrado com sucesso
+ITEM_OK = 'ok'
+
+class ResultadoItem(NamedTuple):
+    """Resultado de um item de emprestar_lote ou devolver_lote.
+    
+    `codigo` é ITEM_OK ou uma chave de MOTIVOS_RECUSA (empréstimo) ou de
+    MOTIVOS_DEVOLUCAO (devolução).
+    """
+    livro_id: Optional[int]
+    emprestimo_id: Optional[int]
+    codigo: str
+
+class ConflitoAtualizacao(Exception):
+    """O registro foi alterado por outra operação desde que foi lido (versão diferente da esperada)."""
+
+    def __init__(self, tabela: str, registro_id: int, versao_esperada: int, versao_atual: int):
+        self.tabela = tabela
+        self.registro_id = registro_id
+        self.versao_esperada = versao_esperada
+        self.versao_atual = versao_atual
+        super().__init__(
+            f"Registro {registro_id} de {tabela} alterado por outra operação "
+            f"(versão {versao_atual}, esperada {versao_esperada})"
+        )
+
+class EmprestimoNegado(ValueError):
+    """Empréstimo recusado por uma regra de negócio; `motivo` é uma chave de MOTIVOS_RECUSA."""
+
+    def __init__(self, motivo: str):
+        self.motivo = motivo
+        super().__init__(f"Empréstimo não permitido: {MOTIVOS_RECUSA.get(motivo, motivo)}")
+
+# Perfis de armazenamento: PRAGMAs aplicados a cada conexão aberta pelo pool.
+# journal_mode=WAL deixa leitores e o escritor trabalharem em paralelo e fica
+# gravado no arquivo; os demais valem por conexão. 'checkpoint_segundos' é o
+# intervalo do checkpoint periódico do WAL (None desliga).
+PERFIS_ARMAZENAMENTO = {
+    # Uso interativo: commit durável no checkpoint, memória modesta
+    'desktop': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -16384,  # KiB (16 MiB)
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,
+        'wal_autocheckpoint': 1000,
+        'checkpoint_segundos': 300,
+    },
+    # Vários clientes simultâneos: cache maior e espera mais longa por locks
+    'server': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'cache_size': -65536,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 15000,
+        'wal_autocheckpoint': 1000,
+        'checkpoint_segundos': 60,
+    },
+    # Cargas em lote: sem fsync (uma queda de energia pode perder a carga em
+    # andamento) e WAL maior entre checkpoints
+    'bulk-load': {
+        'journal_mode': 'WAL',
+        'synchronous': 'OFF',
+        'cache_size': -262144,
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 30000,
+        'wal_autocheckpoint': 10000,
+        'checkpoint_segundos': None,
+    },
+}
+
+PERFIL_PADRAO = 'desktop'
+
+# Comandos compilados mantidos por conexão além dos registrados em CONSULTAS
+# (variantes de paginação e de busca)
+CACHE_VARIANTES = 64
+
+class ConnectionPool:
+    """Pool limitado de conexões SQLite reutilizadas entre chamadas."""
+
+    def __init__(self, db_name: str, max_conexoes: int = 5, timeout: float = 30.0,
+                 perfil: str = PERFIL_PADRAO):
+        if perfil not in PERFIS_ARMAZENAMENTO:
+            raise ValueError(f"Perfil de armazenamento desconhecido: {perfil}")
+        self.db_name = db_name
+        self.max_conexoes = max_conexoes
+        self.timeout = timeout
+        self.perfil = perfil
+        self._livres = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._criadas = 0
+        self._fechado = False
+        self._stats = {
+            'checkouts': 0,
+            'esperas': 0,
+            'tempo_espera': 0.0,
+            'conexoes_criadas': 0,
+            'conexoes_descartadas': 0,
+        }
+
+    def _conectar(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.db_name, check_same_thread=False,
+            cached_statements=len(CONSULTAS) + CACHE_VARIANTES
+        )
+        conn.row_factory = sqlite3.Row
+        try:
+            for pragma, valor in PERFIS_ARMAZENAMENTO[self.perfil].items():
+                if pragma != 'checkpoint_segundos':
+                    conn.execute(f'PRAGMA {pragma} = {valor}')
+        except sqlite3.Error:
+            conn.close()
+            raise
+        with self._lock:
+            self._stats['conexoes_criadas'] += 1
+        return conn
+
+    @staticmethod
+    def _saudavel(conn: sqlite3.Connection) -> bool:
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _descartar(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._criadas -= 1
+            self._stats['conexoes_descartadas'] += 1
+
+    def acquire(self) -> sqlite3.Connection:
+        """Retira uma conexão do pool, criando uma nova se houver espaço."""
+        if self._fechado:
+            raise RuntimeError("Pool de conexões encerrado")
+
+        while True:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                conn = None
+                with self._lock:
+                    if self._criadas < self.max_conexoes:
+                        self._criadas += 1
+                        criar = True
+                    else:
+                        criar = False
+                if criar:
+                    try:
+                        conn = self._conectar()
+                    except Exception:
+                        with self._lock:
+                            self._criadas -= 1
+                        raise
+                else:
+                    inicio = time.perf_counter()
+                    try:
+                        conn = self._livres.get(timeout=self.timeout)
+                    except queue.Empty:
+                        raise TimeoutError("Nenhuma conexão disponível no pool")
+                    finally:
+                        with self._lock:
+                            self._stats['esperas'] += 1
+                            self._stats['tempo_espera'] += time.perf_counter() - inicio
+
+            if conn is not None and not self._saudavel(conn):
+                self._descartar(conn)
+                continue
+
+            with self._lock:
+                self._stats['checkouts'] += 1
+            return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Devolve a conexão ao pool (ou a fecha, se o pool foi encerrado)."""
+        if conn.in_transaction:
+            conn.rollback()
+        if self._fechado:
+            self._descartar(conn)
+        else:
+            self._livres.put(conn)
+
+    def close(self):
+        """Fecha todas as conexões livres; as em uso são fechadas ao retornar."""
+        self._fechado = True
+        while True:
+            try:
+                conn = self._livres.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+    def stats(self) -> dict:
+        """Estatísticas de uso do pool."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['conexoes_abertas'] = self._criadas
+        checkouts = stats['checkouts']
+        reusos = max(checkouts - stats['conexoes_criadas'], 0)
+        stats['taxa_reuso'] = reusos / checkouts if checkouts else 0.0
+        return stats
 
 class Database:
-    def __init__(self, db_name='biblioteca.db'):
+    def __init__(self, db_name='biblioteca.db', max_conexoes: int = 5, perfil: str = PERFIL_PADRAO,
+                 limite_consulta_lenta: float = LIMITE_CONSULTA_LENTA):
         self.db_name = db_name
+        self.limite_consulta_lenta = limite_consulta_lenta
+        self.pool = ConnectionPool(db_name, max_conexoes, perfil=perfil)
+        self.consultas = EstatisticasConsultas()
         self._criar_tabelas()
+        self._busca_textual = self._tem_tabela('livros_fts')
+        self._validar_consultas()
+        
+        self._parar_checkpoint = threading.Event()
+        self._checkpoint_thread = None
+        intervalo = PERFIS_ARMAZENAMENTO[perfil]['checkpoint_segundos']
+        if intervalo:
+            self._checkpoint_thread = threading.Thread(
+                target=self._checkpoint_periodico, args=(intervalo,),
+                name='wal-checkpoint', daemon=True
+            )
+            self._checkpoint_thread.start()
     
     @contextmanager
-    def _get_cursor(self):
-        conn = sqlite3.connect(self.db_name)
-        conn.row_factory = sqlite3.Row
-        cursor = conn.cursor()
+    def _get_cursor(self, imediata: bool = False):
+        inicio = time.perf_counter()
+        conn = self.pool.acquire()
+        cursor = conn.cursor(_Cursor)
+        cursor.espera = time.perf_counter() - inicio
+        self.consultas.registrar_espera(cursor.espera)
         try:
+            if imediata:
+                # Reserva o lock de escrita já no início da transação
+                cursor.execute('BEGIN IMMEDIATE')
+                self._inicio_escrita(conn)
+                alteracoes = conn.total_changes
             yield cursor
+            # Só com a transação ainda aberta: após um rollback o lock de escrita
+            # já foi liberado e as versões lidas poderiam incluir outros commits
+            if imediata and conn.in_transaction and conn.total_changes != alteracoes:
+                self._fim_escrita(conn)
             conn.commit()
         except Exception as e:
             conn.rollback()
             raise e
         finally:
-            conn.close()
+            cursor.close()
+            self.pool.release(conn)
+    
+    def _inicio_escrita(self, conn: sqlite3.Connection):
+        """Chamado logo após BEGIN IMMEDIATE, já com o lock de escrita (ver cache.py)."""
+    
+    def _fim_escrita(self, conn: sqlite3.Connection):
+        """Chamado antes do commit de uma transação IMMEDIATE que alterou linhas."""
+    
+    def fechar(self):
+        """Encerra o checkpoint periódico, esvazia o WAL e fecha o pool de conexões."""
+        self._parar_checkpoint.set()
+        if self._checkpoint_thread:
+            self._checkpoint_thread.join()
+        try:
+            self.checkpoint('TRUNCATE')
+        except (sqlite3.Error, RuntimeError) as e:
+            logger.warning("Checkpoint final do WAL falhou: %s", e)
+        self.pool.close()
+    
+    def checkpoint(self, modo: str = 'PASSIVE') -> Tuple[int, int, int]:
+        """Copia o WAL para o banco; devolve (ocupado, páginas no WAL, páginas copiadas)."""
+        if modo not in ('PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'):
+            raise ValueError(f"Modo de checkpoint inválido: {modo}")
+        with self._get_cursor() as cursor:
+            cursor.execute(f'PRAGMA wal_checkpoint({modo})')
+            return tuple(cursor.fetchone())
+    
+    def _checkpoint_periodico(self, intervalo: float):
+        while not self._parar_checkpoint.wait(intervalo):
+            try:
+                ocupado, paginas, copiadas = self.checkpoint()
+                logger.debug("Checkpoint do WAL: %d de %d páginas copiadas", copiadas, paginas)
+            except Exception as e:
+                logger.warning("Checkpoint periódico do WAL falhou: %s", e)
+    
+    def estatisticas_pool(self) -> dict:
+        return self.pool.stats()
+    
+    def estatisticas_consultas(self) -> List[dict]:
+        """Execuções e tempos por consulta nomeada, da mais custosa para a menos custosa."""
+        return self.consultas.resumo()
+    
+    def estatisticas_espera(self) -> dict:
+        """Tempo gasto aguardando conexões do pool, somado sobre todas as operações."""
+        return self.consultas.esperas()
+    
+    def consultas_lentas(self) -> List[dict]:
+        """Últimas consultas acima de `limite_consulta_lenta`, com o plano de execução."""
+        return self.consultas.lentas()
+    
+    def limpar_estatisticas(self):
+        """Zera as estatísticas de consultas, de espera e as consultas lentas."""
+        self.consultas.limpar()
+    
+    def _validar_consultas(self):
+        """Compila cada consulta registrada (via EXPLAIN) para detectar erros já na abertura."""
+        with self._get_cursor() as cursor:
+            for nome, sql in CONSULTAS.items():
+                if nome in _CONSULTAS_FTS and not self._busca_textual:
+                    continue
+                try:
+                    cursor.execute('EXPLAIN ' + sql)
+                except sqlite3.ProgrammingError:
+                    pass  # compilou; só faltaram os parâmetros
+                except sqlite3.OperationalError as e:
+                    raise sqlite3.OperationalError(f"Consulta '{nome}' inválida: {e}") from e
+    
+    # Execução medida das consultas registradas
+    def _executar(self, cursor, nome: str, params=(), sql: Optional[str] = None):
+        """Executa a consulta `nome` (ou `sql`, uma variante dela) e registra o tempo."""
+        sql = sql or CONSULTAS[nome]
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        self._registrar(cursor, nome, sql, params, time.perf_counter() - inicio, max(cursor.rowcount, 0))
+        return cursor
+    
+    def _consultar(self, cursor, nome: str, params=(), sql: Optional[str] = None) -> list:
+        """Executa e lê todas as linhas, registrando o tempo total e a quantidade de linhas."""
+        sql = sql or CONSULTAS[nome]
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        linhas = cursor.fetchall()
+        self._registrar(cursor, nome, sql, params, time.perf_counter() - inicio, len(linhas))
+        return linhas
+    
+    def _consultar_um(self, cursor, nome: str, params=()):
+        sql = CONSULTAS[nome]
+        inicio = time.perf_counter()
+        cursor.execute(sql, params)
+        linha = cursor.fetchone()
+        self._registrar(cursor, nome, sql, params, time.perf_counter() - inicio, int(linha is not None))
+        return linha
+    
+    def _registrar(self, cursor, nome: str, sql: str, params, segundos: float, linhas: int):
+        """Acumula as estatísticas da execução e registra no log as que passarem do limite.
+        
+        `params=None` indica um executemany, cujo plano não é levantado.
+        """
+        self.consultas.registrar(nome, segundos, linhas)
+        if segundos < self.limite_consulta_lenta:
+            return
+        
+        plano = []
+        if params is not None:
+            try:
+                # Cursor à parte, para não alterar rowcount/lastrowid do cursor da consulta
+                plano = [
+                    linha[3] for linha in
+                    cursor.connection.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()
+                ]
+            except sqlite3.Error as e:
+                plano = [f"(plano indisponível: {e})"]
+        espera = getattr(cursor, 'espera', 0.0)
+        self.consultas.registrar_lenta({
+            'consulta': nome,
+            'quando': datetime.now(),
+            'tempo': segundos,
+            'linhas': linhas,
+            'espera': espera,
+            'sql': ' '.join(sql.split()),
+            'plano': plano,
+        })
+        logger.warning(
+            "Consulta lenta %s: %.1f ms, %d linhas, %.1f ms de espera pela conexão; plano: %s",
+            nome, segundos * 1000, linhas, espera * 1000, '; '.join(plano) or '-'
+        )
     
     def _criar_tabelas(self):
+        """Aplica, em ordem, as migrações ainda não registradas em PRAGMA user_version."""
         with self._get_cursor() as cursor:
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                email TEXT,
-                cpf TEXT UNIQUE NOT NULL
-            )''')
+            cursor.execute('PRAGMA user_version')
+            if cursor.fetchone()[0] >= VERSAO_ESQUEMA:
+                return
             
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS livros (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titulo TEXT NOT NULL,
-                autor TEXT NOT NULL,
-                ano INTEGER,
-                copias_disponiveis INTEGER DEFAULT 1,
-                UNIQUE(titulo, autor)
-            )''')
+            cursor.execute('BEGIN IMMEDIATE')
+            # Relê a versão com o lock de escrita, caso outro processo tenha migrado antes
+            cursor.execute('PRAGMA user_version')
+            versao_atual = cursor.fetchone()[0]
+            for versao, passos in MIGRACOES:
+                if versao <= versao_atual:
+                    continue
+                for passo in passos:
+                    if callable(passo):
+                        passo(cursor)
+                    else:
+                        cursor.execute(passo)
+                cursor.execute(f'PRAGMA user_version = {versao}')
+                logger.info("Esquema do banco migrado para a versão %d", versao)
+    
+    def _tem_tabela(self, nome: str) -> bool:
+        with self._get_cursor() as cursor:
+            cursor.execute('SELECT 1 FROM sqlite_master WHERE name = ?', (nome,))
+            return cursor.fetchone() is not None
+    
+    def verificar_indices(self) -> Dict[str, Tuple[bool, List[str]]]:
+        """Executa EXPLAIN QUERY PLAN nas consultas críticas.
+        
+        Retorna, para cada consulta, se ela evita varredura completa de tabela
+        e as linhas do plano gerado pelo SQLite.
+        """
+        resultado = {}
+        with self._get_cursor() as cursor:
+            for nome, (sql, params) in CONSULTAS_CRITICAS.items():
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                plano = [row[3] for row in cursor.fetchall()]
+                subconsultas = {m.group(1) for m in map(_SUBCONSULTA.match, plano) if m}
+                usa_indice = not any(
+                    m and m.group(1) not in subconsultas
+                    for m in map(_VARREDURA_COMPLETA.match, plano)
+                )
+                resultado[nome] = (usa_indice, plano)
+        return resultado
+    
+    def verificar_contadores(self, reconstruir: bool = False) -> Dict[str, List[int]]:
+        """Compara resumo_usuarios/resumo_livros com uma recontagem de emprestimos.
+        
+        Retorna os ids divergentes de cada tabela; com `reconstruir=True`, havendo
+        divergência, recalcula os contadores do zero.
+        """
+        with self._get_cursor(imediata=reconstruir) as cursor:
+            divergencias = {}
+            for tabela in SQL_DIVERGENCIAS_CONTADORES:
+                linhas = self._consultar(cursor, f'contadores.divergencias_{tabela}')
+                divergencias[tabela] = [row[0] for row in linhas]
             
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS emprestimos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                livro_id INTEGER NOT NULL,
-                data_emprestimo TEXT NOT NULL,
-                data_devolucao_prevista TEXT NOT NULL,
-                data_devolucao_real TEXT,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
-                FOREIGN KEY (livro_id) REFERENCES livros(id),
-                UNIQUE(usuario_id, livro_id, data_devolucao_real)
-            )''')
+            if reconstruir and any(divergencias.values()):
+                logger.warning("Contadores divergentes, reconstruindo: %s", divergencias)
+                for n in range(1, len(SQL_RECONSTRUIR_CONTADORES) + 1):
+                    self._executar(cursor, f'contadores.reconstruir_{n}')
+            return divergencias
+    
+    def apurar_atrasos(self, hoje: Optional[date] = None) -> dict:
+        """Atualiza a tabela atrasos até `hoje` (padrão: data atual).
+        
+        Incremental: só os empréstimos com devolução prevista entre a apuração
+        anterior e `hoje` são lidos. Na primeira execução, ou se `hoje` for
+        anterior à última apuração, a tabela é recalculada inteira.
+        """
+        dia = dia_de_data(hoje) if hoje else dia_hoje()
+        with self._get_cursor(imediata=True) as cursor:
+            row = self._consultar_um(cursor, 'atrasos.ultimo_dia')
+            ultimo_dia = row[0] if row else None
+            if ultimo_dia == dia:
+                return {'dia': data_de_dia(dia), 'novos': 0, 'completa': False}
+            
+            completa = ultimo_dia is None or dia < ultimo_dia
+            if completa:
+                self._executar(cursor, 'atrasos.limpar')
+                self._executar(cursor, 'atrasos.limpar_usuarios')
+                ultimo_dia = dia_de_data(date.min)
+            novos = self._executar(cursor, 'atrasos.apurar', {'desde': ultimo_dia, 'hoje': dia}).rowcount
+            self._executar(cursor, 'atrasos.gravar_dia', (dia,))
+        
+        logger.info("Atrasos apurados até %s: %d novos%s", data_de_dia(dia), novos,
+                     " (apuração completa)" if completa else "")
+        return {'dia': data_de_dia(dia), 'novos': novos, 'completa': completa}
     
     # CRUD Usuários
     def criar_usuario(self, usuario: Usuario) -> int:
@@ -64,203 +1215,465 @@ class Database:
         if not usuario.validar_email():
             raise ValueError("E-mail inválido")
         
-        with self._get_cursor() as cursor:
-            cursor.execute('''
-            INSERT INTO usuarios (nome, email, cpf)
-            VALUES (?, ?, ?)
-            ''', (usuario.nome, usuario.email, usuario.cpf))
+        with self._get_cursor(imediata=True) as cursor:
+            self._executar(cursor, 'usuarios.inserir', (usuario.nome, usuario.email, usuario.cpf))
             return cursor.lastrowid
     
     def obter_usuario(self, usuario_id: int) -> Optional[Usuario]:
         with self._get_cursor() as cursor:
-            cursor.execute('SELECT * FROM usuarios WHERE id = ?', (usuario_id,))
-            row = cursor.fetchone()
-            return Usuario(**row) if row else None
+            cursor.row_factory = _linha_usuario
+            return self._consultar_um(cursor, 'usuarios.obter', (usuario_id,))
     
     def atualizar_usuario(self, usuario: Usuario) -> bool:
+        """Grava o usuário se `usuario.versao` ainda for a do banco; False se não existe.
+        
+        Levanta ConflitoAtualizacao se outra operação o alterou desde a leitura.
+        Com `versao=None` grava sem conferir (a última gravação prevalece):
+        telas de edição devem sempre passar a versão que leram.
+        """
         if not usuario.validar_cpf():
             raise ValueError("CPF inválido")
         if not usuario.validar_email():
             raise ValueError("E-mail inválido")
         
-        with self._get_cursor() as cursor:
-            cursor.execute('''
-            UPDATE usuarios 
-            SET nome = ?, email = ?, cpf = ?
-            WHERE id = ?
-            ''', (usuario.nome, usuario.email, usuario.cpf, usuario.id))
-            return cursor.rowcount > 0
+        with self._get_cursor(imediata=True) as cursor:
+            self._executar(cursor, 'usuarios.atualizar', {
+                'nome': usuario.nome, 'email': usuario.email, 'cpf': usuario.cpf,
+                'id': usuario.id, 'versao': usuario.versao,
+            })
+            if cursor.rowcount == 0:
+                return self._verificar_conflito(cursor, 'usuarios', usuario.id, usuario.versao)
+        if usuario.versao is not None:
+            usuario.versao += 1
+        return True
     
     def remover_usuario(self, usuario_id: int) -> bool:
-        with self._get_cursor() as cursor:
-            cursor.execute('DELETE FROM usuarios WHERE id = ?', (usuario_id,))
-            return cursor.rowcount > 0
+        with self._get_cursor(imediata=True) as cursor:
+            return self._executar(cursor, 'usuarios.remover', (usuario_id,)).rowcount > 0
+    
+    def listar_usuarios(self, apos_nome: Optional[str] = None, apos_id: Optional[int] = None,
+                        limite: Optional[int] = None) -> List[Usuario]:
+        """Usuários ordenados por nome; `apos_nome`/`apos_id` continuam uma listagem anterior."""
+        return self.pagina_usuarios(limite, apos=_chave_apos(apos_nome, apos_id))
+    
+    def iterar_usuarios(self, tamanho_pagina: int = TAMANHO_PAGINA) -> Iterator[Usuario]:
+        """Percorre todos os usuários em páginas, sem carregar a tabela inteira."""
+        return _iterar_paginas(
+            lambda apos: self.pagina_usuarios(tamanho_pagina, apos=apos),
+            lambda usuario: (usuario.nome, usuario.id)
+        )
     
-    def listar_usuarios(self) -> List[Usuario]:
+    def buscar_usuarios(self, termo: str, limite: int = 10) -> List[Usuario]:
+        """Usuários cujo nome (sem diferenciar maiúsculas) ou CPF começa com `termo`.
+        
+        Termos só com dígitos e pontuação de CPF buscam pelo CPF; os demais, pelo nome.
+        """
+        termo = termo.strip()
+        if not termo:
+            return []
+        
+        digitos = re.sub(r'[.\-\s]', '', termo)
         with self._get_cursor() as cursor:
-            cursor.execute('SELECT * FROM usuarios ORDER BY nome')
-            return [Usuario(**row) for row in cursor.fetchall()]
+            cursor.row_factory = _linha_usuario
+            if digitos.isdigit():
+                return self._consultar(cursor, 'usuarios.buscar_cpf', (digitos, digitos + ':', limite))
+            prefixo = re.sub(r'([\\%_])', r'\\\1', termo) + '%'
+            return self._consultar(cursor, 'usuarios.buscar_nome', (prefixo, limite))
     
     # CRUD Livros
     def criar_livro(self, livro: Livro) -> int:
-        with self._get_cursor() as cursor:
-            cursor.execute('''
-            INSERT INTO livros (titulo, autor, ano, copias_disponiveis)
-            VALUES (?, ?, ?, ?)
-            ''', (livro.titulo, livro.autor, livro.ano, livro.copias_disponiveis))
+        with self._get_cursor(imediata=True) as cursor:
+            self._executar(cursor, 'livros.inserir', (livro.titulo, livro.autor, livro.ano, livro.copias_disponiveis))
             return cursor.lastrowid
     
     def obter_livro(self, livro_id: int) -> Optional[Livro]:
         with self._get_cursor() as cursor:
-            cursor.execute('SELECT * FROM livros WHERE id = ?', (livro_id,))
-            row = cursor.fetchone()
-            return Livro(**row) if row else None
+            cursor.row_factory = _linha_livro
+            return self._consultar_um(cursor, 'livros.obter', (livro_id,))
     
     def atualizar_livro(self, livro: Livro) -> bool:
-        with self._get_cursor() as cursor:
-            cursor.execute('''
-            UPDATE livros 
-            SET titulo = ?, autor = ?, ano = ?, copias_disponiveis = ?
-            WHERE id = ?
-            ''', (livro.titulo, livro.autor, livro.ano, livro.copias_disponiveis, livro.id))
-            return cursor.rowcount > 0
+        """Grava o livro se `livro.versao` ainda for a do banco; False se não existe.
+        
+        Levanta ConflitoAtualizacao se outra operação (inclusive um empréstimo
+        ou devolução) o alterou desde a leitura. Com `versao=None` grava sem
+        conferir: telas de edição devem sempre passar a versão que leram.
+        """
+        with self._get_cursor(imediata=True) as cursor:
+            self._executar(cursor, 'livros.atualizar', {
+                'titulo': livro.titulo, 'autor': livro.autor, 'ano': livro.ano,
+                'copias_disponiveis': livro.copias_disponiveis, 'id': livro.id, 'versao': livro.versao,
+            })
+            if cursor.rowcount == 0:
+                return self._verificar_conflito(cursor, 'livros', livro.id, livro.versao)
+        if livro.versao is not None:
+            livro.versao += 1
+        return True
+    
+    def _verificar_conflito(self, cursor, tabela: str, registro_id: int, versao: Optional[int]) -> bool:
+        """Após um UPDATE sem efeito: False se o registro não existe; ConflitoAtualizacao se mudou de versão."""
+        atual = self._consultar_um(cursor, f'{tabela}.versao', (registro_id,))
+        if atual is None:
+            return False
+        raise ConflitoAtualizacao(tabela, registro_id, versao, atual[0])
     
     def remover_livro(self, livro_id: int) -> bool:
-        with self._get_cursor() as cursor:
-            cursor.execute('DELETE FROM livros WHERE id = ?', (livro_id,))
-            return cursor.rowcount > 0
+        with self._get_cursor(imediata=True) as cursor:
+            return self._executar(cursor, 'livros.remover', (livro_id,)).rowcount > 0
+    
+    def listar_livros(self, disponiveis=False, apos_titulo: Optional[str] = None,
+                      apos_id: Optional[int] = None, limite: Optional[int] = None) -> List[Livro]:
+        """Livros ordenados por título; `apos_titulo`/`apos_id` continuam uma listagem anterior."""
+        return self.pagina_livros(limite, apos=_chave_apos(apos_titulo, apos_id), disponiveis=disponiveis)
+    
+    def iterar_livros(self, disponiveis=False, tamanho_pagina: int = TAMANHO_PAGINA) -> Iterator[Livro]:
+        """Percorre todos os livros em páginas, sem carregar a tabela inteira."""
+        return _iterar_paginas(
+            lambda apos: self.pagina_livros(tamanho_pagina, apos=apos, disponiveis=disponiveis),
+            lambda livro: (livro.titulo, livro.id)
+        )
     
-    def listar_livros(self, disponiveis=False) -> List[Livro]:
+    def buscar_livros(self, consulta: str, limite: int = 50, disponiveis: bool = False) -> List[Livro]:
+        """Busca livros por título/autor.
+        
+        Cada palavra da consulta casa como prefixo (palavras de uma letra, só
+        por inteiro), sem diferenciar acentos e maiúsculas. O índice FTS5
+        devolve até JANELA_BUSCA candidatos, que são ordenados por relevância:
+        termos encontrados no título pesam mais que no autor.
+        """
+        termos = [_normalizar(termo) for termo in re.findall(r'\w+', consulta)]
+        if not termos:
+            return []
+        
+        if not self._busca_textual:
+            livros = self._buscar_livros_like(termos, disponiveis)
+        else:
+            expressao = ' '.join(f'"{termo}"*' if len(termo) > 1 else f'"{termo}"' for termo in termos)
+            nome = 'livros.buscar_fts_disponiveis' if disponiveis else 'livros.buscar_fts'
+            with self._get_cursor() as cursor:
+                cursor.row_factory = _linha_livro
+                livros = self._consultar(cursor, nome, (expressao, JANELA_BUSCA))
+        
+        livros.sort(key=lambda livro: _relevancia(livro, termos))
+        return livros[:limite]
+    
+    def _buscar_livros_like(self, termos: List[str], disponiveis: bool) -> List[Livro]:
+        """Alternativa sem FTS5: cada termo deve aparecer no título ou no autor."""
+        params = [f'%{termo}%' for termo in termos for _ in range(2)]
         with self._get_cursor() as cursor:
-            query = 'SELECT * FROM livros'
-            if disponiveis:
-                query += ' WHERE copias_disponiveis > 0'
-            query += ' ORDER BY titulo'
-            cursor.execute(query)
-            return [Livro(**row) for row in cursor.fetchall()]
+            cursor.row_factory = _linha_livro
+            return self._consultar(
+                cursor, 'livros.buscar_like', params + [JANELA_BUSCA],
+                sql=_sql_busca_like(len(termos), disponiveis)
+            )
+    
+    # Carga em lote
+    def inserir_usuarios_lote(self, usuarios: List[Tuple[str, Optional[str], str]]) -> List[Tuple[int, str]]:
+        """Insere (nome, email, cpf) numa única transação.
+        
+        Devolve (posição, erro) das linhas recusadas pelo banco (ex.: CPF repetido);
+        as demais são gravadas.
+        """
+        return self._inserir_lote('usuarios.inserir', usuarios)
+    
+    def inserir_livros_lote(self, livros: List[Tuple[str, str, Optional[int], int]]) -> List[Tuple[int, str]]:
+        """Insere (titulo, autor, ano, copias_disponiveis) numa única transação.
+        
+        Devolve (posição, erro) das linhas recusadas pelo banco (ex.: livro repetido);
+        as demais são gravadas.
+        """
+        return self._inserir_lote('livros.inserir', livros)
+    
+    def _inserir_lote(self, nome: str, linhas: list) -> List[Tuple[int, str]]:
+        sql = CONSULTAS[nome]
+        with self._get_cursor(imediata=True) as cursor:
+            cursor.execute('SAVEPOINT lote')
+            try:
+                inicio = time.perf_counter()
+                cursor.executemany(sql, linhas)
+                self._registrar(cursor, nome, sql, None, time.perf_counter() - inicio, len(linhas))
+                cursor.execute('RELEASE lote')
+                return []
+            except sqlite3.IntegrityError:
+                cursor.execute('ROLLBACK TO lote')
+                cursor.execute('RELEASE lote')
+            
+            # Algum registro violou uma restrição: repete linha a linha para identificá-lo
+            recusadas = []
+            for posicao, linha in enumerate(linhas):
+                try:
+                    self._executar(cursor, nome, linha)
+                except sqlite3.IntegrityError as e:
+                    recusadas.append((posicao, str(e)))
+            return recusadas
     
     # CRUD Empréstimos
     def criar_emprestimo(self, emprestimo: Emprestimo) -> int:
-        if not self.validar_emprestimo(emprestimo.usuario_id, emprestimo.livro_id):
-            raise ValueError("Empréstimo não permitido")
+        """Valida e registra o empréstimo em uma única transação.
         
-        with self._get_cursor() as cursor:
-            # Atualiza cópias disponíveis
-            cursor.execute('''
-            UPDATE livros 
-            SET copias_disponiveis = copias_disponiveis - 1 
-            WHERE id = ?
-            ''', (emprestimo.livro_id,))
+        Levanta EmprestimoNegado, com o motivo da recusa, se alguma regra impedir.
+        """
+        with self._get_cursor(imediata=True) as cursor:
+            motivo = self._motivo_recusa(cursor, emprestimo.usuario_id, emprestimo.livro_id)
+            if motivo:
+                raise EmprestimoNegado(motivo)
+            
+            # Atualiza cópias disponíveis (só decrementa se ainda houver cópia)
+            self._executar(cursor, 'livros.retirar_copia', (emprestimo.livro_id,))
+            if cursor.rowcount == 0:
+                raise EmprestimoNegado('sem_copias')
             
             # Cria empréstimo
-            cursor.execute('''
-            INSERT INTO emprestimos (
-                usuario_id, livro_id, data_emprestimo, data_devolucao_prevista
-            ) VALUES (?, ?, ?, ?)
-            ''', (
+            self._executar(cursor, 'emprestimos.inserir', (
                 emprestimo.usuario_id,
                 emprestimo.livro_id,
-                emprestimo.data_emprestimo.strftime('%Y-%m-%d'),
-                emprestimo.data_devolucao_prevista.strftime('%Y-%m-%d')
+                dia_de_data(emprestimo.data_emprestimo),
+                dia_de_data(emprestimo.data_devolucao_prevista)
             ))
             return cursor.lastrowid
     
+    def _motivo_recusa(self, cursor, usuario_id: int, livro_id: int) -> Optional[str]:
+        """Aplica as regras de empréstimo com uma única consulta; None se permitido."""
+        copias, usuario_existe, ativos, atrasados, mesmo_livro = self._consultar_um(
+            cursor, 'emprestimos.validar',
+            {'usuario_id': usuario_id, 'livro_id': livro_id, 'hoje': dia_hoje()}
+        )
+        
+        if not usuario_existe:
+            return 'usuario_inexistente'
+        if copias is None:
+            return 'livro_inexistente'
+        if atrasados > 0:
+            return 'atraso'
+        if ativos >= Emprestimo.LIMITE_ATIVOS:
+            return 'limite'
+        if mesmo_livro > 0:
+            return 'livro_repetido'
+        if copias <= 0:
+            return 'sem_copias'
+        return None
+    
+    def emprestar_lote(self, usuario_id: int, livro_ids: List[int],
+                       tudo_ou_nada: bool = False) -> List[ResultadoItem]:
+        """Empresta vários livros ao mesmo usuário numa única transação.
+        
+        Cada livro é validado com os anteriores do lote já contados (limite de
+        empréstimos, livro repetido). Os recusados recebem o motivo em
+        `codigo` e os demais são registrados, a menos que `tudo_ou_nada`
+        seja verdadeiro: nesse caso uma recusa desfaz o lote inteiro.
+        """
+        hoje = date.today()
+        prevista = hoje + timedelta(days=Emprestimo.PRAZO_DEVOLUCAO)
+        resultados = []
+        with self._get_cursor(imediata=True) as cursor:
+            # Desfeito com ROLLBACK TO, mantendo a transação (e o lock de escrita)
+            # até o fim do bloco, como em _inserir_lote
+            cursor.execute('SAVEPOINT lote')
+            for livro_id in livro_ids:
+                motivo = self._motivo_recusa(cursor, usuario_id, livro_id)
+                if motivo is None:
+                    self._executar(cursor, 'livros.retirar_copia', (livro_id,))
+                    if cursor.rowcount == 0:
+                        motivo = 'sem_copias'
+                if motivo:
+                    resultados.append(ResultadoItem(livro_id, None, motivo))
+                    continue
+                self._executar(cursor, 'emprestimos.inserir', (
+                    usuario_id, livro_id, dia_de_data(hoje), dia_de_data(prevista)
+                ))
+                resultados.append(ResultadoItem(livro_id, cursor.lastrowid, ITEM_OK))
+            
+            if tudo_ou_nada and any(item.codigo != ITEM_OK for item in resultados):
+                cursor.execute('ROLLBACK TO lote')
+                cursor.execute('RELEASE lote')
+                return [item._replace(emprestimo_id=None) for item in resultados]
+            cursor.execute('RELEASE lote')
+        return resultados
+    
+    def devolver_lote(self, emprestimo_ids: List[int]) -> List[ResultadoItem]:
+        """Registra a devolução de vários empréstimos numa única transação.
+        
+        Empréstimos inexistentes ou já devolvidos são ignorados e informados
+        em `codigo`; os demais são devolvidos.
+        """
+        hoje = dia_hoje()
+        resultados = []
+        with self._get_cursor(imediata=True) as cursor:
+            for emprestimo_id in emprestimo_ids:
+                situacao = self._consultar_um(cursor, 'emprestimos.situacao', (emprestimo_id,))
+                if situacao is None:
+                    resultados.append(ResultadoItem(None, emprestimo_id, 'emprestimo_inexistente'))
+                    continue
+                livro_id, devolvido_em = situacao
+                if devolvido_em is not None:
+                    resultados.append(ResultadoItem(livro_id, emprestimo_id, 'ja_devolvido'))
+                    continue
+                self._executar(cursor, 'livros.devolver_copia', (livro_id,))
+                self._executar(cursor, 'emprestimos.devolver', (hoje, emprestimo_id))
+                resultados.append(ResultadoItem(livro_id, emprestimo_id, ITEM_OK))
+        return resultados
+    
     def validar_emprestimo(self, usuario_id: int, livro_id: int) -> bool:
         """Verifica se o empréstimo é permitido de acordo com as regras de negócio."""
         with self._get_cursor() as cursor:
-            # Verifica se o usuário tem empréstimos em atraso
-            cursor.execute('''
-            SELECT COUNT(*) FROM emprestimos
-            WHERE usuario_id = ? 
-            AND data_devolucao_real IS NULL
-            AND data_devolucao_prevista < date('now')
-            ''', (usuario_id,))
-            if cursor.fetchone()[0] > 0:
-                return False
-            
-            # Verifica se o usuário já tem 3 empréstimos ativos
-            cursor.execute('''
-            SELECT COUNT(*) FROM emprestimos
-            WHERE usuario_id = ? AND data_devolucao_real IS NULL
-            ''', (usuario_id,))
-            if cursor.fetchone()[0] >= 3:
-                return False
-            
-            # Verifica se o usuário já tem um exemplar deste livro
-            cursor.execute('''
-            SELECT COUNT(*) FROM emprestimos
-            WHERE usuario_id = ? AND livro_id = ? AND data_devolucao_real IS NULL
-            ''', (usuario_id, livro_id))
-            if cursor.fetchone()[0] > 0:
-                return False
-            
-            # Verifica se há cópias disponíveis
-            cursor.execute('''
-            SELECT copias_disponiveis FROM livros WHERE id = ?
-            ''', (livro_id,))
-            copias = cursor.fetchone()[0]
-            return copias > 0
+            return self._motivo_recusa(cursor, usuario_id, livro_id) is None
     
     def finalizar_emprestimo(self, emprestimo_id: int) -> bool:
-        with self._get_cursor() as cursor:
-            # Obtém o livro associado ao empréstimo
-            cursor.execute('SELECT livro_id FROM emprestimos WHERE id = ?', (emprestimo_id,))
-            livro_id = cursor.fetchone()[0]
-            
-            # Atualiza cópias disponíveis
-            cursor.execute('''
-            UPDATE livros 
-            SET copias_disponiveis = copias_disponiveis + 1 
-            WHERE id = ?
-            ''', (livro_id,))
+        """Registra a devolução; False se o empréstimo não existe ou já foi devolvido."""
+        with self._get_cursor(imediata=True) as cursor:
+            situacao = self._consultar_um(cursor, 'emprestimos.situacao', (emprestimo_id,))
+            if situacao is None or situacao[1] is not None:
+                return False
             
-            # Registra devolução
-            cursor.execute('''
-            UPDATE emprestimos 
-            SET data_devolucao_real = date('now')
-            WHERE id = ?
-            ''', (emprestimo_id,))
-            return cursor.rowcount > 0
+            # Registra devolução e devolve a cópia ao acervo
+            self._executar(cursor, 'emprestimos.devolver', (dia_hoje(), emprestimo_id))
+            self._executar(cursor, 'livros.devolver_copia', (situacao[0],))
+            return True
     
     def obter_emprestimo(self, emprestimo_id: int) -> Optional[Emprestimo]:
         with self._get_cursor() as cursor:
-            cursor.execute('SELECT * FROM emprestimos WHERE id = ?', (emprestimo_id,))
-            row = cursor.fetchone()
-            if row:
-                return Emprestimo(
-                    id=row['id'],
-                    usuario_id=row['usuario_id'],
-                    livro_id=row['livro_id'],
-                    data_emprestimo=datetime.strptime(row['data_emprestimo'], '%Y-%m-%d'),
-                    data_devolucao_prevista=datetime.strptime(row['data_devolucao_prevista'], '%Y-%m-%d'),
-                    data_devolucao_real=datetime.strptime(row['data_devolucao_real'], '%Y-%m-%d') if row['data_devolucao_real'] else None
-                )
-            return None
+            cursor.row_factory = _linha_emprestimo
+            return self._consultar_um(cursor, 'emprestimos.obter', (emprestimo_id,))
+    
+    def listar_emprestimos_ativos(self, usuario_id: Optional[int] = None,
+                                  apos_prevista: Optional[date] = None, apos_id: Optional[int] = None,
+                                  limite: Optional[int] = None) -> List[Emprestimo]:
+        """Empréstimos ativos por data prevista; `apos_prevista`/`apos_id` continuam uma listagem anterior."""
+        return self.pagina_emprestimos_ativos(
+            limite, apos=_chave_apos(apos_prevista, apos_id), usuario_id=usuario_id
+        )
+    
+    def iterar_emprestimos_ativos(self, usuario_id: Optional[int] = None,
+                                  tamanho_pagina: int = TAMANHO_PAGINA) -> Iterator[Emprestimo]:
+        """Percorre os empréstimos ativos em páginas, sem carregar a tabela inteira."""
+        return _iterar_paginas(
+            lambda apos: self.pagina_emprestimos_ativos(tamanho_pagina, apos=apos, usuario_id=usuario_id),
+            lambda emprestimo: (emprestimo.data_devolucao_prevista, emprestimo.id)
+        )
+    
+    def listar_emprestimos_detalhados(self) -> List[EmprestimoAtivo]:
+        """Lista os empréstimos ativos já unidos ao nome do usuário e ao título do livro."""
+        return self.pagina_emprestimos_detalhados(None)
     
-    def listar_emprestimos_ativos(self, usuario_id: Optional[int] = None) -> List[Emprestimo]:
+    # Paginação por keyset
+    def _paginar(self, cursor, nome: str, select: str, filtros: Tuple[str, ...], chave: Tuple[str, ...],
+                 params=(), limite: Optional[int] = None, apos: Optional[tuple] = None,
+                 antes: Optional[tuple] = None, offset: int = 0) -> list:
+        """Executa `select` ordenado pelas colunas de `chave`, registrando o tempo como `nome`.
+        
+        `apos`/`antes` recebem o valor da chave da última/primeira linha já
+        exibida, de modo que a página seguinte/anterior seja lida direto do
+        índice. `offset` só deve ser usado para saltos (ex.: arrastar a barra
+        de rolagem).
+        """
+        sql = _sql_pagina(select, filtros, chave, apos is not None, antes is not None, limite is not None)
+        params = list(params)
+        if apos is not None:
+            params.extend(apos)
+        if antes is not None:
+            params.extend(antes)
+        if limite is not None:
+            params.extend((limite, offset))
+        
+        rows = self._consultar(cursor, nome, params, sql=sql)
+        if antes is not None and apos is None:
+            rows.reverse()
+        return rows
+    
+    def pagina_usuarios(self, limite: Optional[int], apos: Optional[Tuple[str, int]] = None,
+                        antes: Optional[Tuple[str, int]] = None, offset: int = 0) -> List[Usuario]:
+        """Página de usuários ordenados por (nome, id)."""
         with self._get_cursor() as cursor:
-            query = '''
-            SELECT e.* FROM emprestimos e
-            WHERE e.data_devolucao_real IS NULL
-            '''
-            params = ()
-            
-            if usuario_id:
-                query += ' AND e.id_usuario = ?'
-                params = (usuario_id,)
-            
-            query += ' ORDER BY e.data_devolucao_prevista'
-            cursor.execute(query, params)
-            
-            return [
-                Emprestimo(
-                    id=row['id'],
-                    usuario_id=row['usuario_id'],
-                    livro_id=row['livro_id'],
-                    data_emprestimo=datetime.strptime(row['data_emprestimo'], '%Y-%m-%d'),
-                    data_devolucao_prevista=datetime.strptime(row['data_devolucao_prevista'], '%Y-%m-%d')
-                ) for row in cursor.fetchall()
-            ]
-    
-
-    
\ No newline at end of file
+            cursor.row_factory = _linha_usuario
+            return self._paginar(
+                cursor, 'usuarios.pagina', f'SELECT {COLUNAS_USUARIO} FROM usuarios', (), ('nome', 'id'),
+                limite=limite, apos=apos, antes=antes, offset=offset
+            )
+    
+    def pagina_livros(self, limite: Optional[int], apos: Optional[Tuple[str, int]] = None,
+                      antes: Optional[Tuple[str, int]] = None, offset: int = 0,
+                      disponiveis: bool = False) -> List[Livro]:
+        """Página de livros ordenados por (titulo, id)."""
+        filtros = ('copias_disponiveis > 0',) if disponiveis else ()
+        with self._get_cursor() as cursor:
+            cursor.row_factory = _linha_livro
+            return self._paginar(
+                cursor, 'livros.pagina', f'SELECT {COLUNAS_LIVRO} FROM livros', filtros, ('titulo', 'id'),
+                limite=limite, apos=apos, antes=antes, offset=offset
+            )
+    
+    def pagina_emprestimos_ativos(self, limite: Optional[int], apos: Optional[Tuple[date, int]] = None,
+                                  antes: Optional[Tuple[date, int]] = None, offset: int = 0,
+                                  usuario_id: Optional[int] = None) -> List[Emprestimo]:
+        """Página de empréstimos ativos ordenados por (data_devolucao_prevista, id)."""
+        filtros = ('data_devolucao_real IS NULL',)
+        params = ()
+        if usuario_id is not None:
+            filtros += ('usuario_id = ?',)
+            params = (usuario_id,)
+        with self._get_cursor() as cursor:
+            cursor.row_factory = _linha_emprestimo
+            return self._paginar(
+                cursor, 'emprestimos.pagina_ativos', f'SELECT {COLUNAS_EMPRESTIMO} FROM emprestimos',
+                filtros, ('data_devolucao_prevista', 'id'),
+                params, limite=limite, apos=_chave_em_dias(apos), antes=_chave_em_dias(antes),
+                offset=offset
+            )
+    
+    def pagina_emprestimos_detalhados(self, limite: Optional[int], apos: Optional[Tuple[date, int]] = None,
+                                      antes: Optional[Tuple[date, int]] = None,
+                                      offset: int = 0) -> List[EmprestimoAtivo]:
+        """Página de empréstimos ativos ordenados por (data_devolucao_prevista, id)."""
+        with self._get_cursor() as cursor:
+            cursor.row_factory = _linha_emprestimo_ativo
+            return self._paginar(
+                cursor, 'emprestimos.pagina_detalhados', SQL_SELECT_EMPRESTIMOS_DETALHADOS,
+                ('e.data_devolucao_real IS NULL',), ('e.data_devolucao_prevista', 'e.id'),
+                limite=limite, apos=_chave_em_dias(apos), antes=_chave_em_dias(antes),
+                offset=offset
+            )
+    
+    def contar_usuarios(self) -> int:
+        with self._get_cursor() as cursor:
+            return self._consultar_um(cursor, 'usuarios.contar')[0]
+    
+    def contar_livros(self, disponiveis: bool = False) -> int:
+        with self._get_cursor() as cursor:
+            nome = 'livros.contar_disponiveis' if disponiveis else 'livros.contar'
+            return self._consultar_um(cursor, nome)[0]
+    
+    def contar_emprestimos_ativos(self) -> int:
+        with self._get_cursor() as cursor:
+            return self._consultar_um(cursor, 'emprestimos.contar_ativos')[0]
+    
+    def listar_usuarios_em_atraso(self) -> List[sqlite3.Row]:
+        """Usuários com empréstimos vencidos e a quantidade de atrasos de cada um."""
+        with self._get_cursor() as cursor:
+            return self._consultar(cursor, 'usuarios.em_atraso')
+    
+    # Relatórios
+    def contar_relatorio(self, nome: str) -> int:
+        with self._get_cursor() as cursor:
+            return self._consultar_um(cursor, f'relatorios.{nome}.contar')[0]
+    
+    def iterar_relatorio(self, nome: str, tamanho_lote: int = TAMANHO_PAGINA) -> Iterator[List[tuple]]:
+        """Linhas do relatório em lotes, lidas de um único cursor (uma só leitura consistente).
+        
+        A conexão fica reservada até o gerador se esgotar ou ser fechado.
+        """
+        consulta = f'relatorios.{nome}'
+        with self._get_cursor() as cursor:
+            # Tempo gasto no banco (sem o do consumidor) e linhas, registrados ao final
+            inicio = time.perf_counter()
+            cursor.execute(CONSULTAS[consulta])
+            segundos, linhas = time.perf_counter() - inicio, 0
+            try:
+                while True:
+                    inicio = time.perf_counter()
+                    lote = cursor.fetchmany(tamanho_lote)
+                    segundos += time.perf_counter() - inicio
+                    if not lote:
+                        return
+                    linhas += len(lote)
+                    yield [tuple(linha) for linha in lote]
+            finally:
+                self._registrar(cursor, consulta, CONSULTAS[consulta], (), segundos, linhas)
@@ -0,0 +1,336 @@
+"""Fachada asyncio para Database.
+
+    async with AsyncDatabase('biblioteca.db') as db:
+        livros = await db.pagina_livros(50)
+        await db.criar_emprestimo(Emprestimo(usuario_id=1, livro_id=livros[0].id))
+
+Os métodos de Database viram corrotinas com os mesmos argumentos. As
+escritas rodam, em ordem, numa única thread escritora (sem disputa pelo lock
+de escrita do SQLite entre as próprias operações); as leituras, num pool de
+threads leitoras, cada uma com a sua conexão do pool em modo WAL.
+
+- Cancelamento: uma operação ainda na fila não chega a rodar. Numa em
+  andamento, o comando SQL em execução é interrompido
+  (sqlite3.Connection.interrupt); se o cancelamento chegar antes do primeiro
+  comando ou entre dois deles, quando interrupt() não tem efeito, a operação
+  é abortada ao abrir o cursor ou ao fim do bloco, antes do commit. Em todos
+  os casos a transação é desfeita, de modo que uma escrita cancelada ou foi
+  gravada por inteiro (o cancelamento chegou com o commit já em curso) ou não
+  foi gravada. Os lotes de iterar_relatorio compartilham uma só operação.
+- Tempo limite: `tempo_limite` (segundos) vale para cada operação, incluindo
+  a espera na fila; ao estourar, a operação é cancelada e asyncio.TimeoutError
+  é levantada. asyncio.wait_for em volta de uma chamada tem o mesmo efeito.
+- Contrapressão: cada fila (escrita, leitura) aceita até `max_pendentes`
+  operações; acima disso quem chama aguarda uma vaga, em vez de acumular
+  trabalho sem limite.
+"""
+import asyncio
+import queue
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import AsyncIterator, List, Optional, Type
+
+from database import TAMANHO_PAGINA, Database, PERFIL_PADRAO
+from models import Emprestimo, Livro, Usuario
+
+LEITORES = 4  # threads (e conexões) de leitura
+MAX_PENDENTES = 128  # operações por fila antes de os chamadores aguardarem
+
+# Métodos de Database executados pela thread escritora
+ESCRITAS = (
+    'criar_usuario', 'atualizar_usuario', 'remover_usuario', 'inserir_usuarios_lote',
+    'criar_livro', 'atualizar_livro', 'remover_livro', 'inserir_livros_lote',
+    'criar_emprestimo', 'emprestar_lote', 'devolver_lote', 'finalizar_emprestimo',
+    'apurar_atrasos', 'verificar_contadores', 'checkpoint',
+)
+
+# Métodos de Database executados pelas threads leitoras
+LEITURAS = (
+    'obter_usuario', 'listar_usuarios', 'buscar_usuarios', 'pagina_usuarios', 'contar_usuarios',
+    'obter_livro', 'listar_livros', 'buscar_livros', 'pagina_livros', 'contar_livros',
+    'validar_emprestimo', 'obter_emprestimo', 'listar_emprestimos_ativos',
+    'listar_emprestimos_detalhados', 'pagina_emprestimos_ativos', 'pagina_emprestimos_detalhados',
+    'contar_emprestimos_ativos', 'listar_usuarios_em_atraso', 'contar_relatorio',
+    'verificar_indices',
+)
+
+_FIM = object()
+
+class _Operacao:
+    """Operação em execução numa thread; guarda a conexão para poder interrompê-la."""
+    __slots__ = ('conn', 'cancelada', '_lock')
+
+    def __init__(self):
+        self.conn = None
+        self.cancelada = False
+        self._lock = threading.Lock()
+
+    def verificar(self):
+        """Levanta o erro de um comando interrompido se a operação foi cancelada."""
+        if self.cancelada:
+            raise sqlite3.OperationalError('interrupted')
+
+    def conectar(self, conn):
+        with self._lock:
+            self.verificar()
+            self.conn = conn
+
+    def desconectar(self):
+        with self._lock:
+            self.conn = None
+
+    def cancelar(self):
+        with self._lock:
+            self.cancelada = True
+            if self.conn is not None:
+                self.conn.interrupt()
+
+_atual = threading.local()
+
+class _Interrompivel:
+    """Mistura para Database: associa a conexão em uso à operação da thread."""
+
+    @contextmanager
+    def _get_cursor(self, imediata: bool = False):
+        with super()._get_cursor(imediata) as cursor:
+            operacao = getattr(_atual, 'operacao', None)
+            if operacao is None:
+                yield cursor
+                return
+            # Desassociada antes do commit e da devolução ao pool, para que um
+            # cancelamento tardio não interrompa a operação seguinte da conexão
+            operacao.conectar(cursor.connection)
+            try:
+                yield cursor
+            finally:
+                operacao.desconectar()
+            # interrupt() só age sobre um comando em execução: um cancelamento
+            # entre comandos desfaz a transação aqui, antes do commit
+            operacao.verificar()
+
+def _proximo(gerador, trava: threading.Lock):
+    with trava:
+        return next(gerador, _FIM)
+
+def _fechar(gerador, trava: threading.Lock):
+    with trava:
+        gerador.close()
+
+class _Fila:
+    """Threads que executam operações de uma fila, com limite de pendentes.
+
+    As threads não acordam o laço de eventos a cada operação concluída: os
+    resultados se acumulam em `_prontos` e um único call_soon_threadsafe
+    entrega todos os que chegaram até o laço rodar (como o DBExecutor da
+    interface faz com o Tk). A vaga de uma operação só é devolvida quando a
+    thread termina, mesmo que quem chamou já tenha desistido.
+    """
+
+    def __init__(self, trabalhadores: int, max_pendentes: int, prefixo: str):
+        self.max_pendentes = max_pendentes
+        self._entrada = queue.SimpleQueue()
+        self._prontos = deque()
+        self._lock = threading.Lock()
+        self._agendado = False
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._vagas: Optional[asyncio.Semaphore] = None  # criados já dentro do laço de eventos
+        self._threads = [
+            threading.Thread(target=self._trabalhar, name=f'{prefixo}-{n}', daemon=True)
+            for n in range(trabalhadores)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    async def executar(self, func, *args, **kwargs):
+        return await self.executar_em(_Operacao(), func, args, kwargs)
+
+    async def executar_em(self, operacao: _Operacao, func, args=(), kwargs=None):
+        """Como executar, numa operação que pode continuar em chamadas seguintes."""
+        if self._vagas is None:
+            self._loop = asyncio.get_running_loop()
+            self._vagas = asyncio.Semaphore(self.max_pendentes)
+        await self._vagas.acquire()
+        futuro = self._loop.create_future()
+        self._entrada.put((futuro, operacao, func, args, kwargs or {}))
+        try:
+            return await futuro
+        except asyncio.CancelledError:
+            # Na fila, não chega a rodar; em andamento, é interrompida
+            operacao.cancelar()
+            raise
+
+    def enviar(self, func, *args):
+        """Executa func(*args) sem aguardar nem ocupar vaga (ex.: liberar recursos)."""
+        self._entrada.put((None, _Operacao(), func, args, {}))
+
+    def encerrar(self):
+        """Termina o que já está na fila e para as threads."""
+        for _ in self._threads:
+            self._entrada.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _trabalhar(self):
+        while True:
+            item = self._entrada.get()
+            if item is None:
+                return
+            futuro, operacao, func, args, kwargs = item
+            if operacao.cancelada:
+                resultado, erro = None, asyncio.CancelledError()
+            else:
+                _atual.operacao = operacao
+                try:
+                    resultado, erro = func(*args, **kwargs), None
+                except BaseException as e:
+                    resultado, erro = None, e
+                finally:
+                    _atual.operacao = None
+            if futuro is None:
+                continue
+            self._prontos.append((futuro, resultado, erro))
+            with self._lock:
+                if self._agendado:
+                    continue
+                self._agendado = True
+            try:
+                self._loop.call_soon_threadsafe(self._entregar)
+            except RuntimeError:
+                pass  # laço de eventos já encerrado
+
+    def _entregar(self):
+        with self._lock:
+            self._agendado = False
+        while self._prontos:
+            futuro, resultado, erro = self._prontos.popleft()
+            self._vagas.release()
+            if futuro.done():
+                continue
+            if isinstance(erro, asyncio.CancelledError):
+                futuro.cancel()
+            elif erro is not None:
+                futuro.set_exception(erro)
+            else:
+                futuro.set_result(resultado)
+
+class AsyncDatabase:
+    """Database com os métodos como corrotinas (ver a descrição do módulo)."""
+
+    def __init__(self, db_name='biblioteca.db', leitores: int = LEITORES, perfil: str = PERFIL_PADRAO,
+                 max_pendentes: int = MAX_PENDENTES, tempo_limite: Optional[float] = None,
+                 classe: Type[Database] = Database, **kwargs):
+        # Uma conexão para a escritora, uma por leitora e outras tantas para
+        # os percursos de relatório, que a mantêm entre um lote e outro
+        self.db = type(classe.__name__, (_Interrompivel, classe), {})(
+            db_name, max_conexoes=2 * leitores + 1, perfil=perfil, **kwargs
+        )
+        self.tempo_limite = tempo_limite
+        self._escrita = _Fila(1, max_pendentes, 'escritor')
+        self._leitura = _Fila(leitores, max_pendentes, 'leitor')
+
+    async def __aenter__(self) -> 'AsyncDatabase':
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.fechar()
+
+    async def fechar(self):
+        """Aguarda as operações em andamento e fecha o banco."""
+        await asyncio.get_running_loop().run_in_executor(None, self._encerrar)
+
+    def _encerrar(self):
+        self._escrita.encerrar()
+        self._leitura.encerrar()
+        self.db.fechar()
+
+    async def _executar(self, fila: _Fila, func, *args, **kwargs):
+        return await self._aguardar(fila.executar(func, *args, **kwargs))
+
+    async def _aguardar(self, corrotina):
+        if self.tempo_limite is None:
+            return await corrotina
+        return await asyncio.wait_for(corrotina, self.tempo_limite)
+
+    # Estatísticas ficam em memória: lidas direto, sem passar pelas filas
+    async def estatisticas_pool(self) -> dict:
+        return self.db.estatisticas_pool()
+
+    async def estatisticas_consultas(self) -> List[dict]:
+        return self.db.estatisticas_consultas()
+
+    async def estatisticas_espera(self) -> dict:
+        return self.db.estatisticas_espera()
+
+    async def consultas_lentas(self) -> List[dict]:
+        return self.db.consultas_lentas()
+
+    async def limpar_estatisticas(self):
+        self.db.limpar_estatisticas()
+
+    async def estatisticas_cache(self) -> dict:
+        """Só com classe=DatabaseComCache."""
+        return self.db.estatisticas_cache()
+
+    # Percursos: geradores assíncronos
+    async def iterar_relatorio(self, nome: str, tamanho_lote: int = TAMANHO_PAGINA) -> AsyncIterator[List[tuple]]:
+        """Lotes do relatório, lidos de um único cursor (ver Database.iterar_relatorio)."""
+        gerador = self.db.iterar_relatorio(nome, tamanho_lote)
+        # Um lote cancelado pode ainda estar sendo lido quando o gerador é fechado
+        trava = threading.Lock()
+        # O cursor é aberto no primeiro lote e fica associado a esta operação
+        # até o fim: cancelar qualquer lote interrompe a leitura em curso
+        operacao = _Operacao()
+        try:
+            while True:
+                lote = await self._aguardar(self._leitura.executar_em(operacao, _proximo, (gerador, trava)))
+                if lote is _FIM:
+                    return
+                yield lote
+        finally:
+            # Libera a conexão do cursor mesmo se o consumidor parou no meio
+            self._leitura.enviar(_fechar, gerador, trava)
+
+    async def _iterar_paginas(self, buscar, chave) -> AsyncIterator:
+        apos = None
+        while True:
+            pagina = await buscar(apos)
+            if not pagina:
+                return
+            for item in pagina:
+                yield item
+            apos = chave(pagina[-1])
+
+    def iterar_usuarios(self, tamanho_pagina: int = TAMANHO_PAGINA) -> AsyncIterator[Usuario]:
+        return self._iterar_paginas(
+            lambda apos: self.pagina_usuarios(tamanho_pagina, apos=apos),
+            lambda usuario: (usuario.nome, usuario.id)
+        )
+
+    def iterar_livros(self, disponiveis=False, tamanho_pagina: int = TAMANHO_PAGINA) -> AsyncIterator[Livro]:
+        return self._iterar_paginas(
+            lambda apos: self.pagina_livros(tamanho_pagina, apos=apos, disponiveis=disponiveis),
+            lambda livro: (livro.titulo, livro.id)
+        )
+
+    def iterar_emprestimos_ativos(self, usuario_id: Optional[int] = None,
+                                  tamanho_pagina: int = TAMANHO_PAGINA) -> AsyncIterator[Emprestimo]:
+        return self._iterar_paginas(
+            lambda apos: self.pagina_emprestimos_ativos(tamanho_pagina, apos=apos, usuario_id=usuario_id),
+            lambda emprestimo: (emprestimo.data_devolucao_prevista, emprestimo.id)
+        )
+
+def _corrotina(nome: str, fila: str):
+    original = getattr(Database, nome)
+
+    async def metodo(self, *args, **kwargs):
+        return await self._executar(getattr(self, fila), getattr(self.db, nome), *args, **kwargs)
+    metodo.__name__ = metodo.__qualname__ = nome
+    metodo.__doc__ = original.__doc__
+    return metodo
+
+for _nome in ESCRITAS:
+    setattr(AsyncDatabase, _nome, _corrotina(_nome, '_escrita'))
+for _nome in LEITURAS:
+    setattr(AsyncDatabase, _nome, _corrotina(_nome, '_leitura'))
@@ -0,0 +1,215 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from database import Database, RELATORIOS
+from registro import configurar_do_ambiente
+
+logger = logging.getLogger(__name__)
+
+# Linhas lidas do cursor por vez (e por grupo de linhas no formato colunar)
+TAMANHO_LOTE = 10000
+
+class EscritorCSV:
+    def __init__(self, arquivo, colunas):
+        self._writer = csv.writer(arquivo)
+        self._writer.writerow(colunas)
+
+    def escrever(self, lote: List[tuple]):
+        self._writer.writerows(lote)
+
+    def fechar(self):
+        pass
+
+class EscritorJSONL:
+    def __init__(self, arquivo, colunas):
+        self._arquivo = arquivo
+        self._colunas = colunas
+
+    def escrever(self, lote: List[tuple]):
+        self._arquivo.writelines(
+            json.dumps(dict(zip(self._colunas, linha)), ensure_ascii=False) + '\n'
+            for linha in lote
+        )
+
+    def fechar(self):
+        pass
+
+# Formato colunar (.bcol):
+#   MAGIA
+#   grupos de linhas: para cada coluna, [tipo: 1 byte][tamanho: uint32][bloco zlib]
+#       bloco = marcadores de nulo (1 byte por linha) + valores não nulos
+#       tipo 'i' = int64, 'f' = float64, 's' = uint32 tamanhos + texto UTF-8
+#   rodapé JSON {"colunas": [...], "grupos": [[posição, linhas], ...]}
+#   [tamanho do rodapé: uint32] MAGIA
+MAGIA = b'BIBCOL1\0'
+_CABECALHO_BLOCO = struct.Struct('<cI')
+_TAMANHO_RODAPE = struct.Struct('<I')
+
+def _array_le(tipo: str, valores) -> bytes:
+    dados = array(tipo, valores)
+    if sys.byteorder == 'big':
+        dados.byteswap()
+    return dados.tobytes()
+
+def _codificar_coluna(valores: list) -> Tuple[bytes, bytes]:
+    nulos = bytes(v is None for v in valores)
+    presentes = [v for v in valores if v is not None]
+    if all(isinstance(v, int) for v in presentes):
+        tipo, dados = b'i', _array_le('q', presentes)
+    elif all(isinstance(v, (int, float)) for v in presentes):
+        tipo, dados = b'f', _array_le('d', presentes)
+    else:
+        textos = [str(v).encode('utf-8') for v in presentes]
+        tipo, dados = b's', _array_le('I', map(len, textos)) + b''.join(textos)
+    return tipo, zlib.compress(nulos + dados)
+
+def _decodificar_coluna(tipo: bytes, bloco: bytes, linhas: int) -> list:
+    bloco = zlib.decompress(bloco)
+    nulos, dados = bloco[:linhas], bloco[linhas:]
+    presentes = linhas - sum(nulos)
+    if tipo in (b'i', b'f'):
+        valores = array('q' if tipo == b'i' else 'd')
+        valores.frombytes(dados)
+    else:
+        tamanhos = array('I')
+        tamanhos.frombytes(dados[:presentes * tamanhos.itemsize])
+        if sys.byteorder == 'big':
+            tamanhos.byteswap()
+        valores, posicao = [], presentes * tamanhos.itemsize
+        for tamanho in tamanhos:
+            valores.append(dados[posicao:posicao + tamanho].decode('utf-8'))
+            posicao += tamanho
+    if tipo != b's' and sys.byteorder == 'big':
+        valores.byteswap()
+    iterador = iter(valores)
+    return [None if nulo else next(iterador) for nulo in nulos]
+
+class EscritorColunar:
+    def __init__(self, arquivo, colunas):
+        self._arquivo = arquivo
+        self._colunas = list(colunas)
+        self._grupos = []
+        arquivo.write(MAGIA)
+
+    def escrever(self, lote: List[tuple]):
+        self._grupos.append((self._arquivo.tell(), len(lote)))
+        for valores in zip(*lote):
+            tipo, bloco = _codificar_coluna(list(valores))
+            self._arquivo.write(_CABECALHO_BLOCO.pack(tipo, len(bloco)))
+            self._arquivo.write(bloco)
+
+    def fechar(self):
+        rodape = json.dumps({'colunas': self._colunas, 'grupos': self._grupos}).encode('utf-8')
+        self._arquivo.write(rodape)
+        self._arquivo.write(_TAMANHO_RODAPE.pack(len(rodape)))
+        self._arquivo.write(MAGIA)
+
+def ler_colunar(caminho: str) -> Tuple[List[str], Iterator[List[tuple]]]:
+    """Colunas e lotes de linhas (um por grupo) de um arquivo .bcol."""
+    arquivo = open(caminho, 'rb')
+    fim = len(MAGIA) + _TAMANHO_RODAPE.size
+    arquivo.seek(-fim, os.SEEK_END)
+    (tamanho,), magia = _TAMANHO_RODAPE.unpack(arquivo.read(_TAMANHO_RODAPE.size)), arquivo.read()
+    if magia != MAGIA:
+        arquivo.close()
+        raise ValueError(f"{caminho} não é um arquivo colunar válido")
+    arquivo.seek(-(fim + tamanho), os.SEEK_END)
+    rodape = json.loads(arquivo.read(tamanho))
+    colunas = rodape['colunas']
+
+    def grupos():
+        with arquivo:
+            for posicao, linhas in rodape['grupos']:
+                arquivo.seek(posicao)
+                valores = []
+                for _ in colunas:
+                    tipo, tamanho_bloco = _CABECALHO_BLOCO.unpack(arquivo.read(_CABECALHO_BLOCO.size))
+                    valores.append(_decodificar_coluna(tipo, arquivo.read(tamanho_bloco), linhas))
+                yield list(zip(*valores))
+
+    return colunas, grupos()
+
+# formato -> (classe, extensão, modo de abertura)
+FORMATOS = {
+    'csv': (EscritorCSV, '.csv', 'w'),
+    'jsonl': (EscritorJSONL, '.jsonl', 'w'),
+    'colunar': (EscritorColunar, '.bcol', 'wb'),
+}
+
+def formato_do_arquivo(caminho: str) -> str:
+    extensao = os.path.splitext(caminho)[1].lower()
+    for formato, (_, ext, _) in FORMATOS.items():
+        if ext == extensao:
+            return formato
+    raise ValueError(f"Formato de exportação não suportado: {extensao}")
+
+def exportar(db: Database, relatorio: str, caminho: str, formato: Optional[str] = None,
+             progresso: Optional[Callable[[int, int], None]] = None,
+             tamanho_lote: int = TAMANHO_LOTE) -> int:
+    """Grava o relatório em `caminho` lote a lote, sem carregá-lo inteiro na memória.
+
+    O arquivo é escrito com um nome temporário e renomeado só ao final, para
+    que uma exportação interrompida não deixe um arquivo incompleto.
+    Devolve o número de linhas exportadas; `progresso(exportadas, total)` é
+    chamado a cada lote.
+    """
+    if relatorio not in RELATORIOS:
+        raise ValueError(f"Relatório desconhecido: {relatorio}")
+    formato = formato or formato_do_arquivo(caminho)
+    classe, _, modo = FORMATOS[formato]
+    colunas, _ = RELATORIOS[relatorio]
+
+    total = db.contar_relatorio(relatorio) if progresso else 0
+    temporario = caminho + '.parcial'
+    exportadas = 0
+    try:
+        abrir = {'newline': '', 'encoding': 'utf-8'} if 'b' not in modo else {}
+        with open(temporario, modo, **abrir) as arquivo:
+            escritor = classe(arquivo, colunas)
+            for lote in db.iterar_relatorio(relatorio, tamanho_lote):
+                escritor.escrever(lote)
+                exportadas += len(lote)
+                if progresso:
+                    progresso(exportadas, total)
+            escritor.fechar()
+        os.replace(temporario, caminho)
+    except BaseException:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+    logger.info("Relatório %s exportado para %s: %d linhas", relatorio, caminho, exportadas)
+    return exportadas
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta relatórios para CSV, JSON Lines ou formato colunar (.bcol).")
+    parser.add_argument('relatorio', choices=sorted(RELATORIOS), help="relatório a exportar")
+    parser.add_argument('arquivo', help="arquivo de saída (.csv, .jsonl ou .bcol)")
+    parser.add_argument('--formato', choices=sorted(FORMATOS), help="formato (padrão: pela extensão do arquivo)")
+    parser.add_argument('--banco', default='biblioteca.db', help="arquivo do banco SQLite")
+    args = parser.parse_args(argv)
+
+    configurar_do_ambiente('biblioteca.log')
+    db = Database(args.banco)
+    try:
+        linhas = exportar(
+            db, args.relatorio, args.arquivo, args.formato,
+            progresso=lambda feitas, total: print(f"\r{feitas}/{total} linhas", end='', file=sys.stderr)
+        )
+    finally:
+        db.fechar()
+
+    print(file=sys.stderr)
+    print(f"{linhas} linhas exportadas para {args.arquivo}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
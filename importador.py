@@ -0,0 +1,237 @@
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from itertools import islice
+from typing import Callable, Iterator, NamedTuple, Optional
+
+from database import Database, PERFIS_ARMAZENAMENTO
+from models import Usuario
+from registro import configurar_do_ambiente
+
+logger = logging.getLogger(__name__)
+
+# Registros validados e gravados por transação
+TAMANHO_LOTE = 50000
+
+CAMPOS = {
+    'usuarios': ('nome', 'email', 'cpf'),
+    'livros': ('titulo', 'autor', 'ano', 'copias_disponiveis'),
+}
+
+class LinhaInvalida(NamedTuple):
+    """Linha de JSON Lines que não pôde ser decodificada; é rejeitada com o motivo."""
+    motivo: str
+
+class ResultadoImportacao(NamedTuple):
+    lidos: int
+    importados: int
+    rejeitados: int
+    arquivo_rejeitados: Optional[str]
+
+def ler_registros(caminho: str) -> Iterator[dict]:
+    """Lê registros de um arquivo .csv, .jsonl/.ndjson ou .json (lista de objetos) sem carregá-lo inteiro.
+
+    Uma linha JSON Lines malformada vira LinhaInvalida, rejeitada sem interromper a leitura.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    with open(caminho, encoding='utf-8-sig', newline='') as arquivo:
+        if extensao == '.csv':
+            yield from csv.DictReader(arquivo)
+        elif extensao in ('.jsonl', '.ndjson'):
+            for linha in arquivo:
+                if linha.strip():
+                    try:
+                        yield json.loads(linha)
+                    except json.JSONDecodeError as e:
+                        yield LinhaInvalida(f"JSON inválido ({e.msg}, coluna {e.colno}): {linha.strip()[:100]}")
+        elif extensao == '.json':
+            yield from _ler_lista_json(arquivo)
+        else:
+            raise ValueError(f"Formato de arquivo não suportado: {extensao}")
+
+def _ler_lista_json(arquivo, tamanho_bloco: int = 1 << 16) -> Iterator[dict]:
+    """Decodifica os objetos de uma lista JSON um a um, lendo o arquivo em blocos."""
+    decoder = json.JSONDecoder()
+    buffer = arquivo.read(tamanho_bloco).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError("O arquivo JSON deve conter uma lista de objetos")
+    buffer = buffer[1:]
+
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            objeto, fim = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            bloco = arquivo.read(tamanho_bloco)
+            if not bloco:
+                raise
+            buffer += bloco
+            continue
+        yield objeto
+        buffer = buffer[fim:]
+        if len(buffer) < tamanho_bloco:
+            buffer += arquivo.read(tamanho_bloco)
+
+def _texto(registro: dict, campo: str) -> Optional[str]:
+    valor = registro.get(campo)
+    if valor is None:
+        return None
+    valor = str(valor).strip()
+    return valor or None
+
+def validar_usuario(registro: dict):
+    """Converte o registro em (nome, email, cpf) ou levanta ValueError com o motivo."""
+    usuario = Usuario(
+        nome=_texto(registro, 'nome'),
+        email=_texto(registro, 'email'),
+        cpf=_texto(registro, 'cpf')
+    )
+    if not usuario.nome:
+        raise ValueError("Nome é obrigatório")
+    if not usuario.validar_cpf():
+        raise ValueError("CPF inválido")
+    if not usuario.validar_email():
+        raise ValueError("E-mail inválido")
+    return (usuario.nome, usuario.email, usuario.cpf)
+
+def validar_livro(registro: dict):
+    """Converte o registro em (titulo, autor, ano, copias) ou levanta ValueError com o motivo."""
+    titulo = _texto(registro, 'titulo')
+    autor = _texto(registro, 'autor')
+    if not titulo or not autor:
+        raise ValueError("Título e autor são obrigatórios")
+
+    ano = _texto(registro, 'ano')
+    copias = _texto(registro, 'copias_disponiveis')
+    try:
+        ano = int(ano) if ano else None
+        copias = int(copias) if copias else 1
+    except ValueError:
+        raise ValueError("Ano e cópias devem ser números inteiros")
+    if copias < 0:
+        raise ValueError("Cópias não pode ser negativo")
+    return (titulo, autor, ano, copias)
+
+class Importador:
+    """Importa usuários ou livros em lotes validados, gravando as rejeições num CSV à parte."""
+
+    VALIDADORES = {'usuarios': validar_usuario, 'livros': validar_livro}
+
+    def __init__(self, db: Database, tamanho_lote: int = TAMANHO_LOTE,
+                 progresso: Optional[Callable[[int, int], None]] = None):
+        self.db = db
+        self.tamanho_lote = tamanho_lote
+        self.progresso = progresso
+        self.inserir = {
+            'usuarios': db.inserir_usuarios_lote,
+            'livros': db.inserir_livros_lote,
+        }
+
+    def importar(self, tipo: str, caminho: str, caminho_rejeitados: Optional[str] = None) -> ResultadoImportacao:
+        if tipo not in self.VALIDADORES:
+            raise ValueError(f"Tipo de importação desconhecido: {tipo}")
+        validar = self.VALIDADORES[tipo]
+        inserir = self.inserir[tipo]
+        caminho_rejeitados = caminho_rejeitados or os.path.splitext(caminho)[0] + '.rejeitados.csv'
+
+        lidos = importados = 0
+        rejeicoes = _ArquivoRejeitados(caminho_rejeitados, CAMPOS[tipo])
+        registros = enumerate(ler_registros(caminho), start=1)
+        try:
+            while True:
+                lote = list(islice(registros, self.tamanho_lote))
+                if not lote:
+                    break
+                lidos += len(lote)
+
+                validos, origens = [], []
+                for numero, registro in lote:
+                    try:
+                        if isinstance(registro, LinhaInvalida):
+                            raise ValueError(registro.motivo)
+                        if not isinstance(registro, dict):
+                            # Item de lista JSON (ou linha JSONL) que não é um objeto
+                            raise ValueError(f"Registro não é um objeto: {json.dumps(registro)[:100]}")
+                        validos.append(validar(registro))
+                        origens.append((numero, registro))
+                    except ValueError as e:
+                        rejeicoes.gravar(numero, registro, str(e))
+
+                recusados = inserir(validos) if validos else []
+                for posicao, motivo in recusados:
+                    numero, registro = origens[posicao]
+                    rejeicoes.gravar(numero, registro, motivo)
+                importados += len(validos) - len(recusados)
+
+                if self.progresso:
+                    self.progresso(lidos, importados)
+        finally:
+            rejeicoes.fechar()
+
+        logger.info(
+            "Importação de %s (%s): %d lidos, %d importados, %d rejeitados",
+            tipo, caminho, lidos, importados, rejeicoes.total
+        )
+        return ResultadoImportacao(
+            lidos, importados, rejeicoes.total,
+            caminho_rejeitados if rejeicoes.total else None
+        )
+
+class _ArquivoRejeitados:
+    """CSV com as linhas rejeitadas, criado só na primeira rejeição."""
+
+    def __init__(self, caminho: str, campos):
+        self.caminho = caminho
+        self.campos = ['linha', 'motivo', *campos]
+        self.total = 0
+        self._arquivo = None
+        self._writer = None
+
+    def gravar(self, numero: int, registro, motivo: str):
+        if self._writer is None:
+            self._arquivo = open(self.caminho, 'w', encoding='utf-8', newline='')
+            self._writer = csv.DictWriter(self._arquivo, self.campos, extrasaction='ignore')
+            self._writer.writeheader()
+        campos = registro if isinstance(registro, dict) else {}
+        self._writer.writerow({**campos, 'linha': numero, 'motivo': motivo})
+        self.total += 1
+
+    def fechar(self):
+        if self._arquivo:
+            self._arquivo.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Importação em lote de usuários ou livros (CSV, JSON ou JSON Lines).")
+    parser.add_argument('tipo', choices=sorted(CAMPOS), help="tipo de registro")
+    parser.add_argument('arquivo', help="arquivo .csv, .json ou .jsonl")
+    parser.add_argument('--rejeitados', help="CSV de saída para as linhas rejeitadas")
+    parser.add_argument('--banco', default='biblioteca.db', help="arquivo do banco SQLite")
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE, help="registros por transação")
+    parser.add_argument('--perfil', choices=sorted(PERFIS_ARMAZENAMENTO), default='bulk-load',
+                        help="perfil de armazenamento do banco (padrão: bulk-load)")
+    args = parser.parse_args(argv)
+
+    configurar_do_ambiente('biblioteca.log')
+    db = Database(args.banco, perfil=args.perfil)
+    try:
+        importador = Importador(
+            db, args.lote,
+            progresso=lambda lidos, importados: print(f"\r{lidos} lidos, {importados} importados", end='', file=sys.stderr)
+        )
+        resultado = importador.importar(args.tipo, args.arquivo, args.rejeitados)
+    finally:
+        db.fechar()
+
+    print(file=sys.stderr)
+    print(f"{resultado.importados} de {resultado.lidos} registros importados.")
+    if resultado.rejeitados:
+        print(f"{resultado.rejeitados} rejeitados, detalhados em {resultado.arquivo_rejeitados}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
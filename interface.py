@@ -1,9 +1,12 @@
+import queue
 import tkinter as tk
-from tkinter import ttk, messagebox, simpledialog
+from concurrent.futures import Future, ThreadPoolExecutor
+from tkinter import ttk, messagebox, filedialog
 from datetime import datetime
-from tkcalendar import DateEntry
-from database import Database
-from models import Usuario, Livro, Emprestimo
+from cache import DatabaseComCache
+from database import ITEM_OK, MOTIVOS_DEVOLUCAO, MOTIVOS_RECUSA, ConflitoAtualizacao
+from models import Usuario, Livro
+from widgets import TypeAheadCombobox, VirtualTreeview, list_source
 
 class StyleManager:
     def __init__(self):
@@ -42,8 +45,85 @@ class StyleManager:
             foreground=[('active', 'white')]
         )
 
+class DBExecutor:
+    """Executa chamadas ao banco fora do loop do Tk.
+    
+    As funções rodam numa thread dedicada; os callbacks de sucesso/erro são
+    devolvidos à thread do Tk por uma fila consultada com root.after.
+    """
+    
+    def __init__(self, root, max_workers: int = 1, intervalo_ms: int = 16):
+        self.root = root
+        self.intervalo_ms = intervalo_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='db')
+        self._callbacks = queue.SimpleQueue()
+        self._pendentes = 0
+        self._agendado = False
+        self.on_busy = None
+    
+    def submit(self, func, *args, on_success=None, on_error=None, **kwargs) -> Future:
+        """Agenda func(*args, **kwargs); on_success/on_error rodam na thread do Tk."""
+        self._pendentes += 1
+        if self._pendentes == 1 and self.on_busy:
+            self.on_busy(True)
+        
+        future = self._executor.submit(func, *args, **kwargs)
+        future.add_done_callback(
+            lambda f: self._callbacks.put(lambda: self._concluir(f, on_success, on_error))
+        )
+        self._agendar()
+        return future
+    
+    def post(self, func, *args):
+        """Agenda func(*args) na thread do Tk; usado por tarefas em execução (ex.: progresso)."""
+        self._callbacks.put(lambda: func(*args))
+    
+    def _concluir(self, future: Future, on_success, on_error):
+        self._pendentes -= 1
+        if self._pendentes == 0 and self.on_busy:
+            self.on_busy(False)
+        
+        if future.cancelled():
+            return
+        erro = future.exception()
+        if erro is not None:
+            if on_error:
+                on_error(erro)
+            else:
+                raise erro
+        elif on_success:
+            on_success(future.result())
+    
+    def _agendar(self):
+        if not self._agendado:
+            self._agendado = True
+            self.root.after(self.intervalo_ms, self._processar)
+    
+    def _processar(self):
+        self._agendado = False
+        try:
+            while True:
+                try:
+                    callback = self._callbacks.get_nowait()
+                except queue.Empty:
+                    break
+                callback()
+        finally:
+            if self._pendentes or not self._callbacks.empty():
+                self._agendar()
+    
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
 class BibliotecaApp:
-    def __init__(self, root):
+    FILL_CHUNK = 500  # linhas inseridas na Treeview por ciclo do loop do Tk
+    OVERDUE_CHECK_MS = 60 * 60 * 1000  # intervalo entre apurações de atraso (só muda ao virar o dia)
+    SEARCH_LIMIT = 200  # resultados exibidos por busca de livros
+    SUGGESTION_LIMIT = 15  # sugestões nos campos de busca incremental
+    DIAGNOSTICS_REFRESH_MS = 2000  # atualização da janela de diagnóstico
+    
+    def __init__(self, root, db=None):
+        """`db` substitui o banco local (ex.: cliente.DatabaseRemoto de um servidor.py)."""
         self.root = root
         self.root.title("Sistema de Biblioteca")
         self.root.geometry("1100x700")
@@ -51,11 +131,88 @@ class BibliotecaApp:
         
         # Configurar estilo
         self.style = StyleManager()
-        self.db = Database()
+        self.db = db if db is not None else DatabaseComCache()
+        self.db_executor = DBExecutor(root)
+        # Tarefas longas (importação) não bloqueiam as consultas das telas
+        self.background_executor = DBExecutor(root)
+        self._fill_jobs = {}
+        self.diagnostics_window = None
         
         # Configurar layout principal
         self.setup_main_layout()
+        self.db_executor.on_busy = self.set_loading
         self.show_home_screen()
+        self.refresh_overdue_status()
+    
+    def close(self):
+        """Encerra a thread do banco e o pool de conexões."""
+        self.db_executor.shutdown()
+        self.background_executor.shutdown()
+        self.db.fechar()
+    
+    def run_db(self, func, *args, on_success=None, error_message="Falha ao acessar o banco",
+               on_conflict=None, on_error=None, **kwargs):
+        """Executa func no DBExecutor, exibindo erros com messagebox.
+        
+        Se `on_conflict` for informado, é chamado (após o aviso) quando func
+        levanta ConflitoAtualizacao, para recarregar os dados alterados.
+        Os demais erros são exibidos e, em seguida, repassados a `on_error`.
+        """
+        def handle_error(exc):
+            if on_conflict and isinstance(exc, ConflitoAtualizacao):
+                messagebox.showwarning(
+                    "Conflito de edição",
+                    "O registro foi alterado por outra operação (por exemplo, um empréstimo "
+                    "ou uma devolução) enquanto era editado.\n\n"
+                    "Os dados atuais foram recarregados no formulário; revise e salve novamente."
+                )
+                self.update_status(str(exc))
+                on_conflict()
+                return
+            messagebox.showerror("Erro", f"{error_message}: {str(exc)}")
+            self.update_status(f"{error_message}: {str(exc)}")
+            if on_error:
+                on_error(exc)
+        
+        return self.db_executor.submit(func, *args, on_success=on_success, on_error=handle_error, **kwargs)
+    
+    def _db_runner(self, error_message: str):
+        """Função `run` dos widgets de widgets.py: executa pelo DBExecutor."""
+        return lambda func, on_success, on_error=None: self.run_db(
+            func, on_success=on_success, error_message=error_message, on_error=on_error
+        )
+    
+    def refresh_overdue_status(self):
+        """Apura os atrasos do dia (se atrasos.py ainda não rodou) e reagenda a verificação."""
+        self.run_db(self.db.apurar_atrasos, error_message="Falha ao apurar atrasos")
+        self.root.after(self.OVERDUE_CHECK_MS, self.refresh_overdue_status)
+    
+    def fill_tree(self, tree, rows, done_message=None):
+        """Substitui o conteúdo da Treeview inserindo as linhas em blocos."""
+        job = self._fill_jobs.pop(str(tree), None)
+        if job:
+            self.root.after_cancel(job)
+        if not tree.winfo_exists():
+            return
+        
+        tree.delete(*tree.get_children())
+        
+        def insert_chunk(start):
+            if not tree.winfo_exists():
+                self._fill_jobs.pop(str(tree), None)
+                return
+            for values in rows[start:start + self.FILL_CHUNK]:
+                tree.insert('', tk.END, values=values)
+            
+            start += self.FILL_CHUNK
+            if start < len(rows):
+                self._fill_jobs[str(tree)] = self.root.after(1, insert_chunk, start)
+            else:
+                self._fill_jobs.pop(str(tree), None)
+                if done_message:
+                    self.update_status(done_message)
+        
+        insert_chunk(0)
     
     def show_book_screen(self):
         """Exibe a tela de gerenciamento de livros."""
@@ -107,13 +264,17 @@ class BibliotecaApp:
         # Lista de livros
         list_frame = ttk.LabelFrame(book_frame, text="Livros Cadastrados", padding=10)
         list_frame.pack(fill=tk.BOTH, expand=True)
+        self.build_book_search(list_frame, 'book_tree')
         
         columns = ('id', 'titulo', 'autor', 'ano', 'copias')
-        self.book_tree = ttk.Treeview(
+        fetch, count = self._book_source()
+        self.book_tree = VirtualTreeview(
             list_frame,
             columns=columns,
-            show='headings',
-            selectmode='browse'
+            fetch=fetch,
+            count=count,
+            selectmode='browse',
+            run=self._db_runner("Erro ao carregar livros")
         )
         
         # Configurar colunas
@@ -132,10 +293,6 @@ class BibliotecaApp:
         self.book_tree.heading('copias', text='Cópias')
         self.book_tree.column('copias', width=80, anchor=tk.CENTER)
         
-        # Barra de rolagem
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.book_tree.yview)
-        self.book_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.book_tree.pack(fill=tk.BOTH, expand=True)
         
         # Botões de ação
@@ -164,19 +321,64 @@ class BibliotecaApp:
         
         # Carregar livros
         self.load_books()
-        self.update_status("Cadastro de livros carregado")
 
     def load_books(self):
         """Carrega a lista de livros na Treeview."""
-        for item in self.book_tree.get_children():
-            self.book_tree.delete(item)
-        
-        books = self.db.listar_livros()
-        for book in books:
-            self.book_tree.insert('', tk.END, values=(
-                book.id, book.titulo, book.autor, book.ano or '', book.copias_disponiveis
-            ))
+        self.book_tree.refresh(on_done=lambda: self.update_status("Cadastro de livros carregado"))
+    
+    def _book_source(self, disponiveis: bool = False):
+        """Origem paginada (fetch, count) de livros para VirtualTreeview."""
+        def fetch(limit, after=None, before=None, offset=0):
+            books = self.db.pagina_livros(
+                limit, apos=after, antes=before, offset=offset, disponiveis=disponiveis
+            )
+            return [
+                ((book.titulo, book.id),
+                 (book.id, book.titulo, book.autor, book.ano or '', book.copias_disponiveis))
+                for book in books
+            ]
+        
+        return fetch, lambda: self.db.contar_livros(disponiveis)
 
+    def build_book_search(self, parent, tree_name: str, disponiveis: bool = False):
+        """Cria a barra de busca por título/autor que filtra a lista `tree_name`."""
+        search_frame = ttk.Frame(parent)
+        search_frame.pack(fill=tk.X, pady=(0, 5))
+        
+        ttk.Label(search_frame, text="Buscar (título/autor):").pack(side=tk.LEFT)
+        entry = ttk.Entry(search_frame, width=40)
+        entry.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+        
+        def search(event=None):
+            self.search_books(getattr(self, tree_name), entry.get(), disponiveis)
+        
+        def clear():
+            entry.delete(0, tk.END)
+            search()
+        
+        entry.bind('<Return>', search)
+        ttk.Button(search_frame, text="Buscar", command=search).pack(side=tk.LEFT, padx=5)
+        ttk.Button(search_frame, text="Limpar", command=clear).pack(side=tk.LEFT)
+    
+    def search_books(self, tree, query: str, disponiveis: bool = False):
+        """Exibe na lista os livros encontrados (ou todos, se a busca estiver vazia)."""
+        query = query.strip()
+        if not query:
+            tree.set_source(*self._book_source(disponiveis))
+            return
+        
+        def on_success(books):
+            if not tree.winfo_exists():
+                return
+            tree.set_source(*list_source([
+                (book.id, book.titulo, book.autor, book.ano or '', book.copias_disponiveis)
+                for book in books
+            ]))
+            self.update_status(f"{len(books)} livro(s) encontrado(s) para '{query}'")
+        
+        self.run_db(self.db.buscar_livros, query, self.SEARCH_LIMIT, disponiveis,
+                    on_success=on_success, error_message="Erro na busca de livros")
+    
     def clear_book_form(self):
         """Limpa o formulário de livro."""
         self.book_title_entry.delete(0, tk.END)
@@ -184,6 +386,7 @@ class BibliotecaApp:
         self.book_year_entry.delete(0, tk.END)
         self.book_copies_entry.delete(0, tk.END)
         self.current_book_id = None
+        self.current_book_version = None
 
     def save_book(self):
         """Salva ou atualiza um livro."""
@@ -198,27 +401,31 @@ class BibliotecaApp:
         try:
             ano = int(ano) if ano else None
             copias = int(copias)
-            
-            livro = Livro(titulo=titulo, autor=autor, ano=ano, copias_disponiveis=copias)
-            
-            if hasattr(self, 'current_book_id') and self.current_book_id:
-                livro.id = self.current_book_id
-                success = self.db.atualizar_livro(livro)
-                message = "atualizado"
-            else:
-                self.db.criar_livro(livro)
-                message = "cadastrado"
-            
+        except ValueError:
+            messagebox.showerror("Erro", "Ano e cópias devem ser números inteiros!")
+            return
+        
+        livro = Livro(titulo=titulo, autor=autor, ano=ano, copias_disponiveis=copias)
+        
+        if hasattr(self, 'current_book_id') and self.current_book_id:
+            livro.id = self.current_book_id
+            livro.versao = self.current_book_version
+            save, message = self.db.atualizar_livro, "atualizado"
+        else:
+            save, message = self.db.criar_livro, "cadastrado"
+        
+        def on_success(_):
             messagebox.showinfo("Sucesso", f"Livro {message} com sucesso!")
             self.clear_book_form()
             self.load_books()
             self.update_status(f"Livro {message} com sucesso")
-            
-        except ValueError:
-            messagebox.showerror("Erro", "Ano e cópias devem ser números inteiros!")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao salvar livro: {str(e)}")
-            self.update_status(f"Erro ao salvar livro: {str(e)}")
+        
+        def on_conflict():
+            self.load_book_form(livro.id)
+            self.load_books()
+        
+        self.run_db(save, livro, on_success=on_success, error_message="Falha ao salvar livro",
+                    on_conflict=on_conflict)
 
     def edit_book(self):
         """Preenche o formulário com os dados do livro selecionado."""
@@ -228,23 +435,35 @@ class BibliotecaApp:
             return
         
         item = self.book_tree.item(selected[0])
-        book_id, titulo, autor, ano, copias = item['values']
-        
-        self.current_book_id = book_id
-        self.book_title_entry.delete(0, tk.END)
-        self.book_title_entry.insert(0, titulo)
-        
-        self.book_author_entry.delete(0, tk.END)
-        self.book_author_entry.insert(0, autor)
-        
-        self.book_year_entry.delete(0, tk.END)
-        if ano:
-            self.book_year_entry.insert(0, ano)
-        
-        self.book_copies_entry.delete(0, tk.END)
-        self.book_copies_entry.insert(0, copias)
+        self.load_book_form(item['values'][0])
+    
+    def load_book_form(self, book_id: int):
+        """Lê o livro do banco (com a versão atual) e preenche o formulário."""
+        def on_success(book):
+            if book is None:
+                messagebox.showwarning("Aviso", "O livro não existe mais!")
+                self.clear_book_form()
+                return
+            
+            self.current_book_id = book.id
+            self.current_book_version = book.versao
+            self.book_title_entry.delete(0, tk.END)
+            self.book_title_entry.insert(0, book.titulo)
+            
+            self.book_author_entry.delete(0, tk.END)
+            self.book_author_entry.insert(0, book.autor)
+            
+            self.book_year_entry.delete(0, tk.END)
+            if book.ano:
+                self.book_year_entry.insert(0, book.ano)
+            
+            self.book_copies_entry.delete(0, tk.END)
+            self.book_copies_entry.insert(0, book.copias_disponiveis)
+            
+            self.update_status(f"Editando livro: {book.titulo}")
         
-        self.update_status(f"Editando livro: {titulo}")
+        self.run_db(self.db.obter_livro, book_id, on_success=on_success,
+                    error_message="Erro ao carregar livro")
 
     def delete_book(self):
         """Exclui o livro selecionado."""
@@ -261,29 +480,34 @@ class BibliotecaApp:
             f"Tem certeza que deseja excluir o livro '{titulo}'?",
             icon='warning'
         ):
-            try:
-                if self.db.remover_livro(book_id):
+            def on_success(removed):
+                if removed:
                     messagebox.showinfo("Sucesso", "Livro excluído com sucesso!")
                     self.load_books()
                     self.clear_book_form()
                     self.update_status(f"Livro {titulo} excluído")
                 else:
                     messagebox.showerror("Erro", "Não foi possível excluir o livro!")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Falha ao excluir livro: {str(e)}")
-                self.update_status(f"Erro ao excluir livro: {str(e)}")
+            
+            self.run_db(self.db.remover_livro, book_id, on_success=on_success,
+                        error_message="Falha ao excluir livro")
 
     def setup_main_layout(self):
         """Configura o layout principal da aplicação."""
         # Barra de status
+        status_frame = ttk.Frame(self.root, relief=tk.SUNKEN)
+        status_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        
         self.status_var = tk.StringVar()
         self.status_bar = ttk.Label(
-            self.root, 
+            status_frame, 
             textvariable=self.status_var,
-            relief=tk.SUNKEN,
             anchor=tk.W
         )
-        self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.status_bar.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        
+        # Indicador de carregamento (visível enquanto há consultas pendentes)
+        self.loading_bar = ttk.Progressbar(status_frame, mode='indeterminate', length=120)
         self.update_status("Sistema iniciado")
         
         # Frame principal
@@ -293,10 +517,21 @@ class BibliotecaApp:
         # Criar menu
         self.create_menu()
     
-    def update_status(self, message: str):
-        """Atualiza a barra de status."""
+    def update_status(self, message: str, loading: bool = None):
+        """Atualiza a barra de status e, se informado, o indicador de carregamento."""
         timestamp = datetime.now().strftime("%H:%M:%S")
         self.status_var.set(f"{timestamp} - {message}")
+        if loading is not None:
+            self.set_loading(loading)
+    
+    def set_loading(self, loading: bool):
+        """Mostra ou esconde o indicador de carregamento da barra de status."""
+        if loading:
+            self.loading_bar.pack(side=tk.RIGHT, padx=5)
+            self.loading_bar.start(15)
+        else:
+            self.loading_bar.stop()
+            self.loading_bar.pack_forget()
     
     def create_menu(self):
         """Cria a barra de menu principal."""
@@ -306,6 +541,9 @@ class BibliotecaApp:
         cadastro_menu = tk.Menu(menubar, tearoff=0)
         cadastro_menu.add_command(label="Usuários", command=self.show_user_screen)
         cadastro_menu.add_command(label="Livros", command=self.show_book_screen)
+        cadastro_menu.add_separator()
+        cadastro_menu.add_command(label="Importar usuários...", command=lambda: self.import_file('usuarios'))
+        cadastro_menu.add_command(label="Importar livros...", command=lambda: self.import_file('livros'))
         menubar.add_cascade(label="Cadastros", menu=cadastro_menu)
         
         # Menu Operações
@@ -319,15 +557,104 @@ class BibliotecaApp:
         relatorios_menu.add_command(label="Livros Disponíveis", command=self.show_available_books)
         relatorios_menu.add_command(label="Empréstimos Ativos", command=self.show_active_loans)
         relatorios_menu.add_command(label="Usuários com Atraso", command=self.show_overdue_users)
+        exportar_menu = tk.Menu(relatorios_menu, tearoff=0)
+        exportar_menu.add_command(label="Livros Disponíveis...",
+                                  command=lambda: self.export_report('livros_disponiveis'))
+        exportar_menu.add_command(label="Empréstimos Ativos...",
+                                  command=lambda: self.export_report('emprestimos_ativos'))
+        exportar_menu.add_command(label="Usuários com Atraso...",
+                                  command=lambda: self.export_report('usuarios_em_atraso'))
+        relatorios_menu.add_separator()
+        relatorios_menu.add_cascade(label="Exportar", menu=exportar_menu)
         menubar.add_cascade(label="Relatórios", menu=relatorios_menu)
         
         # Menu Ajuda
         ajuda_menu = tk.Menu(menubar, tearoff=0)
         ajuda_menu.add_command(label="Sobre", command=self.show_about)
         menubar.add_cascade(label="Ajuda", menu=ajuda_menu)
+        self.ajuda_menu = ajuda_menu
+        
+        # Diagnóstico oculto: Ctrl+Shift+D inclui o item no menu Ajuda e abre a janela
+        self.root.bind_all('<Control-Shift-D>', lambda e: self.show_diagnostics())
         
         self.root.config(menu=menubar)
     
+    def import_file(self, tipo: str):
+        """Importa usuários ou livros de um arquivo CSV/JSON em segundo plano."""
+        caminho = filedialog.askopenfilename(
+            title="Importar " + ("usuários" if tipo == 'usuarios' else "livros"),
+            filetypes=[
+                ("CSV, JSON ou JSON Lines", "*.csv *.json *.jsonl *.ndjson"),
+                ("Todos os arquivos", "*.*")
+            ]
+        )
+        if not caminho:
+            return
+        
+        def progresso(lidos, importados):
+            self.background_executor.post(
+                self.update_status, f"Importando... {lidos} lidos, {importados} importados"
+            )
+        
+        def on_success(resultado):
+            self.set_loading(False)
+            mensagem = f"{resultado.importados} de {resultado.lidos} registros importados."
+            if resultado.rejeitados:
+                mensagem += (f"\n{resultado.rejeitados} rejeitados, detalhados em:"
+                             f"\n{resultado.arquivo_rejeitados}")
+            self.update_status(mensagem.split("\n")[0])
+            messagebox.showinfo("Importação", mensagem)
+        
+        def on_error(exc):
+            self.set_loading(False)
+            messagebox.showerror("Erro", f"Falha na importação: {str(exc)}")
+            self.update_status(f"Falha na importação: {str(exc)}")
+        
+        # Importado só no primeiro uso, fora do caminho de inicialização
+        from importador import Importador
+        
+        self.update_status("Importando...", loading=True)
+        importador = Importador(self.db, progresso=progresso)
+        self.background_executor.submit(
+            importador.importar, tipo, caminho, on_success=on_success, on_error=on_error
+        )
+    
+    def export_report(self, relatorio: str):
+        """Exporta um relatório para CSV, JSON Lines ou formato colunar em segundo plano."""
+        caminho = filedialog.asksaveasfilename(
+            title="Exportar relatório",
+            initialfile=relatorio + '.csv',
+            defaultextension='.csv',
+            filetypes=[
+                ("CSV", "*.csv"),
+                ("JSON Lines", "*.jsonl"),
+                ("Colunar compactado", "*.bcol")
+            ]
+        )
+        if not caminho:
+            return
+        
+        def progresso(exportadas, total):
+            self.background_executor.post(
+                self.update_status, f"Exportando... {exportadas} de {total} linhas"
+            )
+        
+        def on_success(linhas):
+            self.update_status(f"{linhas} linhas exportadas para {caminho}", loading=False)
+        
+        def on_error(exc):
+            self.set_loading(False)
+            messagebox.showerror("Erro", f"Falha na exportação: {str(exc)}")
+            self.update_status(f"Falha na exportação: {str(exc)}")
+        
+        from exportador import exportar
+        
+        self.update_status("Exportando...", loading=True)
+        self.background_executor.submit(
+            exportar, self.db, relatorio, caminho, progresso=progresso,
+            on_success=on_success, on_error=on_error
+        )
+    
     def show_loan_screen(self):
         """Exibe a tela de empréstimos de livros."""
         self.clear_main_frame()
@@ -348,18 +675,41 @@ class BibliotecaApp:
         form_frame = ttk.Frame(loan_frame)
         form_frame.pack(fill=tk.X, pady=5)
         
-        # Seleção de usuário
-        ttk.Label(form_frame, text="Usuário:").grid(row=0, column=0, sticky=tk.W, pady=5)
-        self.loan_user_combo = ttk.Combobox(form_frame, state="readonly")
+        # Seleção de usuário (busca por nome ou CPF)
+        ttk.Label(form_frame, text="Usuário (nome ou CPF):").grid(row=0, column=0, sticky=tk.W, pady=5)
+        self.loan_user_combo = TypeAheadCombobox(
+            form_frame,
+            search=self.suggest_users,
+            run=self._db_runner("Erro ao buscar usuários")
+        )
         self.loan_user_combo.grid(row=0, column=1, pady=5, padx=5, sticky=tk.EW)
         
-        # Seleção de livro
+        # Seleção de livro (busca por título ou autor)
         ttk.Label(form_frame, text="Livro disponível:").grid(row=1, column=0, sticky=tk.W, pady=5)
-        self.loan_book_combo = ttk.Combobox(form_frame, state="readonly")
+        self.loan_book_combo = TypeAheadCombobox(
+            form_frame,
+            search=self.suggest_available_books,
+            run=self._db_runner("Erro ao buscar livros")
+        )
         self.loan_book_combo.grid(row=1, column=1, pady=5, padx=5, sticky=tk.EW)
-        
-        # Carregar combos
-        self.load_loan_combos()
+        self.loan_book_combo.bind('<Return>', lambda e: self.add_to_cart())
+        ttk.Button(
+            form_frame,
+            text="Adicionar",
+            command=self.add_to_cart
+        ).grid(row=1, column=2, pady=5)
+        form_frame.columnconfigure(1, weight=1)
+        
+        # Carrinho: livros a emprestar de uma vez ao mesmo usuário
+        ttk.Label(form_frame, text="Livros do empréstimo:").grid(row=2, column=0, sticky=(tk.W, tk.N), pady=5)
+        self.loan_cart = []  # pares (id do livro, descrição)
+        self.cart_list = tk.Listbox(form_frame, height=5, selectmode=tk.EXTENDED)
+        self.cart_list.grid(row=2, column=1, pady=5, padx=5, sticky=tk.EW)
+        ttk.Button(
+            form_frame,
+            text="Remover",
+            command=self.remove_from_cart
+        ).grid(row=2, column=2, pady=5, sticky=tk.N)
         
         # Botão de empréstimo
         ttk.Button(
@@ -374,11 +724,14 @@ class BibliotecaApp:
         list_frame.pack(fill=tk.BOTH, expand=True)
         
         columns = ('id', 'usuario', 'livro', 'data', 'devolucao')
-        self.loan_tree = ttk.Treeview(
+        fetch, count = self._loan_source(with_status=False)
+        self.loan_tree = VirtualTreeview(
             list_frame,
             columns=columns,
-            show='headings',
-            selectmode='browse'
+            fetch=fetch,
+            count=count,
+            selectmode='extended',
+            run=self._db_runner("Erro ao carregar empréstimos")
         )
         
         # Configurar colunas
@@ -397,66 +750,120 @@ class BibliotecaApp:
         self.loan_tree.heading('devolucao', text='Devolução Prevista')
         self.loan_tree.column('devolucao', width=120, anchor=tk.CENTER)
         
-        # Barra de rolagem
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.loan_tree.yview)
-        self.loan_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.loan_tree.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Button(
+            list_frame,
+            text="Devolver Selecionados",
+            command=lambda: self.return_loans(self.loan_tree, self.load_active_loans)
+        ).pack(pady=(10, 0))
     
         # Carregar empréstimos
         self.load_active_loans()
-        self.update_status("Tela de empréstimos carregada")
 
-    def load_loan_combos(self):
-        """Carrega os comboboxes de usuário e livros disponíveis."""
-        users = self.db.listar_usuarios()
-        self.loan_user_combo['values'] = [f"{u.id} - {u.nome}" for u in users]
-        
-        books = self.db.listar_livros(disponiveis=True)
-        self.loan_book_combo['values'] = [f"{b.id} - {b.titulo}" for b in books]
+    def suggest_users(self, text: str):
+        """Sugestões do combobox de usuários (executado na thread do banco)."""
+        return [
+            f"{u.id} - {u.nome} (CPF {u.cpf})"
+            for u in self.db.buscar_usuarios(text, self.SUGGESTION_LIMIT)
+        ]
+    
+    def suggest_available_books(self, text: str):
+        """Sugestões do combobox de livros disponíveis (executado na thread do banco)."""
+        return [
+            f"{b.id} - {b.titulo} ({b.autor})"
+            for b in self.db.buscar_livros(text, self.SUGGESTION_LIMIT, disponiveis=True)
+        ]
 
     def load_active_loans(self):
         """Carrega a lista de empréstimos ativos."""
-        for item in self.loan_tree.get_children():
-            self.loan_tree.delete(item)
-        
-        loans = self.db.listar_emprestimos_ativos()
-        for loan in loans:
-            user = self.db.obter_usuario(loan.usuario_id)
-            book = self.db.obter_livro(loan.livro_id)
-            
-            self.loan_tree.insert('', tk.END, values=(
-                loan.id,
-                user.nome if user else "Desconhecido",
-                book.titulo if book else "Desconhecido",
-                loan.data_emprestimo.strftime('%d/%m/%Y'),
-                loan.data_devolucao_prevista.strftime('%d/%m/%Y')
-            ))
+        self.loan_tree.refresh(on_done=lambda: self.update_status("Tela de empréstimos carregada"))
+    
+    def _loan_source(self, with_status: bool):
+        """Origem paginada (fetch, count) de empréstimos ativos para VirtualTreeview."""
+        def fetch(limit, after=None, before=None, offset=0):
+            rows = []
+            for loan in self.db.pagina_emprestimos_detalhados(limit, apos=after, antes=before, offset=offset):
+                values = (
+                    loan.id,
+                    loan.usuario_nome or "Desconhecido",
+                    loan.livro_titulo or "Desconhecido",
+                    loan.data_emprestimo.strftime('%d/%m/%Y'),
+                    loan.data_devolucao_prevista.strftime('%d/%m/%Y')
+                )
+                if with_status:
+                    values += (f"Atrasado ({loan.dias_atraso} d)" if loan.atrasado else "No prazo",)
+                rows.append(((loan.data_devolucao_prevista, loan.id), values))
+            return rows
+        
+        return fetch, self.db.contar_emprestimos_ativos
 
+    def add_to_cart(self):
+        """Inclui o livro escolhido na lista do empréstimo."""
+        book = self.loan_book_combo.get()
+        try:
+            book_id = int(book.split(' - ')[0])
+        except ValueError:
+            messagebox.showwarning("Aviso", "Escolha o livro entre as sugestões da lista!")
+            return
+        
+        if any(item_id == book_id for item_id, _ in self.loan_cart):
+            messagebox.showwarning("Aviso", "Este livro já está no empréstimo!")
+            return
+        self.loan_cart.append((book_id, book))
+        self.cart_list.insert(tk.END, book)
+        self.loan_book_combo.clear()
+    
+    def remove_from_cart(self):
+        """Retira da lista do empréstimo os livros selecionados."""
+        for index in reversed(self.cart_list.curselection()):
+            self.cart_list.delete(index)
+            del self.loan_cart[index]
+    
     def register_loan(self):
-        """Registra um novo empréstimo."""
+        """Empresta ao usuário, numa única transação, os livros da lista (ou o livro escolhido)."""
         user = self.loan_user_combo.get()
-        book = self.loan_book_combo.get()
+        if self.loan_book_combo.get():
+            self.add_to_cart()
         
-        if not user or not book:
+        if not user or not self.loan_cart:
             messagebox.showwarning("Aviso", "Selecione usuário e livro!")
             return
         
         try:
             user_id = int(user.split(' - ')[0])
-            book_id = int(book.split(' - ')[0])
-            
-            emprestimo = Emprestimo(usuario_id=user_id, livro_id=book_id)
-            self.db.criar_emprestimo(emprestimo)
-            
-            messagebox.showinfo("Sucesso", "Empréstimo registrado com sucesso!")
-            self.load_active_loans()
-            self.load_loan_combos()
-            self.update_status("Novo empréstimo registrado")
+        except ValueError:
+            messagebox.showwarning("Aviso", "Escolha o usuário entre as sugestões da lista!")
+            return
+        
+        books = dict(self.loan_cart)
+        
+        def on_success(results):
+            refused = [r for r in results if r.codigo != ITEM_OK]
+            lent = len(results) - len(refused)
+            if lent:
+                self.load_active_loans()
+                self.loan_user_combo.clear()
+            # Ficam na lista só os livros recusados, para nova tentativa
+            self.loan_cart = [(r.livro_id, books[r.livro_id]) for r in refused]
+            self.cart_list.delete(0, tk.END)
+            for _, description in self.loan_cart:
+                self.cart_list.insert(tk.END, description)
             
-        except ValueError as e:
-            messagebox.showerror("Erro", f"Erro ao processar empréstimo: {str(e)}")
-            self.update_status(f"Erro ao registrar empréstimo: {str(e)}")
+            if refused:
+                details = "\n".join(
+                    f"- {books[r.livro_id]}: {MOTIVOS_RECUSA.get(r.codigo, r.codigo)}" for r in refused
+                )
+                messagebox.showwarning(
+                    "Empréstimo",
+                    f"{lent} livro(s) emprestado(s); {len(refused)} recusado(s):\n\n{details}"
+                )
+            else:
+                messagebox.showinfo("Sucesso", f"Empréstimo de {lent} livro(s) registrado com sucesso!")
+            self.update_status(f"{lent} livro(s) emprestado(s)")
+        
+        self.run_db(self.db.emprestar_lote, user_id, list(books), on_success=on_success,
+                    error_message="Erro ao registrar empréstimo")
 
     def clear_main_frame(self):
         """Limpa o frame principal."""
@@ -537,11 +944,14 @@ class BibliotecaApp:
         list_frame.pack(fill=tk.BOTH, expand=True)
         
         columns = ('id', 'nome', 'email', 'cpf')
-        self.user_tree = ttk.Treeview(
+        fetch, count = self._user_source()
+        self.user_tree = VirtualTreeview(
             list_frame,
             columns=columns,
-            show='headings',
-            selectmode='browse'
+            fetch=fetch,
+            count=count,
+            selectmode='browse',
+            run=self._db_runner("Erro ao carregar usuários")
         )
         
         # Configurar colunas
@@ -557,10 +967,6 @@ class BibliotecaApp:
         self.user_tree.heading('cpf', text='CPF')
         self.user_tree.column('cpf', width=120, anchor=tk.CENTER)
         
-        # Barra de rolagem
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.user_tree.yview)
-        self.user_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.user_tree.pack(fill=tk.BOTH, expand=True)
         
         # Botões de ação
@@ -589,18 +995,20 @@ class BibliotecaApp:
         
         # Carregar usuários
         self.load_users()
-        self.update_status("Cadastro de usuários carregado")
     
     def load_users(self):
         """Carrega a lista de usuários na Treeview."""
-        for item in self.user_tree.get_children():
-            self.user_tree.delete(item)
-        
-        users = self.db.listar_usuarios()
-        for user in users:
-            self.user_tree.insert('', tk.END, values=(
-                user.id, user.nome, user.email or '', user.cpf
-            ))
+        self.user_tree.refresh(on_done=lambda: self.update_status("Cadastro de usuários carregado"))
+    
+    def _user_source(self):
+        """Origem paginada (fetch, count) de usuários para VirtualTreeview."""
+        def fetch(limit, after=None, before=None, offset=0):
+            return [
+                ((user.nome, user.id), (user.id, user.nome, user.email or '', user.cpf))
+                for user in self.db.pagina_usuarios(limit, apos=after, antes=before, offset=offset)
+            ]
+        
+        return fetch, self.db.contar_usuarios
     
     def clear_user_form(self):
         """Limpa o formulário de usuário."""
@@ -608,6 +1016,7 @@ class BibliotecaApp:
         self.user_email_entry.delete(0, tk.END)
         self.user_cpf_entry.delete(0, tk.END)
         self.current_user_id = None
+        self.current_user_version = None
     
     def save_user(self):
         """Salva ou atualiza um usuário."""
@@ -621,29 +1030,35 @@ class BibliotecaApp:
         
         user = Usuario(nome=nome, email=email, cpf=cpf)
         
-        try:
-            if not user.validar_cpf():
-                raise ValueError("CPF inválido")
-            
-            if email and not user.validar_email():
-                raise ValueError("E-mail inválido")
-            
-            if hasattr(self, 'current_user_id') and self.current_user_id:
-                user.id = self.current_user_id
-                success = self.db.atualizar_usuario(user)
-                message = "atualizado"
-            else:
-                self.db.criar_usuario(user)
-                message = "cadastrado"
-            
+        if not user.validar_cpf():
+            messagebox.showerror("Erro", "CPF inválido")
+            self.update_status("Erro ao salvar usuário: CPF inválido")
+            return
+        
+        if email and not user.validar_email():
+            messagebox.showerror("Erro", "E-mail inválido")
+            self.update_status("Erro ao salvar usuário: E-mail inválido")
+            return
+        
+        if hasattr(self, 'current_user_id') and self.current_user_id:
+            user.id = self.current_user_id
+            user.versao = self.current_user_version
+            save, message = self.db.atualizar_usuario, "atualizado"
+        else:
+            save, message = self.db.criar_usuario, "cadastrado"
+        
+        def on_success(_):
             messagebox.showinfo("Sucesso", f"Usuário {message} com sucesso!")
             self.clear_user_form()
             self.load_users()
             self.update_status(f"Usuário {message} com sucesso")
-            
-        except Exception as e:
-            messagebox.showerror("Erro", str(e))
-            self.update_status(f"Erro ao salvar usuário: {str(e)}")
+        
+        def on_conflict():
+            self.load_user_form(user.id)
+            self.load_users()
+        
+        self.run_db(save, user, on_success=on_success, error_message="Erro ao salvar usuário",
+                    on_conflict=on_conflict)
     
     def edit_user(self):
         """Preenche o formulário com os dados do usuário selecionado."""
@@ -653,20 +1068,32 @@ class BibliotecaApp:
             return
         
         item = self.user_tree.item(selected[0])
-        user_id, nome, email, cpf = item['values']
-        
-        self.current_user_id = user_id
-        self.user_name_entry.delete(0, tk.END)
-        self.user_name_entry.insert(0, nome)
-        
-        self.user_email_entry.delete(0, tk.END)
-        if email:
-            self.user_email_entry.insert(0, email)
-        
-        self.user_cpf_entry.delete(0, tk.END)
-        self.user_cpf_entry.insert(0, cpf)
+        self.load_user_form(item['values'][0])
+    
+    def load_user_form(self, user_id: int):
+        """Lê o usuário do banco (com a versão atual) e preenche o formulário."""
+        def on_success(user):
+            if user is None:
+                messagebox.showwarning("Aviso", "O usuário não existe mais!")
+                self.clear_user_form()
+                return
+            
+            self.current_user_id = user.id
+            self.current_user_version = user.versao
+            self.user_name_entry.delete(0, tk.END)
+            self.user_name_entry.insert(0, user.nome)
+            
+            self.user_email_entry.delete(0, tk.END)
+            if user.email:
+                self.user_email_entry.insert(0, user.email)
+            
+            self.user_cpf_entry.delete(0, tk.END)
+            self.user_cpf_entry.insert(0, user.cpf)
+            
+            self.update_status(f"Editando usuário: {user.nome}")
         
-        self.update_status(f"Editando usuário: {nome}")
+        self.run_db(self.db.obter_usuario, user_id, on_success=on_success,
+                    error_message="Erro ao carregar usuário")
     
     def delete_user(self):
         """Exclui o usuário selecionado."""
@@ -683,17 +1110,17 @@ class BibliotecaApp:
             f"Tem certeza que deseja excluir o usuário {nome}?",
             icon='warning'
         ):
-            try:
-                if self.db.remover_usuario(user_id):
+            def on_success(removed):
+                if removed:
                     messagebox.showinfo("Sucesso", "Usuário excluído com sucesso!")
                     self.load_users()
                     self.clear_user_form()
                     self.update_status(f"Usuário {nome} excluído")
                 else:
                     messagebox.showerror("Erro", "Não foi possível excluir o usuário!")
-            except Exception as e:
-                messagebox.showerror("Erro", f"Falha ao excluir usuário: {str(e)}")
-                self.update_status(f"Erro ao excluir usuário: {str(e)}")
+            
+            self.run_db(self.db.remover_usuario, user_id, on_success=on_success,
+                        error_message="Falha ao excluir usuário")
 
     def show_return_screen(self):
         """Exibe a tela de devolução de livros."""
@@ -716,11 +1143,14 @@ class BibliotecaApp:
         list_frame.pack(fill=tk.BOTH, expand=True)
         
         columns = ('id', 'usuario', 'livro', 'data', 'devolucao', 'status')
-        self.return_tree = ttk.Treeview(
+        fetch, count = self._loan_source(with_status=True)
+        self.return_tree = VirtualTreeview(
             list_frame,
             columns=columns,
-            show='headings',
-            selectmode='browse'
+            fetch=fetch,
+            count=count,
+            selectmode='extended',
+            run=self._db_runner("Erro ao carregar empréstimos")
         )
         
         # Configurar colunas
@@ -742,10 +1172,6 @@ class BibliotecaApp:
         self.return_tree.heading('status', text='Status')
         self.return_tree.column('status', width=100, anchor=tk.CENTER)
         
-        # Barra de rolagem
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.return_tree.yview)
-        self.return_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.return_tree.pack(fill=tk.BOTH, expand=True)
         
         # Botão de devolução
@@ -758,28 +1184,11 @@ class BibliotecaApp:
         
         # Carregar empréstimos
         self.load_returns()
-        self.update_status("Tela de devoluções carregada")
 
     def load_returns(self):
         """Carrega a lista de empréstimos para devolução."""
-        for item in self.return_tree.get_children():
-            self.return_tree.delete(item)
-        
-        loans = self.db.listar_emprestimos_ativos()
-        for loan in loans:
-            user = self.db.obter_usuario(loan.usuario_id)
-            book = self.db.obter_livro(loan.livro_id)
-            
-            status = "Atrasado" if loan.esta_atrasado() else "No prazo"
-            
-            self.return_tree.insert('', tk.END, values=(
-                loan.id,
-                user.nome if user else "Desconhecido",
-                book.titulo if book else "Desconhecido",
-                loan.data_emprestimo.strftime('%d/%m/%Y'),
-                loan.data_devolucao_prevista.strftime('%d/%m/%Y'),
-                status
-            ))
+        self.return_tree.refresh(on_done=lambda: self.update_status("Tela de devoluções carregada"))
+
     def show_available_books(self):
         """Exibe a lista de livros disponíveis para empréstimo."""
         self.clear_main_frame()
@@ -799,13 +1208,17 @@ class BibliotecaApp:
         # Lista de livros
         list_frame = ttk.Frame(avail_frame)
         list_frame.pack(fill=tk.BOTH, expand=True)
+        self.build_book_search(list_frame, 'avail_tree', disponiveis=True)
         
         columns = ('id', 'titulo', 'autor', 'ano', 'copias')
-        self.avail_tree = ttk.Treeview(
+        fetch, count = self._book_source(disponiveis=True)
+        self.avail_tree = VirtualTreeview(
             list_frame,
             columns=columns,
-            show='headings',
-            selectmode='extended'
+            fetch=fetch,
+            count=count,
+            selectmode='extended',
+            run=self._db_runner("Erro ao carregar livros disponíveis")
         )
         
         # Configurar colunas
@@ -824,10 +1237,6 @@ class BibliotecaApp:
         self.avail_tree.heading('copias', text='Cópias Disp.')
         self.avail_tree.column('copias', width=100, anchor=tk.CENTER)
         
-        # Barra de rolagem
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.avail_tree.yview)
-        self.avail_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.avail_tree.pack(fill=tk.BOTH, expand=True)
         
         # Botão de atualizar
@@ -839,43 +1248,41 @@ class BibliotecaApp:
         
         # Carregar dados
         self.load_available_books()
-        self.update_status("Lista de livros disponíveis carregada")
 
     def load_available_books(self):
         """Carrega os livros disponíveis na Treeview."""
-        for item in self.avail_tree.get_children():
-            self.avail_tree.delete(item)
-        
-        books = self.db.listar_livros(disponiveis=True)
-        for book in books:
-            self.avail_tree.insert('', tk.END, values=(
-                book.id,
-                book.titulo,
-                book.autor,
-                book.ano if book.ano else '',
-                book.copias_disponiveis
-            ))
+        self.avail_tree.refresh(on_done=lambda: self.update_status("Lista de livros disponíveis carregada"))
 
     def register_return(self):
-        """Registra a devolução de um livro."""
-        selected = self.return_tree.selection()
-        if not selected:
+        """Registra a devolução dos empréstimos selecionados."""
+        self.return_loans(self.return_tree, self.load_returns)
+    
+    def return_loans(self, tree, reload):
+        """Devolve, numa única transação, todos os empréstimos selecionados em `tree`."""
+        loan_ids = [values[0] for values in tree.selected_values()]
+        if not loan_ids:
             messagebox.showwarning("Aviso", "Selecione um empréstimo para devolver!")
             return
         
-        item = self.return_tree.item(selected[0])
-        loan_id = item['values'][0]
-        
-        try:
-            if self.db.finalizar_emprestimo(loan_id):
-                messagebox.showinfo("Sucesso", "Devolução registrada com sucesso!")
-                self.load_returns()
-                self.update_status("Devolução registrada")
+        def on_success(results):
+            failed = [r for r in results if r.codigo != ITEM_OK]
+            returned = len(results) - len(failed)
+            tree.clear_selection()
+            reload()
+            if failed:
+                details = "\n".join(
+                    f"- Empréstimo {r.emprestimo_id}: {MOTIVOS_DEVOLUCAO.get(r.codigo, r.codigo)}" for r in failed
+                )
+                messagebox.showwarning(
+                    "Devolução",
+                    f"{returned} devolução(ões) registrada(s); {len(failed)} não:\n\n{details}"
+                )
             else:
-                messagebox.showerror("Erro", "Não foi possível registrar a devolução!")
-        except Exception as e:
-            messagebox.showerror("Erro", f"Falha ao registrar devolução: {str(e)}")
-            self.update_status(f"Erro ao registrar devolução: {str(e)}")
+                messagebox.showinfo("Sucesso", f"{returned} devolução(ões) registrada(s) com sucesso!")
+            self.update_status(f"{returned} devolução(ões) registrada(s)")
+        
+        self.run_db(self.db.devolver_lote, loan_ids, on_success=on_success,
+                    error_message="Falha ao registrar devolução")
    
     def show_active_loans(self):
         """Exibe a lista de empréstimos ativos."""
@@ -898,11 +1305,14 @@ class BibliotecaApp:
         list_frame.pack(fill=tk.BOTH, expand=True)
         
         columns = ('id', 'usuario', 'livro', 'data_emp', 'data_dev', 'status')
-        self.loans_tree = ttk.Treeview(
+        fetch, count = self._loan_source(with_status=True)
+        self.loans_tree = VirtualTreeview(
             list_frame,
             columns=columns,
-            show='headings',
-            selectmode='extended'
+            fetch=fetch,
+            count=count,
+            selectmode='extended',
+            run=self._db_runner("Erro ao carregar empréstimos ativos")
         )
         
         # Configurar colunas
@@ -924,10 +1334,6 @@ class BibliotecaApp:
         self.loans_tree.heading('status', text='Status')
         self.loans_tree.column('status', width=100, anchor=tk.CENTER)
         
-        # Barra de rolagem
-        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.loans_tree.yview)
-        self.loans_tree.configure(yscroll=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.loans_tree.pack(fill=tk.BOTH, expand=True)
         
         # Botão de atualizar
@@ -939,28 +1345,10 @@ class BibliotecaApp:
         
         # Carregar dados
         self.load_active_loans_report()
-        self.update_status("Lista de empréstimos ativos carregada")
 
     def load_active_loans_report(self):
         """Carrega os empréstimos ativos na Treeview."""
-        for item in self.loans_tree.get_children():
-            self.loans_tree.delete(item)
-        
-        loans = self.db.listar_emprestimos_ativos()
-        for loan in loans:
-            user = self.db.obter_usuario(loan.usuario_id)
-            book = self.db.obter_livro(loan.livro_id)
-            
-            status = "Atrasado" if loan.esta_atrasado() else "No prazo"
-            
-            self.loans_tree.insert('', tk.END, values=(
-                loan.id,
-                user.nome if user else "Desconhecido",
-                book.titulo if book else "Desconhecido",
-                loan.data_emprestimo.strftime('%d/%m/%Y'),
-                loan.data_devolucao_prevista.strftime('%d/%m/%Y'),
-                status
-            ))
+        self.loans_tree.refresh(on_done=lambda: self.update_status("Lista de empréstimos ativos carregada"))
 
     def show_overdue_users(self):
         """Exibe a lista de usuários com empréstimos em atraso."""
@@ -982,7 +1370,7 @@ class BibliotecaApp:
         list_frame = ttk.Frame(overdue_frame)
         list_frame.pack(fill=tk.BOTH, expand=True)
         
-        columns = ('id', 'nome', 'email', 'cpf', 'qtd_atrasos')
+        columns = ('id', 'nome', 'email', 'cpf', 'qtd_atrasos', 'maior_atraso')
         self.overdue_tree = ttk.Treeview(
             list_frame,
             columns=columns,
@@ -1006,6 +1394,9 @@ class BibliotecaApp:
         self.overdue_tree.heading('qtd_atrasos', text='Qtd. Atrasos')
         self.overdue_tree.column('qtd_atrasos', width=100, anchor=tk.CENTER)
         
+        self.overdue_tree.heading('maior_atraso', text='Maior Atraso (dias)')
+        self.overdue_tree.column('maior_atraso', width=120, anchor=tk.CENTER)
+        
         # Barra de rolagem
         scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL, command=self.overdue_tree.yview)
         self.overdue_tree.configure(yscroll=scrollbar.set)
@@ -1021,32 +1412,197 @@ class BibliotecaApp:
         
         # Carregar dados
         self.load_overdue_users()
-        self.update_status("Lista de usuários com atraso carregada")
 
     def load_overdue_users(self):
         """Carrega os usuários com empréstimos em atraso."""
-        for item in self.overdue_tree.get_children():
-            self.overdue_tree.delete(item)
-        
-        with self.db._get_cursor() as cursor:
-            cursor.execute('''
-            SELECT u.id, u.nome, u.email, u.cpf, COUNT(e.id) as qtd_atrasos
-            FROM usuarios u
-            JOIN emprestimos e ON u.id = e.usuario_id
-            WHERE e.data_devolucao_real IS NULL 
-            AND e.data_devolucao_prevista < date('now')
-            GROUP BY u.id
-            ORDER BY qtd_atrasos DESC
-            ''')
+        def fetch():
+            return [
+                (row['id'], row['nome'], row['email'] or '', row['cpf'], row['qtd_atrasos'], row['maior_atraso'])
+                for row in self.db.listar_usuarios_em_atraso()
+            ]
+        
+        self.run_db(
+            fetch,
+            on_success=lambda rows: self.fill_tree(self.overdue_tree, rows, "Lista de usuários com atraso carregada"),
+            error_message="Erro ao carregar usuários com atraso"
+        )
+    def show_diagnostics(self):
+        """Abre a janela de diagnóstico com as estatísticas das consultas ao banco."""
+        if self.ajuda_menu.index(tk.END) == 0:
+            self.ajuda_menu.add_separator()
+            self.ajuda_menu.add_command(label="Diagnóstico", command=self.show_diagnostics)
+        
+        if self.diagnostics_window and self.diagnostics_window.winfo_exists():
+            self.diagnostics_window.lift()
+            return
+        
+        window = tk.Toplevel(self.root)
+        window.title("Diagnóstico do banco de dados")
+        window.geometry("900x600")
+        self.diagnostics_window = window
+        
+        frame = ttk.Frame(window, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        
+        summary = ttk.Label(frame, font=('Arial', 10), justify=tk.LEFT)
+        summary.pack(fill=tk.X, pady=(0, 10))
+        
+        # Consultas agregadas por nome
+        ttk.Label(
+            frame,
+            text="Consultas (por tempo total)",
+            font=('Arial', 10, 'bold'),
+            foreground=self.style.colors['primary']
+        ).pack(anchor=tk.W)
+        
+        columns = ('consulta', 'execucoes', 'total', 'media', 'maximo', 'linhas')
+        queries_tree = ttk.Treeview(frame, columns=columns, show='headings', height=10)
+        for column, text, width, anchor in (
+            ('consulta', 'Consulta', 280, tk.W),
+            ('execucoes', 'Execuções', 90, tk.E),
+            ('total', 'Total (ms)', 100, tk.E),
+            ('media', 'Média (ms)', 100, tk.E),
+            ('maximo', 'Máximo (ms)', 100, tk.E),
+            ('linhas', 'Linhas', 100, tk.E),
+        ):
+            queries_tree.heading(column, text=text)
+            queries_tree.column(column, width=width, anchor=anchor)
+        queries_tree.pack(fill=tk.BOTH, expand=True, pady=(0, 10))
+        
+        # Consultas lentas, com SQL e plano da selecionada
+        ttk.Label(
+            frame,
+            text="Consultas lentas",
+            font=('Arial', 10, 'bold'),
+            foreground=self.style.colors['primary']
+        ).pack(anchor=tk.W)
+        
+        columns = ('quando', 'consulta', 'tempo', 'linhas', 'espera')
+        slow_tree = ttk.Treeview(frame, columns=columns, show='headings', height=6)
+        for column, text, width, anchor in (
+            ('quando', 'Quando', 140, tk.CENTER),
+            ('consulta', 'Consulta', 280, tk.W),
+            ('tempo', 'Tempo (ms)', 100, tk.E),
+            ('linhas', 'Linhas', 100, tk.E),
+            ('espera', 'Espera conexão (ms)', 140, tk.E),
+        ):
+            slow_tree.heading(column, text=text)
+            slow_tree.column(column, width=width, anchor=anchor)
+        slow_tree.pack(fill=tk.BOTH, expand=True)
+        
+        detail = tk.Text(frame, height=6, font=('Courier', 9), wrap=tk.WORD, state=tk.DISABLED)
+        detail.pack(fill=tk.X, pady=(5, 10))
+        
+        slow_queries = []
+        
+        def show_detail(event=None):
+            selection = slow_tree.selection()
+            text = ''
+            if selection:
+                item = slow_queries[slow_tree.index(selection[0])]
+                text = item['sql'] + '\n\nPlano:\n' + '\n'.join(item['plano'] or ['-'])
+            detail.config(state=tk.NORMAL)
+            detail.delete('1.0', tk.END)
+            detail.insert('1.0', text)
+            detail.config(state=tk.DISABLED)
+        
+        slow_tree.bind('<<TreeviewSelect>>', show_detail)
+        
+        def collect():
+            return (
+                self.db.estatisticas_pool(),
+                self.db.estatisticas_espera(),
+                self.db.estatisticas_cache(),
+                self.db.estatisticas_consultas(),
+                self.db.consultas_lentas(),
+            )
+        
+        def refresh():
+            # Com DatabaseRemoto as estatísticas vêm do servidor: lidas no DBExecutor
+            if window.winfo_exists():
+                self.run_db(collect, on_success=render, error_message="Falha ao ler as estatísticas")
+        
+        def render(result):
+            if not window.winfo_exists():
+                return
+            pool, wait, cache, queries, slow = result
+            summary.config(text=(
+                f"Conexões: {pool['conexoes_abertas']} abertas, {pool['checkouts']} usos, "
+                f"reuso de {pool['taxa_reuso']:.0%}\n"
+                f"Espera por conexão: média {wait['tempo_medio'] * 1000:.2f} ms, "
+                f"máxima {wait['tempo_max'] * 1000:.1f} ms, {pool['esperas']} com o pool esgotado\n"
+                f"Cache: {cache['entradas']} entradas ({cache['bytes'] / 1024:.0f} KiB), "
+                f"{cache['taxa_acerto']:.0%} de acertos, {cache['despejos']} despejos, "
+                f"{cache['invalidadas']} invalidadas"
+            ))
+            
+            queries_tree.delete(*queries_tree.get_children())
+            for item in queries:
+                queries_tree.insert('', tk.END, values=(
+                    item['consulta'],
+                    item['execucoes'],
+                    f"{item['tempo_total'] * 1000:.1f}",
+                    f"{item['tempo_medio'] * 1000:.2f}",
+                    f"{item['tempo_max'] * 1000:.1f}",
+                    item['linhas'],
+                ))
             
-            for row in cursor.fetchall():
-                self.overdue_tree.insert('', tk.END, values=(
-                    row['id'],
-                    row['nome'],
-                    row['email'] or '',
-                    row['cpf'],
-                    row['qtd_atrasos']
+            selected = slow_tree.selection()
+            selected_index = slow_tree.index(selected[0]) if selected else None
+            slow_queries[:] = slow
+            slow_tree.delete(*slow_tree.get_children())
+            for item in slow_queries:
+                slow_tree.insert('', tk.END, values=(
+                    item['quando'].strftime('%d/%m %H:%M:%S'),
+                    item['consulta'],
+                    f"{item['tempo'] * 1000:.1f}",
+                    item['linhas'],
+                    f"{item['espera'] * 1000:.1f}",
                 ))
+            if selected_index is not None and selected_index < len(slow_queries):
+                slow_tree.selection_set(slow_tree.get_children()[selected_index])
+            
+            window.after(self.DIAGNOSTICS_REFRESH_MS, refresh)
+        
+        # Limite de consulta lenta e ações
+        controls = ttk.Frame(frame)
+        controls.pack(fill=tk.X)
+        
+        ttk.Label(controls, text="Registrar consultas acima de (ms):").pack(side=tk.LEFT)
+        threshold = tk.StringVar()
+        
+        def set_threshold(*args):
+            try:
+                segundos = max(int(threshold.get()), 0) / 1000
+            except ValueError:
+                return
+            self.run_db(
+                setattr, self.db, 'limite_consulta_lenta', segundos,
+                error_message="Falha ao alterar o limite de consulta lenta"
+            )
+        
+        def show_threshold(segundos):
+            if window.winfo_exists():
+                threshold.set(str(int(segundos * 1000)))
+                threshold.trace_add('write', set_threshold)
+        
+        self.run_db(
+            getattr, self.db, 'limite_consulta_lenta', on_success=show_threshold,
+            error_message="Falha ao ler o limite de consulta lenta"
+        )
+        ttk.Spinbox(controls, from_=0, to=60000, increment=50, width=8, textvariable=threshold).pack(side=tk.LEFT, padx=5)
+        
+        def reset():
+            self.run_db(
+                self.db.limpar_estatisticas, on_success=lambda _: show_detail(),
+                error_message="Falha ao zerar as estatísticas"
+            )
+        
+        ttk.Button(controls, text="Fechar", command=window.destroy).pack(side=tk.RIGHT)
+        ttk.Button(controls, text="Zerar", command=reset).pack(side=tk.RIGHT, padx=5)
+        
+        refresh()
+    
     def show_about(self):
         """Exibe a janela 'Sobre' com informações do sistema."""
         self.clear_main_frame()
@@ -1,17 +1,17 @@
+import time
+INICIO = time.perf_counter()  # referência de --profile-startup, antes das demais importações
+
+import argparse
 import tkinter as tk
 from interface import BibliotecaApp
 import logging
 import sys
 from datetime import datetime
+from registro import configurar_do_ambiente
 
 def configure_logging():
-    """Configura o sistema de logging."""
-    logging.basicConfig(
-        filename='biblioteca.log',
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        encoding='utf-8'
-    )
+    """Configura o log em biblioteca.log, gravado fora das threads da aplicação."""
+    configurar_do_ambiente('biblioteca.log')
 
 def handle_exception(exc_type, exc_value, exc_traceback):
     """Handler para exceções não capturadas."""
@@ -25,7 +25,27 @@ def handle_exception(exc_type, exc_value, exc_traceback):
         "Detalhes foram registrados no arquivo de log."
     )
 
-def main():
+def report_startup(etapas):
+    """Exibe (e registra no log) o tempo de cada etapa até a primeira tela desenhada."""
+    anterior = INICIO
+    for nome, instante in etapas:
+        print(f"{nome:<16} {(instante - anterior) * 1000:7.1f} ms", file=sys.stderr)
+        anterior = instante
+    total = (etapas[-1][1] - INICIO) * 1000
+    print(f"{'total':<16} {total:7.1f} ms", file=sys.stderr)
+    logging.info("Inicialização: %s; total %.1f ms", ", ".join(
+        f"{nome} {(instante - INICIO) * 1000:.1f} ms" for nome, instante in etapas
+    ), total)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sistema de Biblioteca")
+    parser.add_argument('--profile-startup', action='store_true',
+                        help="mede o tempo até a primeira tela ser desenhada e encerra")
+    parser.add_argument('--servidor', metavar='URL',
+                        help="usa o acervo de um servidor.py (ex.: http://127.0.0.1:8765) em vez do banco local")
+    args = parser.parse_args(argv)
+    etapas = [('importações', time.perf_counter())]
+    
     # Configurações iniciais
     configure_logging()
     sys.excepthook = handle_exception
@@ -34,12 +54,39 @@ def main():
     
     # Criar e configurar janela principal
     root = tk.Tk()
-    app = BibliotecaApp(root)
+    etapas.append(('janela', time.perf_counter()))
+    db = None
+    if args.servidor:
+        from cliente import DatabaseRemoto
+        db = DatabaseRemoto(args.servidor)
+        logging.info("Usando o servidor %s", args.servidor)
+    app = BibliotecaApp(root, db=db)
+    etapas.append(('aplicação', time.perf_counter()))
+    
+    if args.profile_startup:
+        def first_frame(event):
+            if len(etapas) > 3:
+                return
+            # Desenha o que ainda estiver pendente antes de medir
+            root.update_idletasks()
+            etapas.append(('primeiro quadro', time.perf_counter()))
+            report_startup(etapas)
+            app.close()
+            root.after(0, root.destroy)
+        
+        root.bind('<Expose>', first_frame, add=True)
     
     # Configurar para fechar corretamente
     def on_closing():
         if tk.messagebox.askokcancel("Sair", "Deseja realmente sair do sistema?"):
             logging.info("Aplicação encerrada pelo usuário")
+            logging.info("Estatísticas do pool de conexões: %s", app.db.estatisticas_pool())
+            for item in app.db.estatisticas_consultas()[:10]:
+                logging.info(
+                    "Consulta %s: %d execuções, %.3f s no total, %.2f ms em média",
+                    item['consulta'], item['execucoes'], item['tempo_total'], item['tempo_medio'] * 1000
+                )
+            app.close()
             root.destroy()
     
     root.protocol("WM_DELETE_WINDOW", on_closing)
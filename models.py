@@ -1,19 +1,33 @@
 import re
-from datetime import datetime, timedelta
-from typing import Optional
+from datetime import date, timedelta
+from typing import NamedTuple, Optional
 
 class Usuario:
+    # Colunas da tabela usuarios, na ordem de de_linha
+    # `versao` é incrementada a cada alteração do registro (ver Database.atualizar_usuario)
+    CAMPOS = ('id', 'nome', 'email', 'cpf', 'versao')
+    __slots__ = CAMPOS
+    
     def __init__(
         self, 
         id: Optional[int] = None, 
         nome: Optional[str] = None, 
         email: Optional[str] = None, 
-        cpf: Optional[str] = None
+        cpf: Optional[str] = None,
+        versao: Optional[int] = None
     ):
         self.id = id
         self.nome = nome
         self.email = email
         self.cpf = cpf
+        self.versao = versao
+    
+    @classmethod
+    def de_linha(cls, linha) -> 'Usuario':
+        """Cria o usuário a partir de uma tupla na ordem de CAMPOS, sem passar por __init__."""
+        usuario = cls.__new__(cls)
+        usuario.id, usuario.nome, usuario.email, usuario.cpf, usuario.versao = linha
+        return usuario
     
     def validar_cpf(self) -> bool:
         """Valida o CPF usando algoritmo de verificação."""
@@ -47,19 +61,34 @@ class Usuario:
         return f"Usuário {self.id}: {self.nome}"
 
 class Livro:
+    # Colunas da tabela livros, na ordem de de_linha
+    # `versao` é incrementada a cada alteração do registro, inclusive nas
+    # retiradas e devoluções de cópias (ver Database.atualizar_livro)
+    CAMPOS = ('id', 'titulo', 'autor', 'ano', 'copias_disponiveis', 'versao')
+    __slots__ = CAMPOS
+    
     def __init__(
         self, 
         id: Optional[int] = None, 
         titulo: Optional[str] = None, 
         autor: Optional[str] = None, 
         ano: Optional[int] = None, 
-        copias_disponiveis: Optional[int] = None
+        copias_disponiveis: Optional[int] = None,
+        versao: Optional[int] = None
     ):
         self.id = id
         self.titulo = titulo
         self.autor = autor
         self.ano = ano
         self.copias_disponiveis = copias_disponiveis or 0
+        self.versao = versao
+    
+    @classmethod
+    def de_linha(cls, linha) -> 'Livro':
+        """Cria o livro a partir de uma tupla na ordem de CAMPOS, sem passar por __init__."""
+        livro = cls.__new__(cls)
+        livro.id, livro.titulo, livro.autor, livro.ano, livro.copias_disponiveis, livro.versao = linha
+        return livro
     
     def disponivel(self) -> bool:
         return self.copias_disponiveis > 0
@@ -69,32 +98,58 @@ class Livro:
 
 class Emprestimo:
     PRAZO_DEVOLUCAO = 14  # dias
+    LIMITE_ATIVOS = 3  # empréstimos simultâneos por usuário
+    # Colunas da tabela emprestimos, na ordem de de_linha
+    CAMPOS = ('id', 'usuario_id', 'livro_id', 'data_emprestimo',
+              'data_devolucao_prevista', 'data_devolucao_real')
+    __slots__ = CAMPOS
     
     def __init__(
         self, 
         id: Optional[int] = None, 
         usuario_id: Optional[int] = None, 
         livro_id: Optional[int] = None, 
-        data_emprestimo: Optional[datetime] = None, 
-        data_devolucao_prevista: Optional[datetime] = None, 
-        data_devolucao_real: Optional[datetime] = None
+        data_emprestimo: Optional[date] = None, 
+        data_devolucao_prevista: Optional[date] = None, 
+        data_devolucao_real: Optional[date] = None
     ):
         self.id = id
         self.usuario_id = usuario_id  
         self.livro_id = livro_id    
-        self.data_emprestimo = data_emprestimo or datetime.now()
+        self.data_emprestimo = data_emprestimo or date.today()
         self.data_devolucao_prevista = data_devolucao_prevista or (
             self.data_emprestimo + timedelta(days=self.PRAZO_DEVOLUCAO)
         )
         self.data_devolucao_real = data_devolucao_real
     
-    def esta_atrasado(self) -> bool:
+    @classmethod
+    def de_linha(cls, linha) -> 'Emprestimo':
+        """Cria o empréstimo a partir de uma tupla na ordem de CAMPOS (datas já convertidas)."""
+        emprestimo = cls.__new__(cls)
+        (emprestimo.id, emprestimo.usuario_id, emprestimo.livro_id, emprestimo.data_emprestimo,
+         emprestimo.data_devolucao_prevista, emprestimo.data_devolucao_real) = linha
+        return emprestimo
+    
+    def esta_atrasado(self, hoje: Optional[date] = None) -> bool:
+        """`hoje` pode ser informado para avaliar vários empréstimos com a mesma data."""
         if self.data_devolucao_real:
             return self.data_devolucao_real > self.data_devolucao_prevista
-        return datetime.now() > self.data_devolucao_prevista
+        return (hoje or date.today()) > self.data_devolucao_prevista
     
     def __str__(self) -> str:
         status = "Devolvido" if self.data_devolucao_real else (
             "Atrasado" if self.esta_atrasado() else "Em prazo"
         )
-        return f"Empréstimo {self.id} - {status}"
\ No newline at end of file
+        return f"Empréstimo {self.id} - {status}"
+
+class EmprestimoAtivo(NamedTuple):
+    """Visão somente leitura de um empréstimo ativo com nome do usuário e título do livro."""
+    id: int
+    usuario_id: int
+    usuario_nome: Optional[str]
+    livro_id: int
+    livro_titulo: Optional[str]
+    data_emprestimo: date
+    data_devolucao_prevista: date
+    atrasado: bool
+    dias_atraso: int = 0  # na última apuração de atrasos
@@ -0,0 +1,116 @@
+"""Formato das mensagens entre servidor.py e cliente.py (HTTP/JSON).
+
+Uma chamada é um POST em /api/<operação> com {"args": [...], "kwargs": {...}};
+a resposta é {"resultado": ...} ou {"erro": {"tipo": ..., "args": [...]}}.
+Operações que devolvem um gerador (iterar_relatorio) respondem em partes
+(Transfer-Encoding: chunked), um JSON por linha.
+
+Tipos que o JSON não representa vão marcados e são reconstruídos do outro
+lado: datas, tuplas (chaves de paginação), modelos (Usuario, Livro,
+Emprestimo, EmprestimoAtivo, ResultadoItem) e exceções conhecidas.
+"""
+import json
+import sqlite3
+from datetime import date, datetime
+
+from database import ConflitoAtualizacao, EmprestimoNegado, ResultadoItem
+from models import Emprestimo, EmprestimoAtivo, Livro, Usuario
+
+# Métodos de Database acessíveis pela API. As leituras não alteram o banco e
+# podem ser repetidas pelo cliente se a conexão cair; as escritas, não.
+OPERACOES_LEITURA = frozenset({
+    'obter_usuario', 'listar_usuarios', 'buscar_usuarios', 'pagina_usuarios', 'contar_usuarios',
+    'obter_livro', 'listar_livros', 'buscar_livros', 'pagina_livros', 'contar_livros',
+    'validar_emprestimo', 'obter_emprestimo', 'listar_emprestimos_ativos',
+    'listar_emprestimos_detalhados', 'pagina_emprestimos_ativos',
+    'pagina_emprestimos_detalhados', 'contar_emprestimos_ativos',
+    'listar_usuarios_em_atraso', 'contar_relatorio', 'iterar_relatorio', 'verificar_indices',
+    'estatisticas_pool', 'estatisticas_consultas', 'estatisticas_espera',
+    'consultas_lentas', 'estatisticas_cache',
+})
+OPERACOES_ESCRITA = frozenset({
+    'criar_usuario', 'atualizar_usuario', 'remover_usuario', 'inserir_usuarios_lote',
+    'criar_livro', 'atualizar_livro', 'remover_livro', 'inserir_livros_lote',
+    'criar_emprestimo', 'emprestar_lote', 'devolver_lote', 'finalizar_emprestimo',
+    'apurar_atrasos', 'verificar_contadores', 'limpar_estatisticas',
+})
+OPERACOES = OPERACOES_LEITURA | OPERACOES_ESCRITA
+
+# Operações cujo resultado é um gerador, enviado em partes
+OPERACOES_EM_PARTES = frozenset({'iterar_relatorio'})
+
+MODELOS = {cls.__name__: cls for cls in (Usuario, Livro, Emprestimo, EmprestimoAtivo, ResultadoItem)}
+
+# Exceções recriadas no cliente: classe e atributos passados ao construtor
+ERROS = {
+    'ConflitoAtualizacao': (ConflitoAtualizacao, ('tabela', 'registro_id', 'versao_esperada', 'versao_atual')),
+    'EmprestimoNegado': (EmprestimoNegado, ('motivo',)),
+    'ValueError': (ValueError, None),
+    'IntegrityError': (sqlite3.IntegrityError, None),
+    'OperationalError': (sqlite3.OperationalError, None),
+}
+
+class ErroRemoto(Exception):
+    """Erro do servidor sem equivalente local (ou falha do próprio protocolo)."""
+
+    def __init__(self, tipo: str, mensagem: str, status: int = 500):
+        self.tipo = tipo
+        self.status = status
+        super().__init__(f"{tipo}: {mensagem}")
+
+def _marcar(valor):
+    if isinstance(valor, datetime):
+        return {'$datahora': valor.isoformat()}
+    if isinstance(valor, date):
+        return {'$data': valor.isoformat()}
+    nome = type(valor).__name__
+    if nome in MODELOS and isinstance(valor, MODELOS[nome]):
+        campos = valor if isinstance(valor, tuple) else [getattr(valor, c) for c in valor.CAMPOS]
+        return {'$modelo': nome, 'campos': [_marcar(v) for v in campos]}
+    if isinstance(valor, tuple):
+        return {'$tupla': [_marcar(v) for v in valor]}
+    if isinstance(valor, list):
+        return [_marcar(v) for v in valor]
+    if isinstance(valor, dict):
+        return {k: _marcar(v) for k, v in valor.items()}
+    if isinstance(valor, sqlite3.Row):
+        return {k: _marcar(valor[k]) for k in valor.keys()}
+    return valor
+
+def _desmarcar(objeto: dict):
+    if '$data' in objeto:
+        return date.fromisoformat(objeto['$data'])
+    if '$datahora' in objeto:
+        return datetime.fromisoformat(objeto['$datahora'])
+    if '$tupla' in objeto:
+        return tuple(objeto['$tupla'])
+    if '$modelo' in objeto:
+        cls = MODELOS.get(objeto['$modelo'])
+        if cls is None or not isinstance(objeto.get('campos'), list):
+            raise ValueError(f"Modelo desconhecido ou sem campos: {objeto['$modelo']!r}")
+        if hasattr(cls, 'de_linha'):
+            return cls.de_linha(tuple(objeto['campos']))
+        return cls(*objeto['campos'])
+    return objeto
+
+def codificar(mensagem) -> bytes:
+    return json.dumps(_marcar(mensagem), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def decodificar(dados: bytes):
+    """Mensagem recebida; ValueError (ou TypeError) se o JSON ou as marcações forem inválidos."""
+    return json.loads(dados, object_hook=_desmarcar)
+
+def codificar_erro(exc: BaseException) -> dict:
+    tipo = type(exc).__name__
+    cls, atributos = ERROS.get(tipo, (None, None))
+    if atributos:
+        args = [getattr(exc, a) for a in atributos]
+    else:
+        args = [str(exc)]
+    return {'tipo': tipo, 'args': args}
+
+def decodificar_erro(erro: dict, status: int = 500) -> Exception:
+    cls, _ = ERROS.get(erro['tipo'], (None, None))
+    if cls is None:
+        return ErroRemoto(erro['tipo'], ' '.join(map(str, erro.get('args', []))), status)
+    return cls(*erro['args'])
@@ -0,0 +1,133 @@
+"""Configuração do log da aplicação.
+
+Os registros são apenas enfileirados na thread que os emite (Tk, banco,
+importação); uma thread à parte (QueueListener) formata e grava no arquivo,
+com rotação por tamanho ou diária e saída opcional em JSON Lines.
+
+Variáveis de ambiente lidas por `configurar_do_ambiente`:
+
+    BIBLIOTECA_LOG_NIVEL   nível geral (padrão: INFO)
+    BIBLIOTECA_LOG_NIVEIS  níveis por módulo, ex.: "database=DEBUG,importador=WARNING"
+    BIBLIOTECA_LOG_JSON    1 para gravar um objeto JSON por linha
+    BIBLIOTECA_LOG_ROTACAO "tamanho" (padrão) ou "diaria"
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+from datetime import datetime
+from typing import Dict, Optional
+
+FORMATO = '%(asctime)s - %(levelname)s - %(name)s - %(message)s'
+# Rotação por tamanho: 5 MiB por arquivo
+TAMANHO_MAXIMO = 5 * 1024 * 1024
+# Arquivos antigos mantidos (biblioteca.log.1, ... ou um por dia)
+ARQUIVOS_ANTIGOS = 5
+ROTACOES = ('tamanho', 'diaria')
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por registro, com os campos usados para filtrar o log."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        dados = {
+            'quando': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'nivel': record.levelname,
+            'modulo': record.name,
+            'thread': record.threadName,
+            'mensagem': record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            dados['excecao'] = record.exc_text
+        return json.dumps(dados, ensure_ascii=False)
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enfileira o registro já com a mensagem e o traceback resolvidos.
+
+    O QueueHandler padrão formata a linha inteira antes de enfileirar; aqui só
+    se resolvem os argumentos e a exceção (que não podem esperar a outra
+    thread), e o formatador do arquivo (texto ou JSON) monta a linha depois.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+def niveis_de_texto(texto: str) -> Dict[str, str]:
+    """Converte "modulo=NIVEL,outro=NIVEL" em dicionário."""
+    niveis = {}
+    for item in texto.split(','):
+        if '=' in item:
+            modulo, nivel = item.split('=', 1)
+            niveis[modulo.strip()] = nivel.strip().upper()
+    return niveis
+
+def configurar_registro(arquivo: str = 'biblioteca.log', nivel: str = 'INFO',
+                        niveis: Optional[Dict[str, str]] = None, formato_json: bool = False,
+                        rotacao: str = 'tamanho', tamanho_maximo: int = TAMANHO_MAXIMO,
+                        arquivos_antigos: int = ARQUIVOS_ANTIGOS) -> logging.handlers.QueueListener:
+    """Direciona o logger raiz para a fila e inicia a thread que grava o arquivo.
+
+    `niveis` ajusta loggers específicos (por nome de módulo). A thread é
+    encerrada, descarregando a fila, por `encerrar_registro` ou ao sair.
+    """
+    global _listener
+    if rotacao not in ROTACOES:
+        raise ValueError(f"Rotação de log desconhecida: {rotacao}")
+    encerrar_registro()
+
+    if rotacao == 'diaria':
+        destino = logging.handlers.TimedRotatingFileHandler(
+            arquivo, when='midnight', backupCount=arquivos_antigos, encoding='utf-8'
+        )
+    else:
+        destino = logging.handlers.RotatingFileHandler(
+            arquivo, maxBytes=tamanho_maximo, backupCount=arquivos_antigos, encoding='utf-8'
+        )
+    destino.setFormatter(FormatadorJSON() if formato_json else logging.Formatter(FORMATO))
+
+    fila = queue.SimpleQueue()
+    raiz = logging.getLogger()
+    for handler in raiz.handlers[:]:
+        raiz.removeHandler(handler)
+        handler.close()
+    raiz.addHandler(_QueueHandler(fila))
+    raiz.setLevel(nivel.upper())
+    for modulo, nivel_modulo in (niveis or {}).items():
+        logging.getLogger(modulo).setLevel(nivel_modulo.upper())
+
+    _listener = logging.handlers.QueueListener(fila, destino, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def configurar_do_ambiente(arquivo: str = 'biblioteca.log') -> logging.handlers.QueueListener:
+    """configurar_registro com as opções das variáveis BIBLIOTECA_LOG_*."""
+    return configurar_registro(
+        arquivo,
+        nivel=os.environ.get('BIBLIOTECA_LOG_NIVEL', 'INFO'),
+        niveis=niveis_de_texto(os.environ.get('BIBLIOTECA_LOG_NIVEIS', '')),
+        formato_json=os.environ.get('BIBLIOTECA_LOG_JSON', '') not in ('', '0'),
+        rotacao=os.environ.get('BIBLIOTECA_LOG_ROTACAO', 'tamanho'),
+    )
+
+def encerrar_registro():
+    """Grava o que ainda está na fila e fecha o arquivo de log."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+
+atexit.register(encerrar_registro)
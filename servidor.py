@@ -0,0 +1,306 @@
+"""Servidor da biblioteca, sem interface gráfica, com API HTTP/JSON local.
+
+Permite que vários balcões de atendimento e terminais de autoatendimento
+compartilhem o mesmo acervo: cada um roda `python main.py --servidor URL`
+(ou usa cliente.DatabaseRemoto) em vez de abrir o arquivo do banco.
+
+Uso: python servidor.py [--host 127.0.0.1] [--porta 8765] [--banco biblioteca.db]
+                        [--leitores 8] [--max-pendentes 256]
+
+As conexões HTTP são atendidas por um laço asyncio e as operações vão para
+um AsyncDatabase (database_async.py): escritas numa thread escritora,
+leituras em --leitores threads. Acima de --max-pendentes operações em
+andamento o servidor responde 503 com Retry-After, em vez de acumular uma
+fila sem limite. O formato das mensagens está em protocolo.py; GET /saude
+devolve os contadores do servidor.
+
+Como a interface gráfica, o servidor apura os atrasos (apurar_atrasos) ao
+iniciar e depois a cada hora, para que os clientes vejam a situação do dia
+sem depender de atrasos.py no cron.
+
+Não há autenticação: por padrão o servidor só escuta em 127.0.0.1.
+"""
+import argparse
+import asyncio
+import logging
+import signal
+import sys
+from http import HTTPStatus
+from typing import Optional
+
+from cache import DatabaseComCache
+from database_async import AsyncDatabase
+from protocolo import OPERACOES, OPERACOES_EM_PARTES, codificar, codificar_erro, decodificar
+from registro import configurar_do_ambiente
+
+logger = logging.getLogger(__name__)
+
+HOST_PADRAO = '127.0.0.1'
+PORTA_PADRAO = 8765
+LEITORES = 8  # threads (e conexões) de leitura do AsyncDatabase
+MAX_PENDENTES = 256  # operações em andamento antes de recusar com 503
+TAMANHO_MAXIMO_CORPO = 16 * 1024 * 1024  # lotes de importação cabem com folga
+TEMPO_OCIOSO = 60.0  # segundos até fechar uma conexão keep-alive parada
+INTERVALO_ATRASOS = 60 * 60  # segundos entre apurações de atraso (só muda ao virar o dia)
+
+# Status HTTP das exceções esperadas; as demais são 500 e vão para o log
+STATUS_ERROS = {
+    'ConflitoAtualizacao': 409,
+    'IntegrityError': 409,
+    'EmprestimoNegado': 422,
+    'ValueError': 422,
+    'TypeError': 400,
+    'OperationalError': 503,
+}
+
+class _ErroRequisicao(Exception):
+    """Requisição HTTP malformada; a conexão é encerrada após a resposta."""
+
+    def __init__(self, status: int, mensagem: str):
+        self.status = status
+        super().__init__(mensagem)
+
+class ServidorBiblioteca:
+    """Expõe as operações de um AsyncDatabase (ver protocolo.OPERACOES) por HTTP/JSON."""
+
+    def __init__(self, db: AsyncDatabase, leitores: int = LEITORES, max_pendentes: int = MAX_PENDENTES):
+        self.db = db
+        self.leitores = leitores
+        self.max_pendentes = max_pendentes
+        self._servidor: Optional[asyncio.AbstractServer] = None
+        self._apuracao: Optional[asyncio.Task] = None
+        self._pendentes = 0
+        # Respostas em partes reservam uma conexão do pool até terminar
+        self._em_partes = 0
+        self._stats = {'requisicoes': 0, 'recusadas': 0, 'erros': 0, 'conexoes': 0}
+
+    def estatisticas(self) -> dict:
+        return dict(self._stats, pendentes=self._pendentes, em_partes=self._em_partes,
+                    leitores=self.leitores, max_pendentes=self.max_pendentes)
+
+    async def limite_consulta_lenta(self, segundos: Optional[float] = None) -> float:
+        """Lê (ou altera, se `segundos` for informado) o limite de consulta lenta do banco."""
+        if segundos is not None:
+            self.db.db.limite_consulta_lenta = max(float(segundos), 0.0)
+        return self.db.db.limite_consulta_lenta
+
+    def _operacao(self, nome: str):
+        if nome in OPERACOES:
+            return getattr(self.db, nome)
+        if nome == 'limite_consulta_lenta':
+            return self.limite_consulta_lenta
+        return None
+
+    async def iniciar(self, host: str = HOST_PADRAO, porta: int = PORTA_PADRAO) -> asyncio.AbstractServer:
+        self._apuracao = asyncio.ensure_future(self._apurar_atrasos())
+        self._servidor = await asyncio.start_server(self._atender, host, porta)
+        return self._servidor
+
+    async def _apurar_atrasos(self):
+        """Apura os atrasos agora e a cada INTERVALO_ATRASOS, até o servidor fechar."""
+        while True:
+            try:
+                await self.db.apurar_atrasos()
+            except Exception:
+                logger.exception("Falha ao apurar atrasos")
+            await asyncio.sleep(INTERVALO_ATRASOS)
+
+    async def executar(self, host: str = HOST_PADRAO, porta: int = PORTA_PADRAO):
+        """Atende até ser cancelado (Ctrl+C ou SIGTERM) e então fecha o banco."""
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+        except (NotImplementedError, AttributeError):
+            pass  # Windows: só Ctrl+C
+        servidor = await self.iniciar(host, porta)
+        enderecos = ', '.join(f"http://{s.getsockname()[0]}:{s.getsockname()[1]}" for s in servidor.sockets)
+        logger.info("Servidor escutando em %s (%d leitores)", enderecos, self.leitores)
+        print(f"Servidor da biblioteca em {enderecos} (Ctrl+C para encerrar)", file=sys.stderr)
+        try:
+            async with servidor:
+                await servidor.serve_forever()
+        finally:
+            await self.fechar()
+
+    async def fechar(self):
+        if self._apuracao is not None:
+            self._apuracao.cancel()
+            try:
+                await self._apuracao
+            except asyncio.CancelledError:
+                pass
+            self._apuracao = None
+        if self._servidor is not None:
+            self._servidor.close()
+            await self._servidor.wait_closed()
+            self._servidor = None
+        await self.db.fechar()
+        logger.info("Servidor encerrado: %s", self.estatisticas())
+
+    # HTTP
+    async def _atender(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._stats['conexoes'] += 1
+        try:
+            while True:
+                try:
+                    requisicao = await asyncio.wait_for(self._ler_requisicao(reader), TEMPO_OCIOSO)
+                except asyncio.TimeoutError:
+                    break
+                except _ErroRequisicao as e:
+                    await self._responder(writer, e.status, {'erro': {'tipo': 'RequisicaoInvalida', 'args': [str(e)]}}, False)
+                    break
+                if requisicao is None:
+                    break
+                metodo, caminho, manter, corpo = requisicao
+                await self._processar(writer, metodo, caminho, corpo, manter)
+                if not manter:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _ler_requisicao(self, reader: asyncio.StreamReader):
+        """(método, caminho, keep-alive, corpo) da próxima requisição; None se o cliente fechou."""
+        linha = await reader.readline()
+        if not linha:
+            return None
+        try:
+            metodo, caminho, versao = linha.decode('latin-1').split()
+        except ValueError:
+            raise _ErroRequisicao(400, "Linha de requisição inválida")
+
+        cabecalhos = {}
+        while True:
+            linha = await reader.readline()
+            if linha in (b'\r\n', b'\n', b''):
+                break
+            nome, _, valor = linha.decode('latin-1').partition(':')
+            cabecalhos[nome.strip().lower()] = valor.strip().lower()
+
+        try:
+            tamanho = int(cabecalhos.get('content-length', 0))
+        except ValueError:
+            raise _ErroRequisicao(400, "Content-Length inválido")
+        if tamanho > TAMANHO_MAXIMO_CORPO:
+            raise _ErroRequisicao(413, "Corpo da requisição grande demais")
+        corpo = await reader.readexactly(tamanho) if tamanho else b''
+
+        conexao = cabecalhos.get('connection', '')
+        manter = conexao == 'keep-alive' if versao == 'HTTP/1.0' else conexao != 'close'
+        return metodo, caminho, manter, corpo
+
+    async def _processar(self, writer, metodo: str, caminho: str, corpo: bytes, manter: bool):
+        self._stats['requisicoes'] += 1
+        if metodo == 'GET' and caminho == '/saude':
+            await self._responder(writer, 200, {'resultado': self.estatisticas()}, manter)
+            return
+
+        nome = caminho[len('/api/'):] if caminho.startswith('/api/') else None
+        func = self._operacao(nome) if nome and metodo == 'POST' else None
+        if func is None:
+            await self._responder(writer, 404, {'erro': {'tipo': 'OperacaoDesconhecida', 'args': [f"{metodo} {caminho}"]}}, manter)
+            return
+
+        em_partes = nome in OPERACOES_EM_PARTES
+        if self._pendentes >= self.max_pendentes or (em_partes and self._em_partes >= self.leitores):
+            self._stats['recusadas'] += 1
+            await self._responder(writer, 503, {'erro': {'tipo': 'ServidorOcupado', 'args': [
+                f"{self._pendentes} operações em andamento"
+            ]}}, manter, {'Retry-After': '1'})
+            return
+
+        try:
+            chamada = decodificar(corpo) if corpo else {}
+            args, kwargs = list(chamada.get('args', [])), dict(chamada.get('kwargs', {}))
+        except (ValueError, TypeError, AttributeError, KeyError) as e:
+            await self._responder(writer, 400, {'erro': {'tipo': 'RequisicaoInvalida', 'args': [str(e)]}}, manter)
+            return
+
+        self._pendentes += 1
+        self._em_partes += em_partes
+        try:
+            try:
+                # Operações em partes devolvem um gerador assíncrono, lido ao responder
+                resultado = func(*args, **kwargs) if em_partes else await func(*args, **kwargs)
+            except Exception as exc:
+                await self._responder_erro(writer, nome, exc, manter)
+                return
+            if em_partes:
+                await self._responder_em_partes(writer, resultado, manter)
+            else:
+                await self._responder(writer, 200, {'resultado': resultado}, manter)
+        finally:
+            self._pendentes -= 1
+            self._em_partes -= em_partes
+
+    async def _responder_erro(self, writer, nome: str, exc: Exception, manter: bool):
+        status = STATUS_ERROS.get(type(exc).__name__, 500)
+        if status == 500:
+            self._stats['erros'] += 1
+            logger.error("Erro em %s", nome, exc_info=exc)
+        await self._responder(writer, status, {'erro': codificar_erro(exc)}, manter)
+
+    @staticmethod
+    def _cabecalhos(status: int, manter: bool, extras: Optional[dict] = None) -> list:
+        linhas = [
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+            "Content-Type: application/json; charset=utf-8",
+            f"Connection: {'keep-alive' if manter else 'close'}",
+        ]
+        linhas += [f"{nome}: {valor}" for nome, valor in (extras or {}).items()]
+        return linhas
+
+    async def _responder(self, writer, status: int, mensagem, manter: bool, extras: Optional[dict] = None):
+        corpo = codificar(mensagem)
+        cabecalhos = self._cabecalhos(status, manter, extras) + [f"Content-Length: {len(corpo)}"]
+        writer.write(('\r\n'.join(cabecalhos) + '\r\n\r\n').encode('latin-1') + corpo)
+        await writer.drain()
+
+    async def _responder_em_partes(self, writer, gerador, manter: bool):
+        """Envia cada item do gerador assíncrono como uma linha JSON, num bloco chunked.
+
+        drain() segura a leitura do item seguinte enquanto o cliente não
+        consome os anteriores. Um erro no meio vira uma linha {"erro": ...} e
+        encerra a resposta.
+        """
+        cabecalhos = self._cabecalhos(200, manter) + ["Transfer-Encoding: chunked"]
+        writer.write(('\r\n'.join(cabecalhos) + '\r\n\r\n').encode('latin-1'))
+        try:
+            async for item in gerador:
+                parte = codificar({'resultado': item}) + b'\n'
+                writer.write(b'%x\r\n%s\r\n' % (len(parte), parte))
+                await writer.drain()
+        except Exception as exc:
+            if isinstance(exc, ConnectionError):
+                raise
+            logger.error("Erro ao enviar resposta em partes", exc_info=exc)
+            parte = codificar({'erro': codificar_erro(exc)}) + b'\n'
+            writer.write(b'%x\r\n%s\r\n' % (len(parte), parte))
+        finally:
+            # Libera a conexão do pool mesmo se o cliente desconectou no meio
+            await gerador.aclose()
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Servidor HTTP/JSON da biblioteca (sem interface gráfica).")
+    parser.add_argument('--host', default=HOST_PADRAO, help="endereço de escuta (padrão: somente local)")
+    parser.add_argument('--porta', type=int, default=PORTA_PADRAO)
+    parser.add_argument('--banco', default='biblioteca.db', help="arquivo do banco SQLite")
+    parser.add_argument('--leitores', type=int, default=LEITORES,
+                        help="threads de leitura (as escritas rodam numa thread própria)")
+    parser.add_argument('--max-pendentes', type=int, default=MAX_PENDENTES,
+                        help="operações em andamento antes de responder 503")
+    args = parser.parse_args(argv)
+
+    configurar_do_ambiente('servidor.log')
+    db = AsyncDatabase(args.banco, leitores=args.leitores, perfil='server', classe=DatabaseComCache)
+    servidor = ServidorBiblioteca(db, args.leitores, args.max_pendentes)
+    try:
+        asyncio.run(servidor.executar(args.host, args.porta))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,25 @@
+"""Versão curta de benchmarks/concorrencia.py: vários processos no mesmo banco.
+
+Empréstimos, devoluções e edições concorrentes não podem deixar cópias
+divergentes, cópias negativas, contadores errados nem devoluções duplicadas.
+
+Uso: python -m unittest tests.test_concorrencia
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.concorrencia import estressar
+
+class ConcorrenciaTest(unittest.TestCase):
+    def test_copias_e_contadores_consistentes(self):
+        conta, problemas = estressar(processos=4, segundos=1.5, usuarios=500, livros=10, copias=2)
+        self.assertEqual(problemas, [])
+        # As três operações precisam ter de fato concorrido
+        for operacao in ('emprestimos', 'devolucoes', 'edicoes'):
+            self.assertGreater(conta[operacao], 0, operacao)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+"""As consultas críticas (CONSULTAS_CRITICAS) usam índices num banco recém-criado.
+
+Uso: python -m unittest tests.test_indices
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import CONSULTAS_CRITICAS, Database
+
+class IndicesTest(unittest.TestCase):
+    def test_consultas_criticas_sem_varredura_completa(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            db = Database(os.path.join(pasta, 'indices.db'))
+            try:
+                resultado = db.verificar_indices()
+            finally:
+                db.fechar()
+
+        self.assertEqual(set(resultado), set(CONSULTAS_CRITICAS))
+        for nome, (usa_indice, plano) in resultado.items():
+            with self.subTest(consulta=nome):
+                self.assertTrue(usa_indice, f"{nome} varre a tabela inteira: {'; '.join(plano)}")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""Atualizações por compare-and-swap: uma versão desatualizada não sobrescreve o registro.
+
+Uso: python -m unittest discover tests (ou python -m pytest tests)
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import ConflitoAtualizacao, Database
+from models import Livro, Usuario
+
+class VersionamentoTest(unittest.TestCase):
+    def setUp(self):
+        self.pasta = tempfile.TemporaryDirectory()
+        arquivo = os.path.join(self.pasta.name, 'versoes.db')
+        # Duas instâncias no mesmo arquivo, como dois balcões de atendimento
+        self.db_a = Database(arquivo)
+        self.db_b = Database(arquivo)
+
+    def tearDown(self):
+        self.db_a.fechar()
+        self.db_b.fechar()
+        self.pasta.cleanup()
+
+    def test_livro_com_versao_antiga_levanta_conflito(self):
+        livro_id = self.db_a.criar_livro(Livro(titulo="Dom Casmurro", autor="Machado de Assis", copias_disponiveis=2))
+        livro_a = self.db_a.obter_livro(livro_id)
+        livro_b = self.db_b.obter_livro(livro_id)
+        self.assertEqual(livro_a.versao, livro_b.versao)
+
+        livro_a.titulo = "Dom Casmurro (edição revista)"
+        self.assertTrue(self.db_a.atualizar_livro(livro_a))
+
+        livro_b.copias_disponiveis = 10
+        with self.assertRaises(ConflitoAtualizacao) as erro:
+            self.db_b.atualizar_livro(livro_b)
+        self.assertEqual(erro.exception.tabela, 'livros')
+        self.assertEqual(erro.exception.versao_esperada, livro_b.versao)
+        self.assertEqual(erro.exception.versao_atual, livro_a.versao)
+
+        gravado = self.db_b.obter_livro(livro_id)
+        self.assertEqual(gravado.titulo, "Dom Casmurro (edição revista)")
+        self.assertEqual(gravado.copias_disponiveis, 2)
+        self.assertEqual(gravado.versao, livro_a.versao)
+
+    def test_usuario_com_versao_antiga_levanta_conflito(self):
+        usuario_id = self.db_a.criar_usuario(Usuario(nome="Ana", email="ana@exemplo.com", cpf="52998224725"))
+        usuario_a = self.db_a.obter_usuario(usuario_id)
+        usuario_b = self.db_b.obter_usuario(usuario_id)
+
+        usuario_a.email = "ana.souza@exemplo.com"
+        self.assertTrue(self.db_a.atualizar_usuario(usuario_a))
+
+        usuario_b.nome = "Ana Souza"
+        with self.assertRaises(ConflitoAtualizacao):
+            self.db_b.atualizar_usuario(usuario_b)
+
+        gravado = self.db_b.obter_usuario(usuario_id)
+        self.assertEqual((gravado.nome, gravado.email), ("Ana", "ana.souza@exemplo.com"))
+        self.assertEqual(gravado.versao, usuario_a.versao)
+
+    def test_versao_relida_grava(self):
+        livro_id = self.db_a.criar_livro(Livro(titulo="Iracema", autor="José de Alencar", copias_disponiveis=1))
+        livro_a = self.db_a.obter_livro(livro_id)
+        livro_b = self.db_b.obter_livro(livro_id)
+        self.assertTrue(self.db_a.atualizar_livro(livro_a))
+        with self.assertRaises(ConflitoAtualizacao):
+            self.db_b.atualizar_livro(livro_b)
+
+        # Após reler, como faz a tela de edição ao receber o conflito
+        livro_b = self.db_b.obter_livro(livro_id)
+        livro_b.ano = 1865
+        self.assertTrue(self.db_b.atualizar_livro(livro_b))
+        self.assertEqual(self.db_a.obter_livro(livro_id).ano, 1865)
+
+    def test_registro_inexistente_nao_e_conflito(self):
+        self.assertFalse(self.db_a.atualizar_livro(Livro(id=999, titulo="X", autor="Y", copias_disponiveis=1, versao=1)))
+
+if __name__ == "__main__":
+    unittest.main()
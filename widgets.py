@@ -0,0 +1,392 @@
+import tkinter as tk
+from tkinter import ttk
+
+
+class VirtualTreeview(ttk.Frame):
+    """Treeview que materializa apenas as linhas visíveis.
+
+    As linhas vêm de `fetch(limit, after=None, before=None, offset=0)`, que
+    devolve uma lista de pares (chave, valores) ordenada pela chave. A rolagem
+    linha a linha ou página a página busca apenas as linhas novas a partir da
+    chave da primeira/última linha exibida (keyset); saltos pela barra de
+    rolagem usam `offset`. `count()` informa o total de linhas para
+    dimensionar a barra.
+
+    Se `run(func, on_success, on_error)` for informado, todas as buscas (carga
+    inicial, rolagem, saltos e redimensionamento) rodam por ele (por exemplo,
+    no DBExecutor), fora do loop do Tk. Cada busca recebe um número de pedido e
+    respostas de pedidos já substituídos são descartadas; rolagens feitas
+    enquanto uma busca está em andamento se acumulam e são aplicadas quando
+    ela termina, com sucesso ou com erro.
+    """
+
+    HEADING_HEIGHT = 30
+
+    def __init__(self, parent, columns, fetch, count, selectmode='browse', run=None):
+        super().__init__(parent)
+        self.fetch = fetch
+        self.count = count
+        self.run = run
+
+        self.tree = ttk.Treeview(
+            self,
+            columns=columns,
+            show='headings',
+            selectmode=selectmode,
+            height=1
+        )
+        self.scrollbar = ttk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self._rows = []  # pares (chave, valores) exibidos
+        self._offset = 0
+        self._total = 0
+        self._visible = 1
+        self._selected = {}  # chave -> valores, inclusive de linhas fora da tela
+        self._seq = 0  # número do último pedido de busca
+        self._busy = False
+        self._pending_scroll = 0  # rolagem pedida durante uma busca
+        self._pending_fit = False  # redimensionamento durante uma busca
+
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select, add=True)
+        self.tree.bind('<MouseWheel>', self._on_mousewheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_event(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_event(3))
+        self.tree.bind('<Up>', lambda e: self._on_arrow(-1))
+        self.tree.bind('<Down>', lambda e: self._on_arrow(1))
+        self.tree.bind('<Prior>', lambda e: self._scroll_event(-self._visible))
+        self.tree.bind('<Next>', lambda e: self._scroll_event(self._visible))
+        self.tree.bind('<Home>', lambda e: self._jump(0))
+        self.tree.bind('<End>', lambda e: self._jump(self._total))
+
+    # Interface de Treeview usada pelas telas
+    def heading(self, column, **kw):
+        return self.tree.heading(column, **kw)
+
+    def column(self, column, **kw):
+        return self.tree.column(column, **kw)
+
+    def selection(self):
+        return self.tree.selection()
+
+    def item(self, item, option=None, **kw):
+        return self.tree.item(item, option, **kw)
+
+    def selected_values(self):
+        """Valores de todas as linhas selecionadas, visíveis ou não."""
+        return list(self._selected.values())
+
+    def clear_selection(self):
+        """Desfaz a seleção, inclusive a de linhas fora da tela."""
+        self._selected.clear()
+        if self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+    def set_source(self, fetch, count):
+        """Troca a origem dos dados (ex.: resultado de busca) e recarrega."""
+        self.fetch = fetch
+        self.count = count
+        self._offset = 0
+        self._rows = []
+        self._selected.clear()
+        self.refresh()
+
+    def refresh(self, on_done=None):
+        """Recarrega o total e a janela visível, mantendo a posição atual."""
+        first_key = self._rows[0][0] if self._rows else None
+        offset, visible = self._offset, self._visible
+        fetch, count = self.fetch, self.count
+
+        def load():
+            total = count()
+            rows = None
+            if first_key is not None:
+                previous = fetch(1, before=first_key)
+                if previous:
+                    rows = fetch(visible, after=previous[0][0])
+            start = offset if first_key is not None else 0
+            if rows is None:
+                rows = fetch(visible, offset=start)
+            start = min(start, max(total - len(rows), 0))
+            rows, start = _complete_window(fetch, rows, visible, start)
+            return total, rows, start
+
+        def apply(result):
+            self._total, self._rows, self._offset = result
+            self._render()
+            if on_done:
+                on_done()
+
+        self._pending_scroll = 0
+        self._request(load, apply)
+
+    def _request(self, load, apply):
+        """Executa load() por `run` e apply(resultado) na thread do Tk, se ainda for o último pedido."""
+        self._seq += 1
+        seq = self._seq
+        self._busy = True
+
+        def done(result):
+            if seq != self._seq or not self.winfo_exists():
+                return
+            self._busy = False
+            apply(result)
+            self._flush_pending()
+
+        def failed(exc):
+            # O erro já foi exibido por `run`; libera a rolagem acumulada
+            if seq != self._seq or not self.winfo_exists():
+                return
+            self._busy = False
+            self._flush_pending()
+
+        if self.run:
+            self.run(load, done, failed)
+        else:
+            done(load())
+
+    def _flush_pending(self):
+        """Aplica o redimensionamento ou a rolagem acumulados durante a última busca."""
+        if self._busy:
+            return
+        if self._pending_fit:
+            self._pending_fit = False
+            self._fit_window()
+        elif self._pending_scroll:
+            delta, self._pending_scroll = self._pending_scroll, 0
+            self.scroll(delta)
+
+    # Rolagem
+    def scroll(self, delta: int, on_done=None):
+        """Desloca a janela visível em `delta` linhas; on_done() roda após exibi-las."""
+        if not self._rows:
+            return
+        if self._busy:
+            self._pending_scroll += delta
+            return
+        target = min(max(self._offset + delta, 0), max(self._total - self._visible, 0))
+        delta = target - self._offset
+        if delta == 0:
+            return
+        if abs(delta) >= self._visible:
+            self._jump(target, on_done)
+            return
+
+        fetch, rows, visible = self.fetch, self._rows, self._visible
+
+        def load():
+            if delta > 0:
+                new_rows = fetch(delta, after=rows[-1][0])
+                window = rows[delta:] + new_rows
+            else:
+                new_rows = fetch(-delta, before=rows[0][0])
+                window = new_rows + rows[:visible - len(new_rows)]
+            if len(new_rows) != abs(delta):
+                # Os dados mudaram desde a última leitura; recarrega pela posição
+                window = fetch(visible, offset=target)
+            return window
+
+        def apply(window):
+            self._offset = target
+            self._rows = window
+            self._render()
+            if on_done:
+                on_done()
+
+        self._request(load, apply)
+
+    def _jump(self, offset: int, on_done=None):
+        """Salta para a linha `offset` (OFFSET no banco: só para saltos, não para rolagem)."""
+        offset = min(max(offset, 0), max(self._total - self._visible, 0))
+        fetch, visible = self.fetch, self._visible
+
+        def apply(rows):
+            self._offset = offset
+            self._rows = rows
+            self._render()
+            if on_done:
+                on_done()
+
+        self._pending_scroll = 0
+        self._request(lambda: fetch(visible, offset=offset), apply)
+        return 'break'
+
+    def _scroll_event(self, delta: int):
+        self.scroll(delta)
+        return 'break'
+
+    def _on_mousewheel(self, event):
+        if event.delta:
+            step = -event.delta // 120 if abs(event.delta) >= 120 else -event.delta
+            self.scroll(step * 3)
+        return 'break'
+
+    def _on_arrow(self, delta: int):
+        """Setas no limite da janela rolam a lista e movem a seleção junto."""
+        items = self.tree.get_children()
+        focus = self.tree.focus()
+        if not items or focus not in items:
+            return None
+
+        index = items.index(focus)
+        if (delta < 0 and index > 0) or (delta > 0 and index < len(items) - 1):
+            return None  # comportamento padrão da Treeview
+
+        def move_selection():
+            items = self.tree.get_children()
+            if items:
+                target = items[0] if delta < 0 else items[-1]
+                self.tree.focus(target)
+                self.tree.selection_set(target)
+
+        self.scroll(delta, on_done=move_selection)
+        return 'break'
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self._jump(int(float(args[0]) * self._total))
+        elif action == 'scroll':
+            amount, unit = int(args[0]), args[1]
+            self.scroll(amount * self._visible if unit == 'pages' else amount)
+
+    def _on_configure(self, event):
+        rowheight = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
+        visible = max((event.height - self.HEADING_HEIGHT) // rowheight, 1)
+        if visible == self._visible:
+            return
+
+        self._visible = visible
+        if self._busy:
+            self._pending_fit = True
+        elif self._rows:
+            self._fit_window()
+
+    def _fit_window(self):
+        """Ajusta as linhas carregadas ao número de linhas que cabem na tela."""
+        if not self._rows:
+            return
+        if len(self._rows) >= self._visible:
+            self._rows = self._rows[:self._visible]
+            self._render()
+            return
+
+        fetch, rows, visible, offset = self.fetch, self._rows, self._visible, self._offset
+
+        def apply(result):
+            self._rows, self._offset = result
+            self._render()
+
+        self._request(lambda: _complete_window(fetch, rows, visible, offset), apply)
+
+    # Exibição
+    def _render(self):
+        self.tree.delete(*self.tree.get_children())
+        reselect = []
+        for key, values in self._rows:
+            iid = self.tree.insert('', tk.END, values=values)
+            if key in self._selected:
+                reselect.append(iid)
+        if reselect:
+            self.tree.selection_set(reselect)
+        self._update_scrollbar()
+
+    def _update_scrollbar(self):
+        if self._total <= 0:
+            self.scrollbar.set(0, 1)
+            return
+        first = self._offset / self._total
+        last = min((self._offset + len(self._rows)) / self._total, 1)
+        self.scrollbar.set(first, last)
+
+    def _on_select(self, event):
+        # Atualiza a seleção das linhas visíveis sem perder as que saíram da tela
+        selected = set(self.tree.selection())
+        if str(self.tree.cget('selectmode')) == 'browse' and selected:
+            self._selected.clear()
+        for iid, (key, values) in zip(self.tree.get_children(), self._rows):
+            if iid in selected:
+                self._selected[key] = values
+            else:
+                self._selected.pop(key, None)
+
+
+def _complete_window(fetch, rows, visible, offset):
+    """Completa `rows` até `visible` linhas: as seguintes e, no fim da lista, as anteriores.
+
+    Devolve (linhas, offset da primeira); roda junto com as demais buscas, fora do Tk.
+    """
+    if rows and len(rows) < visible:
+        rows = rows + fetch(visible - len(rows), after=rows[-1][0])
+        if len(rows) < visible and offset > 0:
+            before = fetch(visible - len(rows), before=rows[0][0])
+            rows = before + rows
+            offset -= len(before)
+    return rows, offset
+
+
+class TypeAheadCombobox(ttk.Combobox):
+    """Combobox que busca sugestões enquanto o usuário digita.
+
+    `search(text)` devolve a lista de sugestões; é chamada por
+    `run(func, on_success)` (por exemplo, no DBExecutor) só depois de
+    `delay_ms` sem novas teclas. Respostas de buscas antigas são descartadas.
+    """
+
+    IGNORED_KEYS = {'Up', 'Down', 'Left', 'Right', 'Return', 'Escape', 'Tab',
+                    'Shift_L', 'Shift_R', 'Control_L', 'Control_R'}
+
+    def __init__(self, parent, search, run, delay_ms=250, min_chars=1, **kw):
+        super().__init__(parent, **kw)
+        self.search = search
+        self.run = run
+        self.delay_ms = delay_ms
+        self.min_chars = min_chars
+        self._job = None
+        self._seq = 0
+        self.bind('<KeyRelease>', self._on_key, add=True)
+
+    def clear(self):
+        self.set('')
+        self['values'] = ()
+
+    def _on_key(self, event):
+        if event.keysym in self.IGNORED_KEYS:
+            return
+        if self._job:
+            self.after_cancel(self._job)
+        self._job = self.after(self.delay_ms, self._query)
+
+    def _query(self):
+        self._job = None
+        self._seq += 1
+        seq = self._seq
+        text = self.get().strip()
+        if len(text) < self.min_chars:
+            self['values'] = ()
+            return
+
+        def apply(values):
+            if seq == self._seq and self.winfo_exists():
+                self['values'] = values
+
+        self.run(lambda: self.search(text), apply)
+
+
+def list_source(rows):
+    """Origem (fetch, count) para VirtualTreeview a partir de uma lista já carregada.
+
+    A chave de cada linha é a sua posição na lista.
+    """
+    def fetch(limit, after=None, before=None, offset=0):
+        if after is not None:
+            start = after + 1
+        elif before is not None:
+            start = max(before - limit, 0)
+            limit = before - start
+        else:
+            start = offset
+        return [(i, rows[i]) for i in range(start, min(start + limit, len(rows)))]
+
+    return fetch, lambda: len(rows)